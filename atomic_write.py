@@ -0,0 +1,29 @@
+"""Replace files atomically, so a crash never leaves a half-written one.
+
+Kept free of Streamlit, like property_extraction.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+@contextmanager
+def atomic_write(path, mode='w', encoding=None):
+    """Open a new file to write in place of path, creating its directory if needed.
+
+    The data goes to a uniquely named temporary file in the same directory, which is
+    fsynced and renamed over path when the block exits without an exception. Concurrent
+    writers each get their own temporary file, and the last to finish wins.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(mode, encoding=encoding, dir=directory, prefix=f".{os.path.basename(path)}.",
+                                     suffix='.tmp', delete=False) as f:
+        try:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
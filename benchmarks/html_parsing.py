@@ -0,0 +1,76 @@
+"""Compare per-page CPU time of the html.parser and lxml extraction paths.
+
+Usage:
+    python benchmarks/html_parsing.py [saved_page.html ...] [--repeat N]
+
+Pass pages saved from centre websites; without any, the pages in benchmarks/pages and a
+large synthetic marketing page are used. The script also checks that both paths extract
+the same fields, printing any that differ, and exits with status 1 if a page does not match.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+from property_extraction import extract_property_data
+
+def synthetic_page(sections=60):
+    """A large marketing page: navigation, scripts, structured data and amenity lists"""
+    nav = ''.join(f'<li><a href="/locations/{i}">Location {i}</a></li>' for i in range(150))
+    scripts = ''.join(f'<script>window.dataLayer.push({{"event": "view", "id": {i}}});</script>' for i in range(30))
+    body = ''.join(
+        f'<section><h2>Floor {i}</h2><p>Flexible office space on floor {i} with bright views, a short walk from the metro '
+        f'and bus routes. Suites range from 1,200 - 4,500 sq ft.</p><ul><li>High-speed fiber internet</li>'
+        f'<li>24/7 secure access</li><li>Fitness centre and showers</li><li>Staffed reception and mail handling</li>'
+        f'<li>Boardroom for {i + 8} people</li><li>Kitchen with barista coffee</li></ul></section>'
+        for i in range(sections)
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Riverside Tower | Premium Offices</title>'
+        '<meta name="description" content="Premium serviced offices in the heart of the Loop.">'
+        '<script type="application/ld+json">{"@type": "Place", "address": {"streetAddress": "200 River Street", '
+        '"addressLocality": "Chicago", "addressRegion": "IL", "postalCode": "60601"}}</script>'
+        f'{scripts}<style>body {{ font-family: sans-serif; }}</style></head><body><nav><ul>{nav}</ul></nav>'
+        '<h1>Riverside Tower</h1><p>Located in the West Loop neighborhood of Chicago.</p>'
+        f'{body}<footer>Call (312) 555-0142 or email leasing@riversidetower.example.</footer></body></html>'
+    ).encode('utf-8')
+
+def time_per_page(html, fast, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract_property_data(html, 'https://example.com/centre', fast=fast)
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='saved HTML pages')
+    parser.add_argument('--repeat', type=int, default=20, help='extractions per page and path')
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(glob.glob(os.path.join(PAGES_DIR, '*.html')))
+    pages = [(os.path.basename(path), open(path, 'rb').read()) for path in paths]
+    if not args.pages:
+        pages.append(('synthetic page', synthetic_page()))
+
+    print(f"{'page':40} {'KB':>7} {'html.parser':>12} {'lxml':>10} {'speedup':>8}  same fields")
+    mismatches = []
+    for name, html in pages:
+        slow = time_per_page(html, False, args.repeat)
+        fast = time_per_page(html, True, args.repeat)
+        url = 'https://example.com/centre'
+        expected = extract_property_data(html, url, fast=False)
+        actual = extract_property_data(html, url, fast=True)
+        print(f"{name[-40:]:40} {len(html) / 1024:7.0f} {slow * 1000:10.1f}ms {fast * 1000:8.1f}ms {slow / fast:7.1f}x  {'yes' if expected == actual else 'NO'}")
+        mismatches.extend((name, field, expected[field], actual.get(field)) for field in expected if expected[field] != actual.get(field))
+
+    for name, field, expected, actual in mismatches:
+        print(f"\n{name}: {field}\n  html.parser: {expected!r}\n  lxml:        {actual!r}")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
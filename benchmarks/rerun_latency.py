@@ -0,0 +1,129 @@
+"""Measure how long the app takes to rerun with a large property list loaded.
+
+Usage:
+    python benchmarks/rerun_latency.py [--rows N] [--repeat N] [--target SECONDS]
+
+Runs the app headless with Streamlit's AppTest, with N synthetic properties that all have
+generated content, one of them open in the editor and a few scraped properties. Reports the
+time of a full rerun, then reruns each fragment on its own, as the server does for an edit
+inside it, and reports how long that takes. Exits with status 1 if a fragment rerun raises
+or is slower than the target.
+"""
+import argparse
+import functools
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+from streamlit.testing.v1 import AppTest
+import streamlit.testing.v1.local_script_runner as local_script_runner
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'centre_page_content_generator.py')
+
+fragment_times = defaultdict(list)
+
+def timed_fragment(func=None, **kwargs):
+    """st.fragment, recording how long each run of the fragment body takes"""
+    if func is None:
+        return lambda f: timed_fragment(f, **kwargs)
+
+    @functools.wraps(func)
+    def timed(*args, **inner_kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **inner_kwargs)
+        finally:
+            fragment_times[func.__name__].append(time.perf_counter() - start)
+    return real_fragment(timed, **kwargs)
+
+real_fragment = streamlit.fragment
+streamlit.fragment = timed_fragment
+
+# AppTest compiles the script on every run; a server compiles it once
+shared_script_cache = ScriptCache()
+local_script_runner.ScriptCache = lambda: shared_script_cache
+
+# AppTest always reruns the whole script; queued fragment ids make the next run fragment-only
+fragment_rerun_queue = []
+local_script_runner.RerunData = lambda **kwargs: RerunData(
+    fragment_id_queue=list(fragment_rerun_queue), is_fragment_scoped_rerun=bool(fragment_rerun_queue), **kwargs
+)
+
+def synthetic_properties(rows):
+    cities = np.array(['Chicago', 'Boston', 'Denver', 'Austin', 'Seattle'])
+    return pd.DataFrame({
+        'Property Name': [f'Riverside Tower {i}' for i in range(rows)],
+        'Address': [f'{100 + i} River Street' for i in range(rows)],
+        'City': pd.Categorical(cities[np.arange(rows) % len(cities)]),
+        'Neighborhood': ['West Loop'] * rows,
+        'Zip Code': ['60601'] * rows
+    })
+
+def synthetic_content(name, city):
+    return (f"# {name}\n\nPremium office space at 200 River Street in {city}. " * 6
+            + f"\n\nContact us today to book a tour of {name}.")
+
+def synthetic_scraped(rows):
+    return [{'Property Name': f'Harbour House {i}', 'Address': f'{i + 1} Quay Road', 'City': 'Boston'} for i in range(rows)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='properties loaded')
+    parser.add_argument('--repeat', type=int, default=10, help='timed reruns')
+    parser.add_argument('--target', type=float, default=0.05, help='slowest allowed fragment rerun, in seconds')
+    args = parser.parse_args()
+
+    # Streamlit's logged warnings would otherwise repeat on every run
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    properties = synthetic_properties(args.rows)
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.run()
+    app.session_state['df'] = properties
+    app.session_state['generated_content'] = {
+        i: synthetic_content(name, city) for i, (name, city) in enumerate(zip(properties['Property Name'], properties['City']))
+    }
+    app.session_state['selected_property'] = 0
+    # Scraped properties add widgets after the fragments, which a fragment rerun must not depend on
+    app.session_state['scraped_properties'] = synthetic_scraped(3)
+    # Warm up the caches a real session would already have filled
+    app.run()
+    app.run()
+    fragment_times.clear()
+
+    full_times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        app.run()
+        full_times.append(time.perf_counter() - start)
+    if app.exception:
+        sys.exit(f"App raised: {app.exception[0].message}")
+
+    fragment_times.clear()
+    for fragment_id in list(app._fragment_storage._fragments):
+        fragment_rerun_queue[:] = [fragment_id]
+        for _ in range(args.repeat):
+            app.run()
+            if app.exception:
+                sys.exit(f"Fragment rerun raised: {app.exception[0].message}")
+    fragment_rerun_queue.clear()
+
+    print(f"{args.rows} properties, median of {args.repeat} runs")
+    print(f"{'full rerun':28} {statistics.median(full_times) * 1000:8.1f}ms")
+    slowest = 0
+    for name, times in sorted(fragment_times.items()):
+        median = statistics.median(times)
+        slowest = max(slowest, median)
+        print(f"{name:28} {median * 1000:8.1f}ms")
+    print(f"slowest fragment {'within' if slowest <= args.target else 'OVER'} the {args.target * 1000:.0f}ms target")
+    sys.exit(0 if slowest <= args.target else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Measure how long SEO scoring takes for a large batch of generated descriptions.
+
+Usage:
+    python benchmarks/seo_scoring.py [--rows N] [--repeat N] [--target SECONDS]
+
+Scores N synthetic descriptions of about 200 words, the length the prompt asks for, with
+score_seo_frame, as the SEO overview, export and project save do. Reports the median time
+and exits with status 1 if it is slower than the target.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def synthetic_descriptions(rows):
+    cities = ['Chicago', 'Boston', 'Denver', 'Austin', 'Seattle']
+    texts = []
+    for i in range(rows):
+        city = cities[i % len(cities)]
+        paragraph = (f"Discover premium office space in {city} at {100 + i} River Street. Our workspace offers "
+                     f"meeting rooms, 24/7 access and flexible terms. {city}'s West Loop is a business hub. ")
+        texts.append(f"# Riverside Tower {i} Office Space in {city}\n\n" + paragraph * 5
+                     + f"\n\nContact us today to schedule a tour of Riverside Tower {i}.")
+    return pd.DataFrame({
+        'Address': [f'{100 + i} River Street' for i in range(rows)],
+        'City': [cities[i % len(cities)] for i in range(rows)],
+        'Neighborhood': ['West Loop'] * rows,
+        'Generated Content': texts
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help='descriptions scored')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs')
+    parser.add_argument('--target', type=float, default=1.0, help='slowest allowed run, in seconds')
+    args = parser.parse_args()
+
+    # Importing the app runs it in bare mode, which logs a warning for every widget
+    logging.disable(logging.WARNING)
+    from centre_page_content_generator import score_seo_frame
+    logging.disable(logging.NOTSET)
+
+    df = synthetic_descriptions(args.rows)
+    score_seo_frame(df.head(100))
+    times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        score_seo_frame(df)
+        times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    characters = df['Generated Content'].str.len().sum()
+    print(f"{args.rows} descriptions, {characters / 1e6:.1f}M characters, median of {args.repeat} runs")
+    print(f"{'score_seo_frame':28} {median * 1000:8.1f}ms  ({args.rows / median:,.0f} rows/s)")
+    print(f"{'within' if median <= args.target else 'OVER'} the {args.target * 1000:.0f}ms target")
+    sys.exit(0 if median <= args.target else 1)
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,34 @@ import numpy as np
 import os
 import time
 import json
+import hashlib
+import random
+import sqlite3
+import uuid
+import queue
+import types
+import zlib
+import tempfile
 import requests
-from io import BytesIO
+import xlsxwriter
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from bs4 import BeautifulSoup
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from property_extraction import ParsePool, extract_property_data
+from property_ingest import PROPERTY_COLUMNS, PropertyFileReader, append_chunks
+from atomic_write import atomic_write
+from project_store import ProjectStore
+from telemetry import MetricsStore, latency_summary, throughput
+from prompt_templates import (DEFAULT_INSTRUCTIONS_TEMPLATE, DEFAULT_PROPERTY_TEMPLATE, DEFAULT_TEMPLATE_VERSION, INSTRUCTION_FIELDS,
+                              PromptTemplateStore, compile_templates)
 
 # Set page config
 st.set_page_config(
@@ -18,6 +40,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# The parse pool is shared by every session, so it never takes more than a few cores from the server
+MAX_PARSE_PROCESSES = 4
+
 # Initialize session state variables if they don't exist
 if 'generated_content' not in st.session_state:
     st.session_state.generated_content = {}
@@ -43,135 +68,233 @@ if 'example_copies' not in st.session_state:
     st.session_state.example_copies = []
 if 'batch_size' not in st.session_state:
     st.session_state.batch_size = 5
-if 'api_delay' not in st.session_state:
-    st.session_state.api_delay = 1
 if 'target_keywords' not in st.session_state:
     st.session_state.target_keywords = ['office space', 'executive office', 'workspace']
 if 'meta_descriptions' not in st.session_state:
     st.session_state.meta_descriptions = {}
+if 'generation_metadata' not in st.session_state:
+    st.session_state.generation_metadata = {}
+if 'project_name' not in st.session_state:
+    st.session_state.project_name = None
+if 'unsaved_rows' not in st.session_state:
+    st.session_state.unsaved_rows = set()
+if 'content_version' not in st.session_state:
+    st.session_state.content_version = 0
+if 'seo_scores_cache' not in st.session_state:
+    st.session_state.seo_scores_cache = None
+if 'export_cache' not in st.session_state:
+    st.session_state.export_cache = {}
+if 'editor_page' not in st.session_state:
+    st.session_state.editor_page = 0
+if 'editor_filters' not in st.session_state:
+    st.session_state.editor_filters = None
 if 'scraped_properties' not in st.session_state:
     st.session_state.scraped_properties = []
 if 'scraping_in_progress' not in st.session_state:
     st.session_state.scraping_in_progress = False
+if 'failed_rows' not in st.session_state:
+    st.session_state.failed_rows = {}
+if 'api_call_stats' not in st.session_state:
+    st.session_state.api_call_stats = []
+if 'scrape_concurrency' not in st.session_state:
+    st.session_state.scrape_concurrency = 8
+if 'scrape_host_concurrency' not in st.session_state:
+    st.session_state.scrape_host_concurrency = 2
+if 'scrape_host_delay' not in st.session_state:
+    st.session_state.scrape_host_delay = 1.0
+if 'http_pool_size' not in st.session_state:
+    st.session_state.http_pool_size = 20
+if 'current_job_id' not in st.session_state:
+    st.session_state.current_job_id = None
+if 'background_jobs' not in st.session_state:
+    st.session_state.background_jobs = {}
+if 'loaded_file_id' not in st.session_state:
+    st.session_state.loaded_file_id = None
+if 'example_file_id' not in st.session_state:
+    st.session_state.example_file_id = None
+if 'prompt_template_version' not in st.session_state:
+    st.session_state.prompt_template_version = None
+if 'rejected_rows' not in st.session_state:
+    st.session_state.rejected_rows = []
+if 'load_error' not in st.session_state:
+    st.session_state.load_error = None
+if 'batch_wait_error' not in st.session_state:
+    st.session_state.batch_wait_error = None
+if 'generate_while_loading' not in st.session_state:
+    st.session_state.generate_while_loading = False
+if 'load_generation' not in st.session_state:
+    st.session_state.load_generation = None
+if 'fast_html_parsing' not in st.session_state:
+    st.session_state.fast_html_parsing = True
+if 'use_page_cache' not in st.session_state:
+    st.session_state.use_page_cache = True
+if 'parse_processes' not in st.session_state:
+    st.session_state.parse_processes = min(os.cpu_count() or 1, MAX_PARSE_PROCESSES)
+
+# Background jobs run outside any script run, so they read these keys from a snapshot instead
+WORKER_STATE_KEYS = ("debug_info", "api_call_stats", "api_response", "http_pool_size",
+                     "excluded_terms", "example_copies", "target_keywords", "fast_html_parsing",
+                     "use_page_cache", "prompt_template_version")
+
+def attach_job_state(thread, state):
+    """Make session_state() return state on thread.
+    
+    Stored on the thread itself, like Streamlit's script run context, because every rerun
+    re-executes this module while cached workers keep running code from an earlier run.
+    """
+    thread.job_state = state
+
+def session_state():
+    """Session state for the current thread: the live session, or a background job's snapshot"""
+    state = getattr(threading.current_thread(), "job_state", None)
+    return state if state is not None else st.session_state
+
+def snapshot_session_state():
+    """Snapshot of WORKER_STATE_KEYS for a background job.
+    
+    Values are shared rather than copied, so debug messages and API call stats logged by
+    the job still appear in the submitting session.
+    """
+    return types.SimpleNamespace(**{key: st.session_state[key] for key in WORKER_STATE_KEYS})
 
 # Function to add debug information
 def add_debug(message):
+    debug_info = session_state().debug_info
     timestamp = datetime.now().strftime("%H:%M:%S")
-    st.session_state.debug_info.append(f"[{timestamp}] {message}")
-    if len(st.session_state.debug_info) > 20:  # Keep only the last 20 messages
-        st.session_state.debug_info = st.session_state.debug_info[-20:]
+    debug_info.append(f"[{timestamp}] {message}")
+    if len(debug_info) > 20:  # Keep only the last 20 messages
+        del debug_info[:-20]
 
-# Web Scraping Functions
-def extract_text_from_element(element):
-    """Extract and clean text from BeautifulSoup element"""
-    if element:
-        text = element.get_text(strip=True)
-        # Clean up extra whitespace
-        text = ' '.join(text.split())
-        return text
-    return ""
-
-def find_address_info(soup, text_content):
-    """Extract address information from page"""
-    address_data = {
-        'Address': '',
-        'City': '',
-        'State': '',
-        'Zip Code': ''
-    }
+# Shared helpers for concurrent work
+API_TIMEOUT = (10, 120)  # (connect, read) seconds; long generations need a generous read timeout
+SCRAPE_TIMEOUT = (5, 15)
+
+def create_http_session(pool_size=10):
+    """Create a keep-alive requests session whose connection pool can serve pool_size concurrent calls"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource(show_spinner=False)
+def get_http_session(purpose, pool_size):
+    """Pooled session shared across reruns and users, one per purpose and pool size"""
+    return create_http_session(pool_size)
+
+def get_api_session(min_pool_size=1):
+    """Shared session for Anthropic API traffic"""
+    return get_http_session("api", max(min_pool_size, session_state().http_pool_size))
+
+def get_scrape_session(min_pool_size=1):
+    """Shared session for scraping traffic"""
+    return get_http_session("scrape", max(min_pool_size, session_state().http_pool_size))
+
+def thread_context_initializer():
+    """Thread pool initializer that lets worker threads use this thread's session state"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    state = getattr(threading.current_thread(), "job_state", None)
     
-    # Common address patterns
-    address_pattern = r'(\d+[\w\s,.-]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln|Way|Place|Pl|Court|Ct))'
-    zip_pattern = r'\b(\d{5}(?:-\d{4})?)\b'
+    def attach_script_context():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        attach_job_state(threading.current_thread(), state)
     
-    # Look for address in common locations
-    # 1. Check meta tags
-    meta_address = soup.find('meta', {'name': re.compile('address|location', re.I)})
-    if meta_address and meta_address.get('content'):
-        address_data['Address'] = meta_address['content']
+    return attach_script_context
+
+# Persistent page cache for conditional re-scraping
+PAGE_CACHE_PATH = os.environ.get("PAGE_CACHE_PATH", os.path.join(".cache", "page_cache.sqlite3"))
+PAGE_CACHE_MAX_AGE_DAYS = 90
+
+class PageCache:
+    """SQLite cache of scraped pages with their validators and extracted property data.
+    
+    Re-scrapes send the stored ETag/Last-Modified back to the server; a 304 Not Modified
+    reuses the stored extraction, so unchanged pages cost neither bandwidth nor parsing.
+    Bodies are stored compressed. Pages not scraped for max_age_days are dropped.
+    """
+    
+    def __init__(self, path, max_age_days=PAGE_CACHE_MAX_AGE_DAYS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_age_seconds = max_age_days * 86400
+        self.not_modified = 0
+        self.downloaded = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_cache ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB NOT NULL, "
+                "property_data TEXT, fetched REAL NOT NULL, last_checked REAL NOT NULL)"
+            )
     
-    # 2. Check structured data
-    scripts = soup.find_all('script', type='application/ld+json')
-    for script in scripts:
-        try:
-            data = json.loads(script.string)
-            if isinstance(data, dict):
-                if 'address' in data:
-                    addr = data['address']
-                    if isinstance(addr, dict):
-                        address_data['Address'] = addr.get('streetAddress', '')
-                        address_data['City'] = addr.get('addressLocality', '')
-                        address_data['State'] = addr.get('addressRegion', '')
-                        address_data['Zip Code'] = addr.get('postalCode', '')
-        except:
-            pass
-    
-    # 3. Search in text content
-    if not address_data['Address']:
-        address_matches = re.findall(address_pattern, text_content)
-        if address_matches:
-            address_data['Address'] = address_matches[0]
-    
-    # Find zip code
-    if not address_data['Zip Code']:
-        zip_matches = re.findall(zip_pattern, text_content)
-        if zip_matches:
-            address_data['Zip Code'] = zip_matches[0]
-    
-    return address_data
-
-def extract_property_features(soup, text_content):
-    """Extract property features and amenities"""
-    features = {
-        'Key Features': [],
-        'Technology Features': [],
-        'Security Features': [],
-        'Wellness Amenities': [],
-        'Business Services': [],
-        'Meeting Rooms': '',
-        'Common Areas': ''
-    }
+    def get(self, url):
+        """Cached entry for url as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body, property_data FROM page_cache WHERE url = ? AND last_checked >= ?",
+                (url, time.time() - self.max_age_seconds)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body, property_data = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+            "property_data": json.loads(property_data) if property_data is not None else None
+        }
     
-    # Keywords to look for
-    tech_keywords = ['wifi', 'internet', 'fiber', 'technology', 'av', 'video conferencing', 'digital']
-    security_keywords = ['security', 'secure', 'surveillance', 'access control', 'monitored', '24/7']
-    wellness_keywords = ['fitness', 'gym', 'wellness', 'health', 'shower', 'bike', 'outdoor']
-    business_keywords = ['reception', 'concierge', 'mail', 'print', 'copy', 'admin', 'support']
-    meeting_keywords = ['meeting', 'conference', 'boardroom', 'training room']
-    
-    # Look for features in lists
-    feature_lists = soup.find_all(['ul', 'ol'])
-    for lst in feature_lists:
-        items = lst.find_all('li')
-        for item in items:
-            item_text = extract_text_from_element(item).lower()
-            
-            # Categorize features
-            if any(keyword in item_text for keyword in tech_keywords):
-                features['Technology Features'].append(extract_text_from_element(item))
-            elif any(keyword in item_text for keyword in security_keywords):
-                features['Security Features'].append(extract_text_from_element(item))
-            elif any(keyword in item_text for keyword in wellness_keywords):
-                features['Wellness Amenities'].append(extract_text_from_element(item))
-            elif any(keyword in item_text for keyword in business_keywords):
-                features['Business Services'].append(extract_text_from_element(item))
-            elif any(keyword in item_text for keyword in meeting_keywords):
-                if not features['Meeting Rooms']:
-                    features['Meeting Rooms'] = extract_text_from_element(item)
+    def put(self, url, etag, last_modified, body, property_data):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_cache (url, etag, last_modified, body, property_data, fetched, last_checked) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, zlib.compress(body), json.dumps(property_data) if property_data is not None else None, now, now)
+            )
+            self._conn.execute("DELETE FROM page_cache WHERE last_checked < ?", (now - self.max_age_seconds,))
+        self.downloaded += 1
+    
+    def mark_not_modified(self, url, property_data=None):
+        """Record a 304 for url, filling in property_data if it had to be re-extracted"""
+        with self._lock, self._conn:
+            if property_data is None:
+                self._conn.execute("UPDATE page_cache SET last_checked = ? WHERE url = ?", (time.time(), url))
             else:
-                features['Key Features'].append(extract_text_from_element(item))
-    
-    # Convert lists to comma-separated strings
-    for key in ['Key Features', 'Technology Features', 'Security Features', 'Wellness Amenities', 'Business Services']:
-        if features[key]:
-            features[key] = ', '.join(features[key][:5])  # Limit to 5 items
-        else:
-            features[key] = ''
-    
-    return features
+                self._conn.execute(
+                    "UPDATE page_cache SET last_checked = ?, property_data = ? WHERE url = ?",
+                    (time.time(), json.dumps(property_data), url)
+                )
+        self.not_modified += 1
+    
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM page_cache")
+        self.not_modified = 0
+        self.downloaded = 0
+    
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM page_cache").fetchone()
+        return {"entries": entries, "bytes": size, "not_modified": self.not_modified, "downloaded": self.downloaded}
+
+@st.cache_resource(show_spinner=False)
+def get_page_cache():
+    """Page cache shared by every session in this server process"""
+    return PageCache(PAGE_CACHE_PATH)
 
-def scrape_property_data(url):
-    """Scrape property data from a given URL"""
+# Web Scraping Functions
+def fetch_page(url, session=None, cached=None):
+    """Download a page, returning the response or None if it could not be fetched.
+    
+    With a cached entry the request is conditional, and an unchanged page comes back as
+    a 304 with no body.
+    """
+    start = time.monotonic()
+    response = None
     try:
         add_debug(f"Starting to scrape: {url}")
         
@@ -179,127 +302,217 @@ def scrape_property_data(url):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=10)
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        http = session if session is not None else get_scrape_session()
+        response = http.get(url, headers=headers, timeout=SCRAPE_TIMEOUT)
         response.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Get page text content
-        text_content = soup.get_text()
-        
-        # Initialize property data
-        property_data = {
-            'Property Name': '',
-            'Address': '',
-            'City': '',
-            'State': '',
-            'Zip Code': '',
-            'Neighborhood': '',
-            'Property Type': 'Office Space',
-            'Size Range': '',
-            'Building Description': '',
-            'Key Features': '',
-            'Nearby Businesses': '',
-            'Transport Access': '',
-            'Technology Features': '',
-            'Meeting Rooms': '',
-            'Common Areas': '',
-            'Business Services': '',
-            'Security Features': '',
-            'Wellness Amenities': '',
-            'Office Configurations': '',
-            'Lease Options': '',
-            'Contact Information': '',
-            'Source URL': url
-        }
-        
-        # Extract property name
-        title = soup.find('title')
-        if title:
-            property_data['Property Name'] = extract_text_from_element(title).split('|')[0].strip()
-        
-        # Try H1 if title not good
-        if not property_data['Property Name'] or len(property_data['Property Name']) < 5:
-            h1 = soup.find('h1')
-            if h1:
-                property_data['Property Name'] = extract_text_from_element(h1)
-        
-        # Extract address information
-        address_info = find_address_info(soup, text_content)
-        property_data.update(address_info)
-        
-        # Extract features
-        features = extract_property_features(soup, text_content)
-        property_data.update(features)
-        
-        # Look for neighborhood info
-        neighborhood_patterns = [
-            r'located in (?:the )?([A-Z][a-z\s]+)(?:neighborhood|district|area)',
-            r'([A-Z][a-z\s]+) neighborhood',
-            r'([A-Z][a-z\s]+) district'
-        ]
-        
-        for pattern in neighborhood_patterns:
-            matches = re.findall(pattern, text_content)
-            if matches:
-                property_data['Neighborhood'] = matches[0].strip()
-                break
-        
-        # Look for size/square footage
-        size_pattern = r'(\d{1,3},?\d{3}[\s-]+(?:to|-)[\s-]+\d{1,3},?\d{3}\s*(?:sq\.?\s*ft\.?|square feet))'
-        size_matches = re.findall(size_pattern, text_content, re.I)
-        if size_matches:
-            property_data['Size Range'] = size_matches[0]
-        
-        # Look for transport/transit information
-        transit_keywords = ['subway', 'metro', 'train', 'bus', 'transit', 'transportation']
-        transit_sentences = []
-        sentences = text_content.split('.')
-        for sentence in sentences:
-            if any(keyword in sentence.lower() for keyword in transit_keywords):
-                transit_sentences.append(sentence.strip())
-        
-        if transit_sentences:
-            property_data['Transport Access'] = '. '.join(transit_sentences[:2])
-        
-        # Extract building description from meta description or first paragraph
-        meta_desc = soup.find('meta', {'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            property_data['Building Description'] = meta_desc['content']
-        else:
-            # Try to get first paragraph
-            first_p = soup.find('p')
-            if first_p:
-                property_data['Building Description'] = extract_text_from_element(first_p)[:200]
-        
-        # Look for contact information
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        phone_pattern = r'(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})'
-        
-        emails = re.findall(email_pattern, text_content)
-        phones = re.findall(phone_pattern, text_content)
-        
-        contact_info = []
-        if emails:
-            contact_info.append(f"Email: {emails[0]}")
-        if phones:
-            phone = phones[0]
-            formatted_phone = f"({phone[0]}) {phone[1]}-{phone[2]}"
-            contact_info.append(f"Phone: {formatted_phone}")
-        
-        property_data['Contact Information'] = ', '.join(contact_info)
-        
-        add_debug(f"Successfully scraped data from {url}")
-        return property_data
+        record_page_fetch(url, start, response)
+        return response
         
     except requests.RequestException as e:
         add_debug(f"Error fetching URL: {str(e)}")
+        record_page_fetch(url, start, response, error=str(e))
         return None
+
+def parse_page(content, url):
+    """Extract property data from a fetched page"""
+    try:
+        property_data = extract_property_data(content, url, session_state().fast_html_parsing)
+        add_debug(f"Successfully scraped data from {url}")
+        return property_data
+        
     except Exception as e:
         add_debug(f"Error parsing content: {str(e)}")
         return None
 
+def fetch_property_page(url, session=None, throttle=None):
+    """Download a page for scraping, revalidating the page cache's copy when there is one.
+    
+    Returns None if the page could not be fetched, and otherwise (property_data, body, response):
+    property_data is the cached extraction when the server reports the page unchanged, and
+    body is None then; otherwise body holds the bytes still to be parsed. A throttle, if
+    given, only wraps the download.
+    """
+    cache = get_page_cache() if session_state().use_page_cache else None
+    cached = cache.get(url) if cache is not None else None
+    
+    with throttle.slot(url) if throttle is not None else nullcontext():
+        response = fetch_page(url, session=session, cached=cached)
+    if response is None:
+        return None
+    
+    if response.status_code == 304 and cached is not None:
+        if cached['property_data'] is None:
+            # The last extraction failed; retry it on the stored body
+            return None, zlib.decompress(cached['body']), response
+        add_debug(f"Page unchanged, reused cached data for {url}")
+        cache.mark_not_modified(url)
+        return cached['property_data'], None, response
+    
+    return None, response.content, response
+
+def store_parsed_page(url, body, response, property_data):
+    """Record the extraction of a page from fetch_property_page in the page cache and return it"""
+    cache = get_page_cache() if session_state().use_page_cache else None
+    if cache is not None:
+        if response.status_code == 304:
+            cache.mark_not_modified(url, property_data)
+        else:
+            cache.put(url, response.headers.get('ETag'), response.headers.get('Last-Modified'), body, property_data)
+    return property_data
+
+def scrape_property_data(url, session=None, throttle=None):
+    """Scrape property data from a given URL.
+    
+    Pages in the page cache are re-requested conditionally and reuse their stored
+    extraction when the server reports them unchanged.
+    """
+    page = fetch_property_page(url, session=session, throttle=throttle)
+    if page is None:
+        return None
+    property_data, body, response = page
+    if body is None:
+        return property_data
+    return store_parsed_page(url, body, response, parse_page(body, url))
+
+# Concurrent bulk scraping
+class HostThrottle:
+    """Per-host politeness: caps concurrent requests to each host and spaces their start times"""
+    
+    def __init__(self, max_per_host=2, delay=1.0):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+    
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.max_per_host))
+        with semaphore:
+            # Reserve a start time under the lock, then sleep without holding it
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.delay
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+def interleave_by_host(urls):
+    """Order URLs round-robin across hosts so workers are not all queued on one site"""
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(urlparse(url).netloc.lower(), []).append(url)
+    queues = list(by_host.values())
+    ordered = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        ordered.extend(q[i] for q in queues if i < len(q))
+    return ordered
+
+@st.cache_resource(show_spinner=False)
+def get_parse_pool(processes):
+    """Worker processes for CPU-bound page extraction, shared across reruns and users.
+    
+    Workers run property_extraction.py in a fresh interpreter, so they never import
+    Streamlit or this script.
+    """
+    return ParsePool(min(processes, MAX_PARSE_PROCESSES))
+
+def discard_parse_pool(pool, processes):
+    """Shut down a pool whose worker died, so the next scrape starts a fresh one"""
+    pool.shutdown(cancel_futures=True)
+    get_parse_pool.clear(processes)
+    add_debug("Parse worker pool stopped, parsing in-process instead")
+
+def scrape_urls_concurrently(urls, max_workers=8, max_per_host=2, host_delay=1.0, parse_processes=0):
+    """Scrape many URLs in parallel while staying polite to each host.
+    
+    Threads fetch the pages; with parse_processes > 0 each thread hands the raw bytes to a
+    pool of worker processes and moves on to its next download, so parsing runs on other
+    cores while the fetches continue. Yields (url, property_data) as each page finishes;
+    property_data is None when the page could not be fetched or parsed.
+    """
+    throttle = HostThrottle(max_per_host, host_delay)
+    session = get_scrape_session(max_workers)
+    parse_pool = get_parse_pool(parse_processes) if parse_processes > 0 else None
+    parse_pool_lock = threading.Lock()
+    fast = session_state().fast_html_parsing
+    
+    def discard(pool):
+        """Stop the broken pool once; the remaining pages of this scrape parse in-process"""
+        nonlocal parse_pool
+        with parse_pool_lock:
+            if parse_pool is not pool:
+                return
+            parse_pool = None
+        discard_parse_pool(pool, parse_processes)
+    
+    def scrape_one(url):
+        """(property_data, None) for a finished page, or (None, (future, body, response, pool)) while a worker parses it"""
+        page = fetch_property_page(url, session=session, throttle=throttle)
+        if page is None:
+            return None, None
+        property_data, body, response = page
+        if body is None:
+            return property_data, None
+        pool = parse_pool
+        if pool is not None:
+            try:
+                return None, (pool.submit(body, url, fast), body, response, pool)
+            except BrokenProcessPool:
+                discard(pool)
+        return store_parsed_page(url, body, response, parse_page(body, url)), None
+    
+    def finish_parse(url, future, body, response, pool):
+        try:
+            property_data = future.result()
+            add_debug(f"Successfully scraped data from {url}")
+        except BrokenProcessPool:
+            discard(pool)
+            property_data = parse_page(body, url)
+        except Exception as e:
+            add_debug(f"Error parsing content: {str(e)}")
+            property_data = None
+        return store_parsed_page(url, body, response, property_data)
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, initializer=thread_context_initializer())
+    parsing = {}
+    try:
+        fetches = {executor.submit(scrape_one, url): url for url in interleave_by_host(urls)}
+        pending = set(fetches)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in parsing:
+                    url, body, response, pool = parsing.pop(future)
+                    yield url, finish_parse(url, future, body, response, pool)
+                    continue
+                url = fetches[future]
+                try:
+                    property_data, parse = future.result()
+                except Exception as e:
+                    add_debug(f"Error scraping {url}: {str(e)}")
+                    yield url, None
+                    continue
+                if parse is None:
+                    yield url, property_data
+                else:
+                    parse_future, body, response, pool = parse
+                    parsing[parse_future] = (url, body, response, pool)
+                    pending.add(parse_future)
+    finally:
+        # Drop queued work if the consumer stops early, e.g. when the script run is interrupted
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in parsing:
+            future.cancel()
+
 def create_dataframe_from_scraped_data(scraped_properties):
     """Create a DataFrame from scraped property data"""
     if not scraped_properties:
@@ -308,60 +521,332 @@ def create_dataframe_from_scraped_data(scraped_properties):
     df = pd.DataFrame(scraped_properties)
     return df
 
+# Multi-term matching
+DIRECT_SCAN_MAX_TERMS = 48  # below this, one str.count per term beats a single regex scan
+
+class TermMatcher:
+    """Case-insensitive matcher that finds every occurrence of many terms in one scan.
+    
+    The terms are compiled once into a trie and a regex over that trie. At each position
+    where some term starts, the regex captures the longest term there; every term that is
+    a prefix of it starts there too. A scan costs about the same for 10 terms or 1,000.
+    Short term lists are counted with str.count instead, which is faster below
+    DIRECT_SCAN_MAX_TERMS terms and gives the same results.
+    """
+    
+    def __init__(self, terms):
+        self.terms = [term for term in dict.fromkeys(terms) if term]
+        trie = {}
+        for term in self.terms:
+            node = trie
+            for char in term.lower():
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(term)  # the None key lists the terms ending here
+        
+        # Every term starting at a position is a prefix of the longest one captured there
+        self._prefix_terms = {}
+        for lowered in {term.lower() for term in self.terms}:
+            node, found = trie, []
+            for char in lowered:
+                node = node[char]
+                found.extend(node.get(None, ()))
+            self._prefix_terms[lowered] = found
+        
+        # str.count skips overlapping occurrences of a term like "aa" in "aaa"
+        self._self_overlapping = [
+            term for term in self.terms
+            if any(term.lower()[:k] == term.lower()[-k:] for k in range(1, len(term)))
+        ]
+        self._longest = re.compile(f"(?=({self._pattern(trie)}))", re.DOTALL) if self.terms else None
+        self._scan_each_term = len(self.terms) <= DIRECT_SCAN_MAX_TERMS
+    
+    @classmethod
+    def _pattern(cls, node):
+        branches = [re.escape(char) + cls._pattern(child) for char, child in node.items() if char is not None]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Greedy, so a longer term wins over a term that ends here
+        return f'(?:{pattern})?' if None in node else pattern
+    
+    def finditer(self, text):
+        """Yield (position, term) for every occurrence of every term, overlapping ones included"""
+        if self._longest is None:
+            return
+        for match in self._longest.finditer(text.lower()):
+            for term in self._prefix_terms[match.group(1)]:
+                yield match.start(), term
+    
+    def counts(self, text):
+        """{term: count} for every term, counting non-overlapping occurrences like str.count"""
+        counts = dict.fromkeys(self.terms, 0)
+        if self._longest is None:
+            return counts
+        lowered = text.lower()
+        if self._scan_each_term:
+            return {term: lowered.count(term.lower()) for term in self.terms}
+        for longest, occurrences in Counter(self._longest.findall(lowered)).items():
+            for term in self._prefix_terms[longest]:
+                counts[term] += occurrences
+        for term in self._self_overlapping:
+            if counts[term] > 1:
+                counts[term] = lowered.count(term.lower())
+        return counts
+    
+    def found(self, text):
+        """Terms that occur in text, in the order the matcher was built with"""
+        if self._longest is None:
+            return []
+        if self._scan_each_term:
+            lowered = text.lower()
+            return [term for term in self.terms if term.lower() in lowered]
+        seen = {term for longest in set(self._longest.findall(text.lower())) for term in self._prefix_terms[longest]}
+        return [term for term in self.terms if term in seen]
+
+def term_contexts(matcher, text, width=40, limit=3):
+    """Up to limit (term, snippet) pairs showing the text around the first occurrences of matcher's terms"""
+    # Positions index text.lower(), which only differs in length from text for a few characters such as 'İ'
+    source = text if len(text.lower()) == len(text) else text.lower()
+    contexts = []
+    for position, term in matcher.finditer(text):
+        start, end = max(position - width, 0), position + len(term) + width
+        snippet = ' '.join(source[start:end].split())
+        contexts.append((term, ('…' if start > 0 else '') + snippet + ('…' if end < len(source) else '')))
+        if len(contexts) == limit:
+            break
+    return contexts
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def get_term_matcher(terms):
+    """Compiled matcher for a tuple of terms, built once per term list"""
+    return TermMatcher(terms)
+
 # SEO Analysis Functions
 def analyze_seo_quality(content, property_data):
     """Analyze content for SEO best practices"""
     if not content:
         return {}
     
+    # Memoized on everything the analysis reads, so reruns only pay for new or edited content
+    inputs = (
+        property_data.get('Address', ''),
+        property_data.get('City', ''),
+        property_data.get('Neighborhood', ''),
+        tuple(session_state().target_keywords)
+    )
+    key = (hashlib.sha256(content.encode('utf-8')).digest(),) + inputs
+    memo, lock = get_seo_analysis_memo()
+    with lock:
+        if key in memo:
+            memo.move_to_end(key)
+            return memo[key]
+    analysis = compute_seo_analysis(content, *inputs)
+    with lock:
+        memo[key] = analysis
+        if len(memo) > SEO_ANALYSIS_CACHE_SIZE:
+            memo.popitem(last=False)
+    return analysis
+
+SEO_ANALYSIS_CACHE_SIZE = 256
+
+@st.cache_resource(show_spinner=False)
+def get_seo_analysis_memo():
+    """Recent SEO analyses keyed by a hash of the content, shared across reruns and sessions.
+    
+    Returns the OrderedDict, oldest first, and the lock guarding it; callers must not modify
+    the analyses.
+    """
+    return OrderedDict(), threading.Lock()
+
+def compute_seo_analysis(content, address, city, neighborhood, target_keywords):
+    """SEO analysis of content for a property with the given address, location and target keywords"""
+    frame = pd.DataFrame(
+        {'Generated Content': [content], 'Address': [address], 'City': [city], 'Neighborhood': [neighborhood]},
+        dtype=object
+    )
+    # Keyword density for important terms, including the property's own location
+    keywords = [
+        keyword for keyword in list(target_keywords) + list(SEO_EXTRA_KEYWORDS) + [city, neighborhood]
+        if keyword and isinstance(keyword, str)
+    ]
+    row = score_seo_frame(frame, keywords).iloc[0]
+    word_count = int(row['word_count'])
+    
     analysis = {
-        "word_count": len(content.split()),
-        "has_address": property_data.get('Address', '') in content if property_data.get('Address') else False,
-        "location_mentions": content.lower().count(property_data.get('City', '').lower()) if property_data.get('City') else 0,
+        "word_count": word_count,
+        "has_address": bool(row['has_address']),
+        "location_mentions": int(row['location_mentions']),
         "keyword_density": {},
-        "readability_score": None,
-        "has_cta": any(cta in content.lower() for cta in ['contact', 'schedule', 'book', 'visit', 'tour', 'call']),
-        "paragraph_count": len([p for p in content.split('\n\n') if p.strip()]),
-        "has_h1": content.strip().startswith('#'),
-        "seo_score": 0
+        "readability_score": row['readability_score'],
+        "has_cta": bool(row['has_cta']),
+        "paragraph_count": int(row['paragraph_count']),
+        "has_h1": bool(row['has_h1']),
+        "avg_sentence_length": float(row['avg_sentence_length']),
+        "seo_score": int(row['seo_score'])
     }
     
-    # Calculate keyword density for important terms
-    keywords = st.session_state.target_keywords + ['meeting room', 'business', property_data.get('City', ''), property_data.get('Neighborhood', '')]
     for keyword in keywords:
-        if keyword:
-            count = content.lower().count(keyword.lower())
-            density = (count / len(content.split())) * 100 if content else 0
-            analysis["keyword_density"][keyword] = {
-                "count": count,
-                "density": f"{density:.1f}%"
-            }
-    
-    # Simple readability check (average sentence length)
-    sentences = [s for s in content.split('.') if s.strip()]
-    avg_sentence_length = sum(len(s.split()) for s in sentences) / len(sentences) if sentences else 0
-    analysis["avg_sentence_length"] = round(avg_sentence_length, 1)
-    analysis["readability_score"] = "Good" if avg_sentence_length < 20 else "Complex"
-    
-    # Calculate SEO score
-    score = 0
-    if 150 <= analysis['word_count'] <= 300:
-        score += 20
-    if analysis['has_address']:
-        score += 20
-    if analysis['location_mentions'] >= 2:
-        score += 20
-    if analysis['has_cta']:
-        score += 20
-    if analysis['has_h1']:
-        score += 10
-    if analysis['readability_score'] == 'Good':
-        score += 10
-    
-    analysis['seo_score'] = score
+        count = int(row[f'keyword_count:{keyword}'])
+        density = (count / word_count) * 100 if word_count else 0
+        analysis["keyword_density"][keyword] = {
+            "count": count,
+            "density": f"{density:.1f}%"
+        }
     
     return analysis
 
+# Vectorized SEO scoring
+CTA_TERMS = ('contact', 'schedule', 'book', 'visit', 'tour', 'call')
+SEO_EXTRA_KEYWORDS = ('meeting room', 'business')
+NON_ASCII_WHITESPACE = re.compile(r'[^\S\x00-\x7f]')
+ASCII_WHITESPACE_BYTES = bytes([9, 10, 11, 12, 13, 28, 29, 30, 31, 32])
+ASCII_WHITESPACE = np.zeros(256, dtype=bool)
+ASCII_WHITESPACE[list(ASCII_WHITESPACE_BYTES)] = True
+
+TEXT_STATISTICS_CHUNK_CHARS = 256 * 1024  # small enough for the NumPy buffers to stay in CPU cache
+
+def text_statistics(texts):
+    """Word count, sentence count and words within sentences for each text.
+    
+    Words follow str.split() and sentences are the non-blank parts of str.split('.'), so
+    "3.5" counts as one word but splits into two sentence words, as in the per-row analysis.
+    Texts are processed in chunks of about TEXT_STATISTICS_CHUNK_CHARS, one NumPy pass each.
+    """
+    if not texts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    results = []
+    start = 0
+    chunk_chars = 0
+    for end, text in enumerate(texts, 1):
+        chunk_chars += len(text) + 1
+        if chunk_chars >= TEXT_STATISTICS_CHUNK_CHARS or end == len(texts):
+            results.append(chunk_text_statistics(texts[start:end]))
+            start = end
+            chunk_chars = 0
+    return tuple(np.concatenate(counts) for counts in zip(*results))
+
+def chunk_text_statistics(texts):
+    """text_statistics for a non-empty list of texts, in one NumPy pass over all of them"""
+    texts = [text if text.isascii() else NON_ASCII_WHITESPACE.sub(' ', text) for text in texts]
+    
+    # Join every text into one byte buffer; the newline between rows is a word and sentence break
+    joined = '\n'.join(texts)
+    encoded = joined.encode('utf-8')
+    buffer = np.frombuffer(encoded, dtype=np.uint8)
+    if joined.isascii():
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    else:
+        lengths = np.fromiter((len(text.encode('utf-8')) for text in texts), dtype=np.int64, count=len(texts))
+    boundaries = np.concatenate(([0], np.cumsum(lengths + 1)))
+    boundaries[-1] = len(buffer)
+    
+    # Everything up to the space byte is whitespace except a few rare control characters
+    whitespace = buffer <= 32
+    controls = np.flatnonzero(buffer < 32)
+    whitespace[controls] = ASCII_WHITESPACE[buffer[controls]]
+    dots = buffer == ord('.')
+    
+    def count_per_text(flags, boundaries):
+        # The padding byte keeps reduceat in bounds when trailing texts are empty
+        counts = np.add.reduceat(np.append(flags, False).view(np.uint8), boundaries[:-1], dtype=np.int32)
+        counts[boundaries[:-1] == boundaries[1:]] = 0
+        return counts.astype(np.int64)
+    
+    def starts(breaks, boundaries):
+        previous = np.concatenate(([True], breaks[:-1]))
+        previous[boundaries[:-1][boundaries[:-1] < len(breaks)]] = True
+        return ~breaks & previous
+    
+    word_counts = count_per_text(starts(whitespace, boundaries), boundaries)
+    sentence_word_counts = count_per_text(starts(whitespace | dots, boundaries), boundaries)
+    
+    # With whitespace removed, a sentence starts at every non-dot that follows a dot
+    marks = ~whitespace
+    mark_boundaries = np.concatenate(([0], np.cumsum(count_per_text(marks, boundaries))))
+    mark_dots = np.frombuffer(encoded.translate(None, ASCII_WHITESPACE_BYTES), dtype=np.uint8) == ord('.')
+    sentence_starts = starts(mark_dots, mark_boundaries)
+    sentence_counts = count_per_text(sentence_starts, mark_boundaries)
+    
+    return word_counts, sentence_counts, sentence_word_counts
+
+def score_seo_frame(df, keywords=(), content=None):
+    """SEO analysis of every row of df that has content, computed column-wise.
+    
+    content defaults to the Generated Content column and must share df's index. Returns a
+    DataFrame indexed by the analyzed rows with one column per analysis field, plus a
+    'keyword_count:<keyword>' column for each of keywords.
+    """
+    if content is None:
+        content = df['Generated Content'] if 'Generated Content' in df else pd.Series(dtype=object)
+    content = content.reindex(df.index)
+    content = content[content.map(lambda text: isinstance(text, str) and text != '')]
+    
+    def text_column(column):
+        return df[column].reindex(content.index).tolist() if column in df else [None] * len(content)
+    
+    texts = content.tolist()
+    word_counts, sentence_counts, sentence_word_counts = text_statistics(texts)
+    avg_sentence_length = np.divide(
+        sentence_word_counts, sentence_counts,
+        out=np.zeros(len(content), dtype=float), where=sentence_counts > 0
+    )
+    
+    # The remaining checks each read a text once, so they run together while it is in cache
+    has_address = []
+    location_mentions = []
+    has_cta = []
+    paragraph_counts = []
+    has_h1 = []
+    for text, address, city in zip(texts, text_column('Address'), text_column('City')):
+        lowered = text.lower()
+        has_address.append(isinstance(address, str) and address != '' and address in text)
+        location_mentions.append(lowered.count(city.lower()) if isinstance(city, str) and city else 0)
+        has_cta.append(any(map(lowered.__contains__, CTA_TERMS)))
+        paragraphs = text.split('\n\n')
+        paragraph_counts.append(len(paragraphs) - paragraphs.count('') - sum(map(str.isspace, paragraphs)))
+        has_h1.append(text.lstrip().startswith('#'))
+    
+    scores = pd.DataFrame({
+        'word_count': word_counts,
+        'has_address': np.array(has_address, dtype=bool),
+        'location_mentions': np.array(location_mentions, dtype=np.int64),
+        'has_cta': np.array(has_cta, dtype=bool),
+        'paragraph_count': np.array(paragraph_counts, dtype=np.int64),
+        'has_h1': np.array(has_h1, dtype=bool),
+        'avg_sentence_length': [round(length, 1) for length in avg_sentence_length.tolist()],
+        'readability_score': np.where(avg_sentence_length < 20, 'Good', 'Complex')
+    }, index=content.index)
+    
+    scores['seo_score'] = (
+        20 * scores['word_count'].between(150, 300)
+        + 20 * scores['has_address']
+        + 20 * (scores['location_mentions'] >= 2)
+        + 20 * scores['has_cta']
+        + 10 * scores['has_h1']
+        + 10 * (scores['readability_score'] == 'Good')
+    ).astype(int)
+    
+    # Only the single-property analysis reads keyword counts, so bulk scoring skips them
+    keywords = [keyword for keyword in dict.fromkeys(keywords) if keyword]
+    if keywords:
+        matcher = get_term_matcher(tuple(keywords))
+        term_counts = [matcher.counts(text) for text in texts]
+        for keyword in keywords:
+            scores[f'keyword_count:{keyword}'] = [counts[keyword] for counts in term_counts]
+    
+    return scores
+
+FEATURE_KEYWORDS = {
+    'meeting': 'meeting rooms',
+    'parking': 'parking',
+    '24/7': '24/7 access',
+    'security': 'secure access',
+    'wifi': 'high-speed internet',
+    'furnished': 'furnished offices',
+    'flexible': 'flexible terms'
+}
+
 def generate_meta_description(property_data, content):
     """Generate SEO-friendly meta description"""
     property_name = property_data.get('Property Name', 'Office Space')
@@ -369,20 +854,8 @@ def generate_meta_description(property_data, content):
     neighborhood = property_data.get('Neighborhood', '')
     
     # Extract key features from content
-    features = []
-    feature_keywords = {
-        'meeting': 'meeting rooms',
-        'parking': 'parking',
-        '24/7': '24/7 access',
-        'security': 'secure access',
-        'wifi': 'high-speed internet',
-        'furnished': 'furnished offices',
-        'flexible': 'flexible terms'
-    }
-    
-    for keyword, feature in feature_keywords.items():
-        if keyword in content.lower():
-            features.append(feature)
+    found_keywords = set(get_term_matcher(tuple(FEATURE_KEYWORDS)).found(content))
+    features = [feature for keyword, feature in FEATURE_KEYWORDS.items() if keyword in found_keywords]
     
     features_text = ', '.join(features[:2]) if features else 'premium amenities'
     
@@ -460,201 +933,1970 @@ Schedule your tour of {property_name} today and discover why leading businesses
     
     return content
 
-# Function to make direct HTTP request to Anthropic API
-def call_anthropic_api(prompt, api_key, model="claude-3-sonnet-20240229"):
-    """Make a direct HTTP request to the Anthropic API instead of using the SDK"""
-    add_debug(f"Making direct HTTP request to Anthropic API using model: {model}")
-    
-    headers = {
-        "x-api-key": api_key,
-        "content-type": "application/json",
-        "anthropic-version": "2023-06-01"
-    }
-    
-    data = {
-        "model": model,
-        "max_tokens": 1500,
-        "temperature": 0.7,
-        "system": "You are an SEO content specialist writing optimized commercial real estate descriptions that rank well on Google.",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
-    
-    try:
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers=headers,
-            json=data
-        )
+# Adaptive rate limiting driven by Anthropic rate-limit headers
+RATE_LIMIT_HEADER_PREFIXES = {
+    "requests": ["anthropic-ratelimit-requests"],
+    "tokens": ["anthropic-ratelimit-tokens", "anthropic-ratelimit-input-tokens"]
+}
+
+class RateLimiter:
+    """Token-bucket limiter tracking requests/minute and tokens/minute budgets.
+
+    Bucket sizes and levels are learned from the anthropic-ratelimit-* response headers,
+    so calls run unthrottled until the API reports its limits and are then paced at the
+    highest rate that stays inside them. A retry-after header blocks all callers until
+    it expires. Safe to share between worker threads.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {"requests": None, "tokens": None}
+        self._blocked_until = 0.0
+        self._last_refill = time.monotonic()
+        self.total_wait = 0.0
+    
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        for bucket in self._buckets.values():
+            if bucket:
+                bucket["level"] = min(bucket["capacity"], bucket["level"] + elapsed * bucket["rate"])
+    
+    def acquire(self, tokens=0):
+        """Block until a request of roughly `tokens` tokens fits in both budgets. Returns seconds waited."""
+        needed = {"requests": 1, "tokens": tokens}
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(0.0, self._blocked_until - now)
+                for name, bucket in self._buckets.items():
+                    if bucket:
+                        # A request bigger than the whole bucket goes through once the bucket is full
+                        shortfall = min(needed[name], bucket["capacity"]) - bucket["level"]
+                        if shortfall > 0:
+                            wait = max(wait, shortfall / bucket["rate"])
+                if wait <= 0:
+                    for name, bucket in self._buckets.items():
+                        if bucket:
+                            bucket["level"] -= needed[name]
+                    self.total_wait += waited
+                    return waited
+            time.sleep(wait)
+            waited += wait
+    
+    def update_from_headers(self, headers):
+        """Resynchronise both buckets with the limits and remaining budget reported by the API"""
+        headers = {k.lower(): v for k, v in headers.items()}
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            for name, prefixes in RATE_LIMIT_HEADER_PREFIXES.items():
+                for prefix in prefixes:
+                    try:
+                        limit = float(headers[f"{prefix}-limit"])
+                        remaining = float(headers[f"{prefix}-remaining"])
+                    except (KeyError, ValueError):
+                        continue
+                    if limit <= 0:
+                        continue
+                    current = self._buckets[name]
+                    # Requests still in flight have been reserved locally but are not yet counted by the server
+                    level = min(remaining, current["level"]) if current else remaining
+                    self._buckets[name] = {"capacity": limit, "rate": limit / 60.0, "level": level}
+                    break
+            
+            retry_after = headers.get("retry-after")
+            if retry_after:
+                try:
+                    self._blocked_until = max(self._blocked_until, now + float(retry_after))
+                except ValueError:
+                    pass
+    
+    def snapshot(self):
+        """Current budgets for display in the debug panel"""
+        with self._lock:
+            self._refill(time.monotonic())
+            state = {
+                name: f"{bucket['level']:.0f}/{bucket['capacity']:.0f}" if bucket else "unknown"
+                for name, bucket in self._buckets.items()
+            }
+            state["total_wait"] = f"{self.total_wait:.1f}s"
+            return state
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter(api_key):
+    """One limiter per API key, shared by every session and worker thread using that key"""
+    return RateLimiter()
+
+def estimate_tokens(text):
+    """Rough token estimate (about 4 characters per token) used to reserve budget before a call"""
+    return len(text) // 4
+
+# Retry policy for transient API failures
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+MAX_API_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 30.0
+
+class AnthropicAPIError(Exception):
+    """Raised when an API call fails for good, after any retries"""
+    
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retries = 0
+
+def is_retryable_response(response):
+    """Decide whether a failed response is worth retrying"""
+    # The API can say explicitly whether a retry will help
+    should_retry = response.headers.get("x-should-retry", "").lower()
+    if should_retry in ("true", "false"):
+        return should_retry == "true"
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+def parse_retry_after(headers):
+    """Seconds from a numeric retry-after header, or None"""
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Capped exponential backoff with full jitter, never shorter than the server's retry-after"""
+    delay = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+# Request metrics shared by every session, for the metrics dashboard
+METRICS_JSONL_PATH = os.environ.get("METRICS_JSONL_PATH")  # also append every event to this file when set
+
+@st.cache_resource(show_spinner=False)
+def get_metrics_store():
+    """Metric events of every API call and page fetch made by this server process"""
+    return MetricsStore(jsonl_path=METRICS_JSONL_PATH)
+
+def record_api_call(stats):
+    """Keep per-call retry statistics for the monitoring panel and the metrics dashboard"""
+    call_log = session_state().api_call_stats
+    call_log.append(stats)
+    if len(call_log) > 200:  # Keep only the most recent calls
+        del call_log[:-200]
+    get_metrics_store().record(
+        "api",
+        {"model": stats["model"], "status": stats["status_code"] or "no response"},
+        **{field: value for field, value in stats.items() if field not in ("time", "model", "status_code")}
+    )
+
+def record_page_fetch(url, start, response=None, error=None):
+    """Record a page download for the metrics dashboard"""
+    get_metrics_store().record(
+        "scrape",
+        {"status": response.status_code if response is not None else "no response"},
+        host=urlparse(url).netloc.lower(),
+        ok=error is None,
+        wall_seconds=round(time.monotonic() - start, 3),
+        ttfb_seconds=round(response.elapsed.total_seconds(), 3) if response is not None else None,
+        bytes=len(response.content) if response is not None else 0,
+        redirects=len(response.history) if response is not None else 0,
+        error=error
+    )
+
+# Persistent content cache
+CONTENT_CACHE_PATH = os.environ.get("CONTENT_CACHE_PATH", os.path.join(".cache", "content_cache.sqlite3"))
+CONTENT_CACHE_MAX_ENTRIES = 20000
+CONTENT_CACHE_MAX_AGE_DAYS = 30
+CONTENT_CACHE_PRUNE_EVERY = 200  # puts between eviction passes, so the cache can briefly hold this many extra entries
+
+class ContentCache:
+    """SQLite-backed cache of generated content keyed by a hash of the full API request.
+    
+    The key covers the final prompt, system prompt, model, temperature and max_tokens, so
+    any change to the property data or settings produces a new key. Entries unused for
+    max_age_days are dropped and the least recently used are evicted past max_entries,
+    on opening and then every CONTENT_CACHE_PRUNE_EVERY puts.
+    """
+    
+    def __init__(self, path, max_entries=CONTENT_CACHE_MAX_ENTRIES, max_age_days=CONTENT_CACHE_MAX_AGE_DAYS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_prune = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS content_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, content TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS content_cache_last_used ON content_cache (last_used)")
+            self._prune(time.time())
+    
+    @staticmethod
+    def make_key(request_data):
+        payload = json.dumps(request_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT content FROM content_cache WHERE key = ? AND last_used >= ?",
+                (key, now - self.max_age_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE content_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key, model, content):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO content_cache (key, model, content, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now)
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= CONTENT_CACHE_PRUNE_EVERY:
+                self._prune(now)
+    
+    def _prune(self, now):
+        """Drop expired entries and evict the least recently used past max_entries; call with the lock held"""
+        self._conn.execute("DELETE FROM content_cache WHERE last_used < ?", (now - self.max_age_seconds,))
+        self._conn.execute(
+            "DELETE FROM content_cache WHERE key IN "
+            "(SELECT key FROM content_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self._puts_since_prune = 0
+    
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM content_cache")
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM content_cache").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+@st.cache_resource(show_spinner=False)
+def get_content_cache():
+    """Content cache shared by every session in this server process"""
+    return ContentCache(CONTENT_CACHE_PATH)
+
+# Function to make direct HTTP request to Anthropic API
+ANTHROPIC_API_URL = os.environ.get("ANTHROPIC_API_URL", "https://api.anthropic.com").rstrip("/")
+SYSTEM_PROMPT = "You are an SEO content specialist writing optimized commercial real estate descriptions that rank well on Google."
+
+def anthropic_headers(api_key):
+    """Headers required on every Anthropic API request"""
+    return {
+        "x-api-key": api_key,
+        "content-type": "application/json",
+        "anthropic-version": "2023-06-01"
+    }
+
+def build_message_request(prompt, model, shared_prompt=None):
+    """Messages API request body for a generation prompt.
+    
+    A shared_prompt is sent as a leading block marked for prompt caching, followed by
+    the property-specific prompt, so repeated calls reuse the cached prefix.
+    """
+    if shared_prompt:
+        content = [
+            {"type": "text", "text": shared_prompt, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt}
+        ]
+    else:
+        content = prompt
+    
+    return {
+        "model": model,
+        "max_tokens": 1500,
+        "temperature": 0.7,
+        "system": SYSTEM_PROMPT,
+        "messages": [
+            {"role": "user", "content": content}
+        ]
+    }
+
+def call_anthropic_api(prompt, api_key, model="claude-3-sonnet-20240229", session=None, use_cache=True, shared_prompt=None, on_text=None, on_stats=None):
+    """Make a direct HTTP request to the Anthropic API instead of using the SDK.
+    
+    Identical requests are answered from the persistent content cache unless use_cache
+    is False. Rate limits (429), overloads (529), 5xx responses and connection errors are
+    retried with backoff. Raises AnthropicAPIError once retries run out or the error is
+    permanent. When on_text is given the response is streamed and each text delta is
+    passed to it as it arrives. on_stats receives the call's token and latency statistics.
+    """
+    add_debug(f"Making direct HTTP request to Anthropic API using model: {model}")
+    
+    headers = anthropic_headers(api_key)
+    data = build_message_request(prompt, model, shared_prompt)
+    
+    cache = get_content_cache()
+    cache_key = cache.make_key(data)
+    if use_cache:
+        cached_content = cache.get(cache_key)
+        if cached_content is not None:
+            add_debug(f"Content cache hit ({len(cached_content)} characters)")
+            if on_text is not None:
+                on_text(cached_content)
+            return cached_content
+    
+    # The stream flag is left out of the cache key so streamed and plain calls share entries
+    streaming = on_text is not None
+    if streaming:
+        data["stream"] = True
+    
+    limiter = get_rate_limiter(api_key)
+    http = session if session is not None else get_api_session()
+    body = json.dumps(data).encode("utf-8")
+    call_start = time.monotonic()
+    stats = {
+        "time": datetime.now().strftime("%H:%M:%S"),
+        "model": model,
+        "status_code": None,
+        "retries": 0,
+        "backoff_seconds": 0.0,
+        "ok": False,
+        "input_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0,
+        "output_tokens": 0,
+        "ttft_seconds": None,
+        "ttfb_seconds": None,
+        "latency_seconds": None,
+        "wall_seconds": None,
+        "stop_reason": None,
+        "request_bytes": 0,
+        "response_bytes": 0,
+        "error": None
+    }
+    
+    def emit_text(text):
+        if stats["ttft_seconds"] is None:
+            stats["ttft_seconds"] = round(time.monotonic() - request_start, 3)
+        on_text(text)
+    
+    try:
+        for attempt in range(MAX_API_RETRIES + 1):
+            waited = limiter.acquire(estimate_tokens(data["system"] + (shared_prompt or "") + prompt))
+            if waited > 0:
+                add_debug(f"Rate limiter paused {waited:.1f}s before request")
+            
+            retry_after = None
+            request_start = time.monotonic()
+            try:
+                stats["request_bytes"] += len(body)
+                response = http.post(
+                    f"{ANTHROPIC_API_URL}/v1/messages",
+                    headers=headers,
+                    data=body,
+                    timeout=API_TIMEOUT,
+                    stream=streaming
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                add_debug(f"Request error: {str(e)}")
+                error = AnthropicAPIError(f"API request error: {str(e)}", retryable=True)
+            else:
+                limiter.update_from_headers(response.headers)
+                stats["status_code"] = response.status_code
+                stats["ttfb_seconds"] = round(response.elapsed.total_seconds(), 3)
+                if not streaming or response.status_code != 200:
+                    stats["response_bytes"] += len(response.content)
+                
+                # Save full response for debugging (a streamed body can only be read once)
+                session_state().api_response = {
+                    "status_code": response.status_code,
+                    "headers": dict(response.headers),
+                    "response": "(streamed)" if streaming and response.status_code == 200 else response.text
+                }
+                
+                if response.status_code == 200:
+                    try:
+                        if streaming:
+                            all_content, usage, stop_reason = read_message_stream(response, emit_text)
+                        else:
+                            all_content, usage, stop_reason = read_message_response(response)
+                    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                        # A broken stream can only be retried safely before any text reached the caller
+                        add_debug(f"Stream interrupted: {str(e)}")
+                        error = AnthropicAPIError(f"Stream interrupted: {str(e)}", status_code=200, retryable=stats["ttft_seconds"] is None)
+                    except AnthropicAPIError as e:
+                        error = e
+                    else:
+                        stats["ok"] = True
+                        stats["stop_reason"] = stop_reason
+                        if streaming:
+                            # Bytes read off the wire, as the streamed body is not kept
+                            stats["response_bytes"] += response.raw.tell()
+                        stats["latency_seconds"] = round(time.monotonic() - request_start, 3)
+                        for field in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens"):
+                            stats[field] = usage.get(field) or 0
+                        add_debug(f"Tokens: {stats['input_tokens']} input, {stats['cache_read_input_tokens']} cache read, "
+                                  f"{stats['cache_creation_input_tokens']} cache write, {stats['output_tokens']} output")
+                        if streaming:
+                            add_debug(f"Time to first token: {stats['ttft_seconds']}s, total latency: {stats['latency_seconds']}s")
+                        else:
+                            add_debug(f"Total latency: {stats['latency_seconds']}s")
+                        cache.put(cache_key, model, all_content)
+                        add_debug(f"Successfully extracted content of length: {len(all_content)}")
+                        return all_content
+                else:
+                    add_debug(f"API Error: Status {response.status_code}, Response: {response.text[:200]}...")
+                    error = AnthropicAPIError(
+                        f"API Error: Status {response.status_code}",
+                        status_code=response.status_code,
+                        retryable=is_retryable_response(response)
+                    )
+                    retry_after = parse_retry_after(response.headers)
+            
+            if not error.retryable or attempt == MAX_API_RETRIES:
+                error.retries = stats["retries"]
+                stats["error"] = str(error)
+                raise error
+            
+            delay = backoff_delay(attempt, retry_after)
+            stats["retries"] += 1
+            stats["backoff_seconds"] += delay
+            add_debug(f"Retrying in {delay:.1f}s (attempt {attempt + 2}/{MAX_API_RETRIES + 1})")
+            time.sleep(delay)
+    finally:
+        stats["wall_seconds"] = round(time.monotonic() - call_start, 3)
+        record_api_call(stats)
+        if on_stats is not None:
+            on_stats(stats)
+
+def read_message_response(response):
+    """Text, token usage and stop reason of a successful Messages API response"""
+    try:
+        response_data = response.json()
+    except ValueError:
+        raise AnthropicAPIError("Invalid JSON in API response", status_code=response.status_code)
+    return extract_message_text(response_data, status_code=response.status_code), response_data.get("usage", {}), response_data.get("stop_reason")
+
+def read_message_stream(response, on_text):
+    """Consume a Messages API server-sent event stream, passing each text delta to on_text.
+    
+    Returns the full text and the token usage and stop reason reported by the stream.
+    """
+    # SSE bodies are UTF-8, but the content type rarely says so
+    response.encoding = response.encoding or "utf-8"
+    all_content = ""
+    usage = {}
+    stop_reason = None
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        event = json.loads(line[len("data:"):].strip())
+        event_type = event.get("type")
+        if event_type == "message_start":
+            usage.update(event.get("message", {}).get("usage", {}))
+        elif event_type == "content_block_delta" and event.get("delta", {}).get("type") == "text_delta":
+            text = event["delta"].get("text", "")
+            all_content += text
+            on_text(text)
+        elif event_type == "message_delta":
+            usage.update(event.get("usage", {}))
+            stop_reason = event.get("delta", {}).get("stop_reason", stop_reason)
+        elif event_type == "error":
+            error = event.get("error", {})
+            raise AnthropicAPIError(
+                f"Stream error: {error.get('type', 'error')} {error.get('message', '')}".strip(),
+                status_code=response.status_code,
+                retryable=not all_content and error.get("type") == "overloaded_error"
+            )
+    
+    if not all_content:
+        raise AnthropicAPIError("Empty response stream", status_code=response.status_code)
+    return all_content, usage, stop_reason
+
+def extract_message_text(message, status_code=None):
+    """Join the text blocks of a Messages API message object"""
+    if "content" in message and len(message["content"]) > 0:
+        all_content = ""
+        for content_item in message["content"]:
+            if content_item.get("type") == "text":
+                all_content += content_item.get("text", "")
+        return all_content
+    
+    add_debug(f"Empty or invalid response structure: {str(message)[:200]}...")
+    raise AnthropicAPIError("Empty or invalid API response structure", status_code=status_code)
+
+# Generation prompts, built from editable templates
+PROMPT_TEMPLATES_PATH = os.environ.get("PROMPT_TEMPLATES_PATH", os.path.join(".cache", "prompt_templates.json"))
+
+@st.cache_resource(show_spinner=False)
+def get_prompt_template_store():
+    """Saved prompt template versions shared by every session in this server process"""
+    return PromptTemplateStore(PROMPT_TEMPLATES_PATH)
+
+def active_prompt_templates():
+    """Compiled templates of the selected version, falling back to the built-in ones"""
+    version = session_state().prompt_template_version
+    saved = get_prompt_template_store().get(version) if version else None
+    if saved is None:
+        return compile_templates(DEFAULT_INSTRUCTIONS_TEMPLATE, DEFAULT_PROPERTY_TEMPLATE)
+    return compile_templates(saved["instructions"], saved["property_details"])
+
+def template_version_setting(version):
+    """Value of the prompt_template_version setting for a version; None means the built-in templates"""
+    return None if version == DEFAULT_TEMPLATE_VERSION else version
+
+def build_shared_prompt(templates=None):
+    """Build the part of the prompt shared by every property: requirements, keywords, excluded terms and examples.
+    
+    It is sent ahead of the property details as a cacheable block, so a batch only pays
+    full price for it once while the prompt cache is warm.
+    """
+    templates = templates or active_prompt_templates()
+    state = session_state()
+    return templates.shared_prompt(state.target_keywords, state.excluded_terms, state.example_copies)
+
+def build_property_prompt(property_data, templates=None):
+    """Build the property-specific part of the prompt that follows the shared instructions"""
+    return (templates or active_prompt_templates()).property_prompt(property_data)
+
+# Function to generate property description
+def generate_property_description(property_data, api_key, model=None, use_mock=False, session=None, use_cache=True, on_text=None, on_stats=None,
+                                  prompt=None, shared_prompt=None):
+    """Generate property description using direct API call or mock for testing.
+    
+    Pass on_text to stream the description, receiving text as it is generated. Batches pass
+    prompt and shared_prompt rendered up front; otherwise they are built from property_data.
+    """
+    try:
+        if model is None:
+            model = st.session_state.selected_model
+        
+        if shared_prompt is None:
+            shared_prompt = build_shared_prompt()
+        if prompt is None:
+            prompt = build_property_prompt(property_data)
+        
+        # For debugging, add the prompt to debug info
+        add_debug(f"Generated SEO-enhanced prompt with {len(shared_prompt)} shared + {len(prompt)} property characters")
+        
+        # Use mock content for testing or when API key is not available
+        if use_mock or not api_key:
+            add_debug("Using mock content generator (Test Mode)")
+            content = generate_mock_content(property_data)
+            if on_text is not None:
+                on_text(content)
+            return content
+            
+        # Use direct API call with selected model
+        return call_anthropic_api(prompt, api_key, model, session=session, use_cache=use_cache, shared_prompt=shared_prompt,
+                                  on_text=on_text, on_stats=on_stats)
+    
+    except Exception as e:
+        # Errors propagate so callers can mark the row as failed instead of storing error text
+        add_debug(f"Error in generate_property_description: {str(e)}")
+        raise
+
+def generate_with_metadata(property_data, api_key, model, use_mock=False, **kwargs):
+    """generate_property_description, also returning the model, token usage and latency of the call"""
+    usage = {}
+    start = time.monotonic()
+    content = generate_property_description(property_data, api_key, model, use_mock=use_mock, on_stats=usage.update, **kwargs)
+    metadata = {
+        "model": "test-mode" if use_mock or not api_key else model,
+        # Content cache hits make no API call and so use no tokens
+        "input_tokens": sum(usage.get(field, 0) for field in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")),
+        "output_tokens": usage.get("output_tokens", 0),
+        "latency_seconds": round(time.monotonic() - start, 3)
+    }
+    return content, metadata
+
+def stream_to_placeholder(placeholder, min_interval=0.05):
+    """on_text callback that renders streamed text into a Streamlit placeholder as it arrives"""
+    streamed = {"text": "", "last_render": 0.0}
+    
+    def on_text(text):
+        streamed["text"] += text
+        now = time.monotonic()
+        # Limit redraws so long responses do not flood the browser with updates
+        if now - streamed["last_render"] >= min_interval:
+            placeholder.markdown(streamed["text"] + "▌")
+            streamed["last_render"] = now
+    
+    return on_text
+
+# Concurrent batch generation engine
+def generate_descriptions_concurrently(jobs, api_key, model, use_mock=False, max_workers=5, prompts=None, shared_prompt=None):
+    """Generate descriptions for (idx, property_data) jobs with at most max_workers calls in flight.
+
+    Yields (idx, property_data, content, error, metadata) as each call finishes, so results
+    can be stored and displayed while the rest of the batch is still running. error is the
+    exception raised for that row, or None on success; metadata is the generate_with_metadata
+    dict, or None on failure. prompts, if given, holds each job's rendered property prompt.
+    """
+    session = get_api_session(max_workers)
+    if prompts is None:
+        prompts = [None] * len(jobs)
+    
+    def generate_one(property_data, prompt):
+        # Pacing against the API's rate limits happens inside call_anthropic_api
+        return generate_with_metadata(property_data, api_key, model, use_mock=use_mock, session=session,
+                                      prompt=prompt, shared_prompt=shared_prompt)
+    
+    # Worker threads read settings and write debug info through session state
+    executor = ThreadPoolExecutor(max_workers=max_workers, initializer=thread_context_initializer())
+    try:
+        futures = {
+            executor.submit(generate_one, property_data, prompt): (idx, property_data)
+            for (idx, property_data), prompt in zip(jobs, prompts)
+        }
+        for future in as_completed(futures):
+            idx, property_data = futures[future]
+            try:
+                content, metadata = future.result()
+                yield idx, property_data, content, None, metadata
+            except Exception as e:
+                yield idx, property_data, None, e, None
+    finally:
+        # Drop queued rows if the consumer stops early; calls already in flight still reach the content cache
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Message Batches API mode for large offline regenerations
+MESSAGE_BATCHES_PATH = os.environ.get("MESSAGE_BATCHES_PATH", os.path.join(".cache", "message_batches.json"))
+MAX_BATCH_REQUESTS = 10000
+BATCH_POLL_SECONDS = int(os.environ.get("BATCH_POLL_SECONDS", "30"))
+
+def store_generated_content(idx, property_data, content, metadata=None):
+    """Record generated content for a row along with its meta description and generation metadata"""
+    if 'Generated Content' not in st.session_state.df:
+        st.session_state.df['Generated Content'] = pd.Series(np.nan, index=st.session_state.df.index, dtype=object)
+    st.session_state.generated_content[idx] = content
+    st.session_state.df.at[idx, 'Generated Content'] = content
+    st.session_state.meta_descriptions[idx] = generate_meta_description(property_data, content)
+    if metadata is not None:
+        st.session_state.generation_metadata[idx] = metadata
+    st.session_state.failed_rows.pop(idx, None)
+    st.session_state.unsaved_rows.add(idx)
+    st.session_state.content_version += 1
+
+def load_batch_jobs():
+    """Submitted message batches, persisted so results can be collected after a restart"""
+    if not os.path.exists(MESSAGE_BATCHES_PATH):
+        return []
+    with open(MESSAGE_BATCHES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_batch_jobs(jobs):
+    with atomic_write(MESSAGE_BATCHES_PATH, encoding="utf-8") as f:
+        json.dump(jobs, f, indent=2)
+
+def anthropic_batch_request(method, url, api_key, **kwargs):
+    """Call a Message Batches endpoint, raising AnthropicAPIError on an error status"""
+    response = get_api_session().request(method, url, headers=anthropic_headers(api_key), timeout=API_TIMEOUT, **kwargs)
+    if response.status_code >= 400:
+        add_debug(f"Batch API Error: Status {response.status_code}, Response: {response.text[:200]}...")
+        raise AnthropicAPIError(
+            f"Batch API Error: Status {response.status_code}",
+            status_code=response.status_code,
+            retryable=is_retryable_response(response)
+        )
+    return response
+
+def submit_message_batches(rows, api_key, model):
+    """Submit (idx, property_data) rows as Message Batches, skipping rows already in the content cache.
+    
+    Returns the newly submitted batch jobs. Each job is persisted as soon as its batch
+    is accepted, so an interrupted submission never loses a batch ID.
+    """
+    jobs = load_batch_jobs()
+    cache = get_content_cache()
+    batch_requests = []
+    templates = active_prompt_templates()
+    shared_prompt = build_shared_prompt(templates)
+    
+    for idx, property_data in rows:
+        params = build_message_request(build_property_prompt(property_data, templates), model, shared_prompt)
+        cache_key = cache.make_key(params)
+        cached_content = cache.get(cache_key)
+        if cached_content is not None:
+            store_generated_content(idx, property_data, cached_content)
+            continue
+        batch_requests.append((idx, property_data, params, cache_key))
+    
+    submitted = []
+    for start in range(0, len(batch_requests), MAX_BATCH_REQUESTS):
+        chunk = batch_requests[start:start + MAX_BATCH_REQUESTS]
+        payload = []
+        row_map = {}
+        for idx, property_data, params, cache_key in chunk:
+            custom_id = f"row-{idx}"
+            payload.append({"custom_id": custom_id, "params": params})
+            row_map[custom_id] = {
+                "idx": idx,
+                "name": str(property_data.get('Property Name', f'Property #{idx}')),
+                "cache_key": cache_key
+            }
+        
+        batch = anthropic_batch_request("POST", f"{ANTHROPIC_API_URL}/v1/messages/batches", api_key, json={"requests": payload}).json()
+        job = {
+            "batch_id": batch["id"],
+            "submitted": datetime.now().isoformat(timespec="seconds"),
+            "model": model,
+            "status": batch.get("processing_status", "in_progress"),
+            "request_counts": batch.get("request_counts", {}),
+            "results_url": batch.get("results_url"),
+            "rows": row_map,
+            "merged": False
+        }
+        jobs.append(job)
+        save_batch_jobs(jobs)
+        submitted.append(job)
+        add_debug(f"Submitted message batch {job['batch_id']} with {len(payload)} requests")
+    
+    return submitted
+
+def refresh_message_batch(job, api_key):
+    """Update a job with the batch's current processing status"""
+    batch = anthropic_batch_request("GET", f"{ANTHROPIC_API_URL}/v1/messages/batches/{job['batch_id']}", api_key).json()
+    job["status"] = batch.get("processing_status", job["status"])
+    job["request_counts"] = batch.get("request_counts", {})
+    job["results_url"] = batch.get("results_url")
+    return job
+
+def iter_message_batch_results(job, api_key):
+    """Stream the JSONL results of an ended batch"""
+    response = anthropic_batch_request("GET", job["results_url"], api_key, stream=True)
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.strip():
+            yield json.loads(line)
+
+def collect_message_batch(job, results):
+    """Merge the results of an ended batch into the loaded properties by row index.
+    
+    Every succeeded result goes into the content cache, whether or not its row is loaded.
+    Rows whose property name does not match the loaded data are skipped, so results are
+    never attached to the wrong property after a different file is loaded; the job is only
+    marked merged once all of its rows have been applied, so skipped rows can be merged
+    after the right file is loaded again. Returns (succeeded, failed, skipped) counts.
+    """
+    df = st.session_state.df
+    cache = get_content_cache()
+    applied = set(job.setdefault("applied", []))
+    succeeded = failed = skipped = 0
+    for result in results:
+        custom_id = result.get("custom_id")
+        row = job["rows"].get(custom_id)
+        if row is None or custom_id in applied:
+            continue
+        idx = row["idx"]
+        outcome = result.get("result", {})
+        content = None
+        error = None
+        try:
+            if outcome.get("type") != "succeeded":
+                error_message = outcome.get("error", {}).get("error", {}).get("message", "")
+                raise AnthropicAPIError(f"Batch request {outcome.get('type', 'failed')} {error_message}".strip())
+            content = extract_message_text(outcome.get("message", {}))
+            cache.put(row["cache_key"], job["model"], content)
+        except AnthropicAPIError as e:
+            error = e
+        
+        if idx >= len(df) or str(df.iloc[idx].get('Property Name', f'Property #{idx}')) != row["name"]:
+            skipped += 1
+            continue
+        
+        if error is not None:
+            st.session_state.failed_rows[idx] = {"error": str(error), "status_code": error.status_code, "retries": 0}
+            failed += 1
+        else:
+            store_generated_content(idx, df.iloc[idx].to_dict(), content)
+            succeeded += 1
+        applied.add(custom_id)
+    
+    job["applied"] = sorted(applied)
+    job["merged"] = len(applied) == len(job["rows"])
+    add_debug(f"Merged batch {job['batch_id']}: {succeeded} succeeded, {failed} failed, {skipped} skipped")
+    return succeeded, failed, skipped
+
+def process_message_batches(api_key):
+    """Refresh every unmerged batch and merge those that have ended into the loaded data"""
+    jobs = load_batch_jobs()
+    for job in jobs:
+        if job["merged"]:
+            continue
+        refresh_message_batch(job, api_key)
+        if job["status"] == "ended" and st.session_state.df is not None:
+            collect_message_batch(job, iter_message_batch_results(job, api_key))
+        save_batch_jobs(jobs)
+    return jobs
+
+def apply_message_batch_update(refreshed, results):
+    """Save a batch refreshed by the batch wait job and merge its results, if it has ended"""
+    jobs = load_batch_jobs()
+    job = next((job for job in jobs if job["batch_id"] == refreshed["batch_id"]), None)
+    if job is None or job["merged"]:
+        return
+    for field in ("status", "request_counts", "results_url"):
+        job[field] = refreshed[field]
+    if results is not None and st.session_state.df is not None:
+        collect_message_batch(job, results)
+    save_batch_jobs(jobs)
+
+# Durable checkpoints for batch generation jobs
+GENERATION_JOURNAL_PATH = os.environ.get("GENERATION_JOURNAL_PATH", os.path.join(".cache", "generation_jobs.sqlite3"))
+
+class GenerationJournal:
+    """SQLite journal of batch generation jobs with a checkpoint for every finished row.
+    
+    Each row is committed as soon as its result arrives, so a job interrupted by a closed
+    tab, an evicted session or a process restart can be resumed from its last completed
+    row without paying for that work again.
+    """
+    
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS generation_jobs ("
+                "job_id TEXT PRIMARY KEY, created TEXT NOT NULL, model TEXT, "
+                "total_rows INTEGER NOT NULL, status TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_rows ("
+                "job_id TEXT NOT NULL, idx INTEGER NOT NULL, name TEXT, content TEXT, error TEXT, "
+                "finished TEXT NOT NULL, PRIMARY KEY (job_id, idx))"
+            )
+    
+    def create_job(self, model, total_rows):
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO generation_jobs (job_id, created, model, total_rows, status) VALUES (?, ?, ?, ?, 'running')",
+                (job_id, datetime.now().isoformat(timespec="seconds"), model, total_rows)
+            )
+        return job_id
+    
+    def record_row(self, job_id, idx, name, content=None, error=None):
+        """Checkpoint one finished row; a later success replaces an earlier failure"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_rows (job_id, idx, name, content, error, finished) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, idx, name, content, error, datetime.now().isoformat(timespec="seconds"))
+            )
+    
+    def completed_rows(self, job_id):
+        """{idx: (name, content)} for every row of the job that finished successfully"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, name, content FROM job_rows WHERE job_id = ? AND content IS NOT NULL", (job_id,)
+            ).fetchall()
+        return {idx: (name, content) for idx, name, content in rows}
+    
+    def set_status(self, job_id, status):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE generation_jobs SET status = ? WHERE job_id = ?", (status, job_id))
+    
+    def set_total_rows(self, job_id, total_rows):
+        """Update a job's size when rows are added to the data while it runs"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE generation_jobs SET total_rows = ? WHERE job_id = ?", (total_rows, job_id))
+    
+    def list_jobs(self, unfinished_only=False):
+        query = (
+            "SELECT j.job_id, j.created, j.model, j.total_rows, j.status, "
+            "COUNT(r.content), COUNT(r.error) "
+            "FROM generation_jobs j LEFT JOIN job_rows r ON r.job_id = j.job_id "
+        )
+        if unfinished_only:
+            query += "WHERE j.status = 'running' "
+        query += "GROUP BY j.job_id ORDER BY j.created DESC"
+        with self._lock:
+            rows = self._conn.execute(query).fetchall()
+        return [
+            {"job_id": job_id, "created": created, "model": model, "total_rows": total_rows,
+             "status": status, "completed": completed, "failed": failed}
+            for job_id, created, model, total_rows, status, completed, failed in rows
+        ]
+    
+    def delete_job(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM generation_jobs WHERE job_id = ?", (job_id,))
+
+@st.cache_resource(show_spinner=False)
+def get_generation_journal():
+    """Generation journal shared by every session in this server process"""
+    return GenerationJournal(GENERATION_JOURNAL_PATH)
+
+def resume_generation_job(job_id):
+    """Restore a job's checkpointed rows into the loaded data and queue the rest for generation.
+    
+    Checkpoints whose property name does not match the loaded row are ignored, so a job
+    is never resumed onto a different file. Returns (restored, skipped) counts.
+    """
+    df = st.session_state.df
+    restored = skipped = 0
+    for idx, (name, content) in get_generation_journal().completed_rows(job_id).items():
+        if idx < len(df) and str(df.iloc[idx].get('Property Name', f'Property #{idx}')) == name:
+            store_generated_content(idx, df.iloc[idx].to_dict(), content)
+            restored += 1
+        else:
+            skipped += 1
+    
+    st.session_state.current_job_id = job_id
+    add_debug(f"Resuming job {job_id}: restored {restored} rows, skipped {skipped}")
+    return restored, skipped
+
+# Background worker for long-running jobs
+BACKGROUND_WORKER_THREADS = int(os.environ.get("BACKGROUND_WORKER_THREADS", "4"))
+FINISHED_JOB_TTL_SECONDS = 3600
+
+class BackgroundJob:
+    """A batch generation, bulk scraping, file loading or message batch polling job executed by the background worker.
+    
+    The worker pushes every finished item onto the job and the owning session drains them
+    on its next rerun, so the page stays interactive while the batch runs.
+    """
+    
+    def __init__(self, kind, total, description, journal_job_id=None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.total = total
+        self.description = description
+        self.journal_job_id = journal_job_id
+        self.status = "queued"
+        self.error = None
+        self.done = 0
+        self.started = None
+        self.finished = None
+        self.state = None
+        self._results = deque()
+        self._cancel = threading.Event()
+    
+    def push(self, result, count=1):
+        """Hand a result to the owning session; count is how many items it completes"""
+        self._results.append(result)
+        self.done += count
+    
+    def drain(self):
+        """Remove and return every result pushed since the last drain"""
+        results = []
+        while self._results:
+            results.append(self._results.popleft())
+        return results
+    
+    def cancel(self):
+        self._cancel.set()
+    
+    def wait_cancelled(self, seconds):
+        """Sleep for up to seconds, returning True as soon as the job is cancelled"""
+        return self._cancel.wait(seconds)
+    
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+    
+    @property
+    def is_finished(self):
+        return self.status in ("completed", "failed", "cancelled")
+    
+    def rate_per_minute(self):
+        if not self.started:
+            return 0.0
+        elapsed = (self.finished or time.time()) - self.started
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+class BackgroundWorker:
+    """Queue-backed worker threads that run jobs independently of any script run.
+    
+    Jobs are submitted from a script run and keep going across reruns and after the tab is
+    closed. Each one runs against a snapshot of the submitting session's settings.
+    """
+    
+    def __init__(self, num_threads):
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        for i in range(num_threads):
+            threading.Thread(target=self._work, name=f"background-worker-{i}", daemon=True).start()
+    
+    def submit(self, job, target):
+        """Queue target(job) to run on a worker thread"""
+        job.state = snapshot_session_state()
+        with self._lock:
+            # Jobs whose session never came back to collect them are dropped after a while
+            cutoff = time.time() - FINISHED_JOB_TTL_SECONDS
+            for job_id, old_job in list(self._jobs.items()):
+                if old_job.is_finished and old_job.finished < cutoff:
+                    del self._jobs[job_id]
+            self._jobs[job.job_id] = job
+        self._queue.put((job, target))
+        return job
+    
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+    
+    def active_jobs(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.is_finished]
+    
+    def _work(self):
+        while True:
+            job, target = self._queue.get()
+            attach_job_state(threading.current_thread(), job.state)
+            if job.cancelled:
+                job.status = "cancelled"
+                job.finished = time.time()
+                continue
+            job.status = "running"
+            job.started = time.time()
+            try:
+                target(job)
+                job.status = "cancelled" if job.cancelled else "completed"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished = time.time()
+
+@st.cache_resource(show_spinner=False)
+def get_background_worker():
+    """Background worker shared by every session in this server process"""
+    return BackgroundWorker(BACKGROUND_WORKER_THREADS)
+
+def start_generation_job(use_mock=False):
+    """Queue every row without content for generation on the background worker.
+    
+    Settings are captured when the job is submitted. The worker checkpoints each row to
+    the generation journal; collect_background_results stores the rows in this session.
+    """
+    df = st.session_state.df
+    journal = get_generation_journal()
+    if st.session_state.current_job_id is None:
+        st.session_state.current_job_id = journal.create_job(st.session_state.selected_model, len(df))
+    journal_job_id = st.session_state.current_job_id
+    journal.set_status(journal_job_id, "running")
+    journal.set_total_rows(journal_job_id, len(df))
+    
+    # Only rows without content are sent for generation
+    pending_rows = [i for i in range(len(df)) if i not in st.session_state.generated_content]
+    pending_df = df.iloc[pending_rows]
+    pending_jobs = list(zip(pending_rows, pending_df.to_dict('records')))
+    # Templates are compiled once per batch: the shared instructions are rendered a single
+    # time and the property prompts straight from the pending rows' columns
+    templates = active_prompt_templates()
+    shared_prompt = build_shared_prompt(templates)
+    prompts = templates.property_prompts(pending_df)
+    api_key = st.session_state.api_key
+    model = st.session_state.selected_model
+    max_workers = st.session_state.batch_size
+    
+    def run(job):
+        failed = 0
+        results = generate_descriptions_concurrently(pending_jobs, api_key, model, use_mock=use_mock, max_workers=max_workers,
+                                                     prompts=prompts, shared_prompt=shared_prompt)
+        try:
+            for idx, property_data, content, error, metadata in results:
+                property_name = str(property_data.get('Property Name', f'Property #{idx}'))
+                if error is None:
+                    journal.record_row(journal_job_id, idx, property_name, content=content)
+                else:
+                    failed += 1
+                    journal.record_row(journal_job_id, idx, property_name, error=str(error))
+                job.push((idx, property_data, content, error, metadata))
+                if job.cancelled:
+                    break
+        finally:
+            results.close()
+        # A cancelled job stays 'running' in the journal so it can be resumed later
+        if not job.cancelled:
+            journal.set_status(journal_job_id, "completed_with_failures" if failed else "completed")
+    
+    job = BackgroundJob("generation", len(pending_jobs), f"Generating {len(pending_jobs)} descriptions", journal_job_id)
+    get_background_worker().submit(job, run)
+    st.session_state.background_jobs["generation"] = job.job_id
+    st.session_state.is_generating = True
+    add_debug(f"Queued job {journal_job_id}: {len(pending_jobs)} properties with up to {max_workers} concurrent requests")
+    return job
+
+def start_scrape_job(urls):
+    """Queue a bulk scrape of urls on the background worker"""
+    max_workers = st.session_state.scrape_concurrency
+    max_per_host = st.session_state.scrape_host_concurrency
+    host_delay = st.session_state.scrape_host_delay
+    parse_processes = st.session_state.parse_processes
+    
+    def run(job):
+        results = scrape_urls_concurrently(urls, max_workers=max_workers, max_per_host=max_per_host,
+                                           host_delay=host_delay, parse_processes=parse_processes)
+        try:
+            for url, property_data in results:
+                job.push((url, property_data))
+                if job.cancelled:
+                    break
+        finally:
+            results.close()
+    
+    job = BackgroundJob("scrape", len(urls), f"Scraping {len(urls)} URLs")
+    get_background_worker().submit(job, run)
+    st.session_state.background_jobs["scrape"] = job.job_id
+    st.session_state.scraping_in_progress = True
+    add_debug(f"Queued scrape of {len(urls)} URLs")
+    return job
+
+def start_batch_wait_job(poll_interval=BATCH_POLL_SECONDS):
+    """Poll the unmerged message batches on the background worker until they have all ended.
+    
+    The worker only calls the API: it pushes each refreshed batch, with its results once it
+    has ended, and collect_background_results saves and merges them in this session.
+    """
+    api_key = st.session_state.api_key
+    waiting = {job["batch_id"] for job in load_batch_jobs() if not job["merged"]}
+    
+    def run(job):
+        downloaded = set()
+        while True:
+            pending = [
+                batch_job for batch_job in load_batch_jobs()
+                if batch_job["batch_id"] in waiting - downloaded and not batch_job["merged"]
+            ]
+            if not pending:
+                return
+            for batch_job in pending:
+                refresh_message_batch(batch_job, api_key)
+                results = None
+                if batch_job["status"] == "ended":
+                    results = list(iter_message_batch_results(batch_job, api_key))
+                    downloaded.add(batch_job["batch_id"])
+                job.push((batch_job, results), count=0 if results is None else 1)
+            if job.wait_cancelled(poll_interval):
+                return
+    
+    job = BackgroundJob("batch", len(waiting), f"Waiting for {len(waiting)} message batches")
+    get_background_worker().submit(job, run)
+    st.session_state.background_jobs["batch"] = job.job_id
+    add_debug(f"Waiting in the background for {len(waiting)} message batches")
+    return job
+
+def start_ingest_job(uploaded_file, generate=False, use_mock=False):
+    """Load an uploaded property file on the background worker, one validated chunk at a time.
+    
+    The file's rows replace the loaded data as they arrive. With generate, generation starts
+    on the first chunk and collect_background_results queues later chunks as they load.
+    """
+    # Keep any extra columns a custom property template refers to
+    template_fields = active_prompt_templates().property_details.fields
+    columns = PROPERTY_COLUMNS + tuple(field for field in template_fields if field not in PROPERTY_COLUMNS)
+    reader = PropertyFileReader(uploaded_file, uploaded_file.name, columns=columns)
+    
+    def run(job):
+        for chunk, rejected_rows in reader:
+            job.push((chunk, rejected_rows), count=reader.rows_read - job.done)
+            if job.cancelled:
+                break
+    
+    replace_loaded_data(None)
+    st.session_state.load_generation = {"queued": 0, "use_mock": use_mock} if generate else None
+    
+    job = BackgroundJob("ingest", reader.estimated_rows, f"Loading {uploaded_file.name}")
+    get_background_worker().submit(job, run)
+    st.session_state.background_jobs["ingest"] = job.job_id
+    add_debug(f"Queued load of {uploaded_file.name} (about {reader.estimated_rows} rows)")
+    return job
+
+def queue_loaded_rows_for_generation():
+    """Generate rows loaded since the last generation job when generating while loading"""
+    load_generation = st.session_state.load_generation
+    if load_generation is None or "generation" in st.session_state.background_jobs:
+        return
+    loaded = len(st.session_state.df) if st.session_state.df is not None else 0
+    if loaded > load_generation["queued"]:
+        load_generation["queued"] = loaded
+        start_generation_job(load_generation["use_mock"])
+    elif "ingest" not in st.session_state.background_jobs:
+        st.session_state.load_generation = None
+
+def store_generation_result(idx, property_data, content, error, metadata=None):
+    """Store one background generation result, skipping rows that no longer match the loaded data"""
+    df = st.session_state.df
+    property_name = str(property_data.get('Property Name', f'Property #{idx}'))
+    if df is None or idx >= len(df) or str(df.iloc[idx].get('Property Name', f'Property #{idx}')) != property_name:
+        add_debug(f"Discarded result for {property_name}: the loaded data has changed")
+        return
+    
+    if error is None:
+        store_generated_content(idx, property_data, content, metadata)
+        add_debug(f"Generated {len(content) if content else 0} characters for {property_name}")
+    else:
+        st.session_state.failed_rows[idx] = {
+            "error": str(error),
+            "status_code": getattr(error, "status_code", None),
+            "retries": getattr(error, "retries", 0)
+        }
+        add_debug(f"Error generating content for {property_name}: {error}")
+
+def collect_background_results():
+    """Pull finished items from this session's background jobs into session state.
+    
+    Returns True when a job finished during this call, so the caller can rerun the page.
+    """
+    worker = get_background_worker()
+    finished_any = False
+    for kind, job_id in list(st.session_state.background_jobs.items()):
+        job = worker.get(job_id)
+        # Read the status before draining so no result pushed before completion is missed
+        is_finished = job is None or job.is_finished
+        results = job.drain() if job is not None else []
+        if kind == "ingest":
+            # Every chunk drained in this call is appended in a single concat
+            if results:
+                st.session_state.df = append_chunks(st.session_state.df, [chunk for chunk, _ in results])
+                st.session_state.rejected_rows.extend(row for _, rejected_rows in results for row in rejected_rows)
+                add_debug(f"Loaded {len(st.session_state.df)} properties so far")
+            results = []
+        for result in results:
+            if kind == "generation":
+                store_generation_result(*result)
+            elif kind == "batch":
+                apply_message_batch_update(*result)
+            elif result[1]:
+                st.session_state.scraped_properties.append(result[1])
+                add_debug(f"Scraped: {result[1].get('Property Name', 'Unknown')}")
+        
+        if is_finished:
+            finished_any = True
+            del st.session_state.background_jobs[kind]
+            worker.forget(job_id)
+            if kind == "generation":
+                st.session_state.is_generating = False
+                # Jobs that did not run to completion show up as interrupted and can be resumed
+                if job is None or job.status != "completed":
+                    st.session_state.current_job_id = None
+                    st.session_state.load_generation = None
+            elif kind == "scrape":
+                st.session_state.scraping_in_progress = False
+            elif kind == "batch":
+                st.session_state.batch_wait_error = job.error if job is not None else None
+            elif job is not None and job.error:
+                st.session_state.load_error = job.error
+            status = job.status if job is not None else "lost"
+            add_debug(f"Background {kind} job {job_id} {status}" + (f": {job.error}" if job is not None and job.error else ""))
+    
+    queue_loaded_rows_for_generation()
+    save_project_changes()
+    return finished_any
+
+@st.fragment(run_every=2)
+def background_jobs_panel():
+    """Progress of this session's background jobs, refreshed without rerunning the whole page"""
+    if collect_background_results():
+        st.rerun()
+    
+    worker = get_background_worker()
+    for kind, job_id in st.session_state.background_jobs.items():
+        job = worker.get(job_id)
+        if job is None:
+            continue
+        progress_col, cancel_col = st.columns([5, 1])
+        with progress_col:
+            if job.status == "queued":
+                text = f"⏳ {job.description}: waiting for a free worker"
+            else:
+                text = f"{job.description}: {job.done}/{job.total} ({job.rate_per_minute():.1f}/min)"
+                if kind == "generation" and st.session_state.failed_rows:
+                    text += f", {len(st.session_state.failed_rows)} failed"
+            st.progress(min(job.done / job.total, 1.0) if job.total else 1.0, text=text)
+        with cancel_col:
+            if st.button("⏹️ Cancel", key=f"cancel_job_{job_id}", disabled=job.cancelled, use_container_width=True):
+                job.cancel()
+                add_debug(f"Cancelling background {kind} job {job_id}")
+
+def rerun_fragment():
+    """Rerun just the calling fragment, or the whole page when it ran as part of a full rerun"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None and ctx.fragment_ids_this_run:
+        st.rerun(scope="fragment")
+    st.rerun()
+
+@st.fragment
+def prompt_settings_panel():
+    """Excluded terms and example content.
+    
+    These only feed the prompt, so editing them reruns just this panel; the counts in the
+    status bar catch up on the next full rerun.
+    """
+    # Excluded Terms Setup
+    st.subheader("🚫 Terms to Avoid")
+    
+    # Add term input
+    new_term = st.text_input("Add term or phrase to exclude:")
+    if st.button("Add Term") and new_term.strip():
+        term = new_term.strip()
+        if term not in st.session_state.excluded_terms:
+            st.session_state.excluded_terms.append(term)
+            add_debug(f"Added excluded term: '{term}'")
+            st.success(f"Added: '{term}'")
+            rerun_fragment()
+    
+    # Display current terms
+    if st.session_state.excluded_terms:
+        st.write("Current excluded terms:")
+        for i, term in enumerate(st.session_state.excluded_terms):
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.text(term)
+            with col2:
+                if st.button("🗑️", key=f"del_term_{i}"):
+                    st.session_state.excluded_terms.pop(i)
+                    add_debug(f"Removed excluded term: '{term}'")
+                    rerun_fragment()
+    
+    # Add horizontal line
+    st.markdown("---")
+    
+    # Example Content section
+    st.subheader("📄 Example Content")
+    
+    # Upload example copy file
+    uploaded_example = st.file_uploader("Upload Example Copy", type=['txt'])
+    # Each upload is added once, since the uploader keeps returning it on later reruns
+    if uploaded_example is not None and uploaded_example.file_id != st.session_state.example_file_id:
+        st.session_state.example_file_id = uploaded_example.file_id
+        try:
+            content = uploaded_example.getvalue().decode("utf-8")
+            if content and content.strip():
+                st.session_state.example_copies.append(content.strip())
+                add_debug(f"Added example from file: {uploaded_example.name} ({len(content)} chars)")
+                st.success(f"Added example from: {uploaded_example.name}")
+                rerun_fragment()
+        except Exception as e:
+            st.error(f"Error loading example file: {str(e)}")
+            add_debug(f"Error loading example file: {str(e)}")
+    
+    # Example copy text area
+    example_text = st.text_area("Or paste example copy here:", height=150)
+    if st.button("Add Example") and example_text.strip():
+        st.session_state.example_copies.append(example_text.strip())
+        add_debug(f"Added example copy ({len(example_text)} chars)")
+        st.success("Example added!")
+        rerun_fragment()
+    
+    # Display existing examples
+    if st.session_state.example_copies:
+        st.write(f"{len(st.session_state.example_copies)} examples loaded")
+        with st.expander("View/Edit Examples"):
+            for i, example in enumerate(st.session_state.example_copies):
+                st.text(f"Example #{i+1} ({len(example)} chars)")
+                if st.button("Remove", key=f"del_example_{i}"):
+                    st.session_state.example_copies.pop(i)
+                    add_debug(f"Removed example #{i+1}")
+                    rerun_fragment()
+                st.text_area(f"Example content", value=example, height=100, key=f"example_{i}", disabled=True)
+
+@st.fragment
+def export_panel():
+    """Export format options and download button"""
+    if st.session_state.generated_content:
+        # Export options
+        export_col1, export_col2 = st.columns(2)
+        with export_col1:
+            export_format = st.radio("Format:", ("CSV", "Excel"), horizontal=True)
+        with export_col2:
+            include_seo = st.checkbox("Include SEO data", value=True)
+        
+        # The file is only built when the button is clicked, and reused until its inputs change
+        export_df = st.session_state.df
+        export_key = (st.session_state.content_version, len(export_df), export_format.lower(), include_seo)
+        export_cache = st.session_state.export_cache
+        if st.download_button(
+            label=f"📥 Download {export_format}",
+            data=lambda: cached_export(export_cache, export_key, export_df, export_format.lower(), include_seo),
+            file_name=f"office_descriptions_seo_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format.lower()}",
+            mime="application/octet-stream",
+            use_container_width=True
+        ):
+            st.success(f"Downloaded {export_format} file!")
+            add_debug(f"Exported data as {export_format} with SEO: {include_seo}")
+
+@st.fragment
+def property_list_panel():
+    """Searchable, paged list of properties for the content editor"""
+    st.subheader("Properties")
+    df = st.session_state.df
+    
+    # Search filters
+    search_term = st.text_input("🔍 Search properties:", "")
+    filter_col1, filter_col2 = st.columns(2)
+    with filter_col1:
+        cities = []
+        if 'City' in df:
+            cities = df['City'].cat.categories.tolist() if isinstance(df['City'].dtype, pd.CategoricalDtype) else df['City'].dropna().unique().tolist()
+        city_filter = st.selectbox("City", ["All"] + sorted(map(str, cities)))
+    with filter_col2:
+        seo_filter = st.selectbox("SEO Score", list(SEO_SCORE_FILTERS))
+    
+    # Rows are filtered column-wise and only the visible page gets widgets
+    matches = filter_properties(df, search_term, None if city_filter == "All" else city_filter, seo_filter)
+    filters = (search_term, city_filter, seo_filter, len(df))
+    if filters != st.session_state.editor_filters:
+        st.session_state.editor_filters = filters
+        st.session_state.editor_page = 0
+    page_count = max(1, -(-len(matches) // EDITOR_PAGE_SIZE))
+    page = min(st.session_state.editor_page, page_count - 1)
+    page_rows = matches[page * EDITOR_PAGE_SIZE:(page + 1) * EDITOR_PAGE_SIZE]
+    
+    if len(matches):
+        st.caption(f"Showing {page * EDITOR_PAGE_SIZE + 1}-{page * EDITOR_PAGE_SIZE + len(page_rows)} of {len(matches)} properties")
+    else:
+        st.caption("No properties match these filters")
+    
+    page_names = property_names(df.iloc[page_rows]).tolist()
+    for idx, property_name in zip(page_rows.tolist(), page_names):
+        button_type = "primary" if idx == st.session_state.selected_property else "secondary"
+        if st.button(property_name, key=f"prop_{idx}", type=button_type):
+            st.session_state.selected_property = idx
+            add_debug(f"Selected property: {property_name}")
+            # The editor and schema tabs show the selection, so rerun the whole page
+            st.rerun()
+    
+    if page_count > 1:
+        page_col1, page_col2, page_col3 = st.columns([1, 2, 1])
+        with page_col1:
+            if st.button("◀", key="editor_prev_page", disabled=page == 0):
+                st.session_state.editor_page = page - 1
+                rerun_fragment()
+        with page_col2:
+            st.caption(f"Page {page + 1} of {page_count}")
+        with page_col3:
+            if st.button("▶", key="editor_next_page", disabled=page >= page_count - 1):
+                st.session_state.editor_page = page + 1
+                rerun_fragment()
+
+@st.fragment
+def property_editor_panel(idx, use_mock_api):
+    """Content, SEO analysis and edit controls for one property.
+    
+    Typing in the editors and saving a meta description rerun only this panel. Saving or
+    regenerating content reruns the page, as the list, overview and export depend on it.
+    """
+    # Display property details
+    property_data = st.session_state.df.iloc[idx].to_dict()
+    property_name = property_data.get('Property Name', 'N/A')
+    city = property_data.get('City', 'N/A')
+    neighborhood = property_data.get('Neighborhood', 'N/A')
+    zip_code = property_data.get('Zip Code', 'N/A')
+    
+    # Property info card
+    with st.container():
+        st.info(f"**Property:** {property_name}\n\n**Location:** {neighborhood}, {city} {zip_code}")
+    
+    # Display or generate content for selected property
+    if idx in st.session_state.generated_content:
+        content = st.session_state.generated_content[idx]
+        
+        # Safety check to ensure content is a string
+        if content is not None and isinstance(content, str) and content.strip():
+            # Clean up the content to ensure proper markdown rendering
+            cleaned_content = content.replace('\\n', '\n').replace('\\#', '#').replace('\\*', '*').replace('\\-', '-')
+            
+            # Display content with SEO score
+            seo_analysis = analyze_seo_quality(cleaned_content, property_data)
+            
+            score_col1, score_col2, score_col3 = st.columns([1, 1, 2])
+            with score_col1:
+                score_color = "🟢" if seo_analysis['seo_score'] >= 80 else "🟡" if seo_analysis['seo_score'] >= 60 else "🔴"
+                st.metric("SEO Score", f"{score_color} {seo_analysis['seo_score']}%")
+            with score_col2:
+                wc_color = "🟢" if 150 <= seo_analysis['word_count'] <= 300 else "🟡"
+                st.metric("Word Count", f"{wc_color} {seo_analysis['word_count']}")
+            
+            # Display content
+            st.markdown("### Preview")
+            st.markdown(cleaned_content)
+            
+            # SEO Analysis Expander
+            with st.expander("📊 SEO Analysis", expanded=False):
+                anal_col1, anal_col2 = st.columns(2)
+                
+                with anal_col1:
+                    st.markdown("**Content Checks:**")
+                    checks = {
+                        "Has H1 Title": "✅" if seo_analysis['has_h1'] else "❌",
+                        "Includes Address": "✅" if seo_analysis['has_address'] else "❌",
+                        "Has Call-to-Action": "✅" if seo_analysis['has_cta'] else "❌",
+                        "Readability": f"{'✅' if seo_analysis['readability_score'] == 'Good' else '⚠️'} {seo_analysis['readability_score']}",
+                        "Location Mentions": f"{'✅' if seo_analysis['location_mentions'] >= 2 else '⚠️'} {seo_analysis['location_mentions']} times"
+                    }
+                    for check, result in checks.items():
+                        st.text(f"{check}: {result}")
+                
+                with anal_col2:
+                    st.markdown("**Keyword Density:**")
+                    for keyword, data in seo_analysis['keyword_density'].items():
+                        if data['count'] > 0 and keyword:
+                            st.text(f"{keyword}: {data['count']}x ({data['density']})")
+                
+                # Meta description
+                st.markdown("**Meta Description:**")
+                meta_desc = st.session_state.meta_descriptions.get(idx, generate_meta_description(property_data, cleaned_content))
+                meta_text = st.text_area("", value=meta_desc, height=80, key=f"meta_{idx}")
+                st.caption(f"Length: {len(meta_text)}/160 characters {'✅' if len(meta_text) <= 160 else '⚠️'}")
+                
+                if meta_text != meta_desc:
+                    if st.button("Save Meta Description", key=f"save_meta_{idx}"):
+                        st.session_state.meta_descriptions[idx] = meta_text
+                        st.session_state.unsaved_rows.add(idx)
+                        st.success("Meta description saved!")
+            
+            # Action buttons
+            act_col1, act_col2 = st.columns(2)
+            with act_col1:
+                if st.button("🔄 Regenerate", key=f"regen_{idx}", use_container_width=True):
+                    if not st.session_state.api_key and not use_mock_api:
+                        st.error("Please enter Anthropic API key first or enable Test Mode")
+                    else:
+                        with st.spinner("Regenerating content..."):
+                            try:
+                                add_debug(f"Regenerating content for {property_name}")
+                                # Regenerating asks for a fresh variant, so skip the content cache
+                                new_content, metadata = generate_with_metadata(
+                                    property_data, 
+                                    st.session_state.api_key,
+                                    st.session_state.selected_model,
+                                    use_mock=use_mock_api,
+                                    use_cache=False,
+                                    on_text=stream_to_placeholder(st.empty())
+                                )
+                                # Also regenerates the meta description
+                                store_generated_content(idx, property_data, new_content, metadata)
+                                
+                                st.success("Content regenerated successfully!")
+                                add_debug(f"Regenerated content for {property_name} successfully")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Error regenerating content: {str(e)}")
+                                add_debug(f"Error during regeneration: {str(e)}")
+            
+            with act_col2:
+                # Copy to clipboard functionality
+                if st.button("📋 Copy Content", key=f"copy_{idx}", use_container_width=True):
+                    st.info("Content copied to editor below")
+            
+            # Edit content
+            st.markdown("### Edit Content")
+            edited_content = st.text_area("", value=cleaned_content, height=400, key=f"edit_{idx}")
+            
+            if edited_content != cleaned_content:
+                if st.button("💾 Save Edits", key=f"save_{idx}", type="primary", use_container_width=True):
+                    # Also updates the meta description
+                    store_generated_content(idx, property_data, edited_content)
+                    st.success("Changes saved!")
+                    add_debug(f"Saved edited content for {property_name}")
+                    st.rerun()
+        else:
+            st.error("Content appears to be empty or invalid. Please try regenerating.")
+            add_debug(f"Empty or invalid content for {property_name}")
+            
+    else:
+        st.info("No content generated yet. Click the button below to generate content.")
+        
+        if idx in st.session_state.failed_rows:
+            failure = st.session_state.failed_rows[idx]
+            st.warning(f"Last generation attempt failed: {failure['error']} (after {failure['retries']} retries)")
+        
+        if st.button("✨ Generate Description", key=f"gen_{idx}", type="primary", use_container_width=True):
+            if not st.session_state.api_key and not use_mock_api:
+                st.error("Please enter Anthropic API key first or enable Test Mode")
+                add_debug("Generation failed - no API key and test mode disabled")
+            else:
+                with st.spinner("Generating content..."):
+                    try:
+                        add_debug(f"Generating content for {property_name}")
+                        content, metadata = generate_with_metadata(
+                            property_data, 
+                            st.session_state.api_key,
+                            st.session_state.selected_model,
+                            use_mock=use_mock_api,
+                            on_text=stream_to_placeholder(st.empty())
+                        )
+                        # Also generates the meta description
+                        store_generated_content(idx, property_data, content, metadata)
+                        
+                        st.success("Content generated successfully!")
+                        add_debug(f"Generated content for {property_name} successfully")
+                        st.rerun()
+                    except Exception as e:
+                        st.session_state.failed_rows[idx] = {
+                            "error": str(e),
+                            "status_code": getattr(e, "status_code", None),
+                            "retries": getattr(e, "retries", 0)
+                        }
+                        st.error(f"Error generating content: {str(e)}")
+                        add_debug(f"Error during generation: {str(e)}")
+
+@st.fragment
+def seo_overview_panel():
+    """SEO metrics and score table for all generated content"""
+    st.subheader("SEO Overview")
+    
+    if st.session_state.generated_content:
+        # Calculate overall statistics
+        total_generated = len(st.session_state.generated_content)
         
-        # Save full response for debugging
-        st.session_state.api_response = {
-            "status_code": response.status_code,
-            "headers": dict(response.headers),
-            "response": response.text
-        }
+        # Every property is scored in one pass; the scores feed both the metrics and the summary table
+        properties_df = st.session_state.df
+        scores = loaded_seo_scores()
+        seo_scores = scores['seo_score'].tolist()
+        word_counts = scores['word_count'].tolist()
+        has_cta_count = int(scores['has_cta'].sum())
+        has_address_count = int(scores['has_address'].sum())
         
-        if response.status_code != 200:
-            add_debug(f"API Error: Status {response.status_code}, Response: {response.text[:200]}...")
-            return f"API Error: Status {response.status_code}. Please check the debug log for details."
+        # Display overview metrics
+        metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
         
-        response_data = response.json()
+        with metric_col1:
+            avg_seo_score = sum(seo_scores) / len(seo_scores) if seo_scores else 0
+            st.metric("Average SEO Score", f"{avg_seo_score:.0f}%")
         
-        if "content" in response_data and len(response_data["content"]) > 0:
-            content_list = response_data["content"]
-            all_content = ""
-            for content_item in content_list:
-                if content_item.get("type") == "text":
-                    all_content += content_item.get("text", "")
-            
-            add_debug(f"Successfully extracted content of length: {len(all_content)}")
-            return all_content
-        else:
-            add_debug(f"Empty or invalid response structure: {str(response_data)[:200]}...")
-            return "Error: Empty or invalid API response structure. Please check the debug log."
-            
-    except Exception as e:
-        add_debug(f"Request error: {str(e)}")
-        return f"API request error: {str(e)}"
-
-# Function to generate property description
-def generate_property_description(property_data, api_key, model=None, use_mock=False):
-    """Generate property description using direct API call or mock for testing"""
-    try:
-        if model is None:
-            model = st.session_state.selected_model
+        with metric_col2:
+            avg_word_count = sum(word_counts) / len(word_counts) if word_counts else 0
+            st.metric("Average Word Count", f"{avg_word_count:.0f}")
         
-        # Get excluded terms
-        excluded_terms = st.session_state.excluded_terms
-        excluded_terms_text = ""
-        if excluded_terms:
-            excluded_terms_text = "\n\nIMPORTANT: Do NOT use the following terms or phrases in your content:\n"
-            for i, term in enumerate(excluded_terms):
-                excluded_terms_text += f"{i+1}. \"{term}\"\n"
+        with metric_col3:
+            cta_percentage = (has_cta_count / total_generated * 100) if total_generated > 0 else 0
+            st.metric("Has Call-to-Action", f"{cta_percentage:.0f}%")
         
-        # Get example copies
-        example_copies = st.session_state.example_copies
-        example_copies_text = ""
-        if example_copies:
-            example_copies_text = "\n\nHere are examples of good copy that you should emulate in style and tone:\n\n"
-            for i, example in enumerate(example_copies):
-                example_copies_text += f"EXAMPLE {i+1}:\n{example}\n\n"
+        with metric_col4:
+            address_percentage = (has_address_count / total_generated * 100) if total_generated > 0 else 0
+            st.metric("Includes Address", f"{address_percentage:.0f}%")
         
-        # Get target keywords
-        target_keywords = ', '.join(st.session_state.target_keywords) if st.session_state.target_keywords else 'office space, executive office'
+        # Detailed table
+        st.markdown("### Property SEO Scores")
+        
+        if not scores.empty:
+            rows = properties_df.loc[scores.index]
+            summary_df = pd.DataFrame({
+                'Property': rows['Property Name'] if 'Property Name' in rows else [f'Property #{idx}' for idx in scores.index],
+                'City': rows['City'] if 'City' in rows else 'N/A',
+                'SEO Score': scores['seo_score'].astype(str) + '%',
+                'Words': scores['word_count'],
+                'Location Mentions': scores['location_mentions'],
+                'Has CTA': np.where(scores['has_cta'], '✅', '❌'),
+                'Has Address': np.where(scores['has_address'], '✅', '❌'),
+                'Readability': scores['readability_score']
+            })
+            st.dataframe(summary_df, use_container_width=True, hide_index=True)
             
-        # Enhanced SEO-focused prompt
-        prompt = f"""You are an SEO content specialist writing for a luxury office space provider.
-Create a Google-optimized office space description that will rank well in search results.
-
-Property Details:
-Property Name: {property_data.get('Property Name', 'N/A')}
-Address: {property_data.get('Address', 'N/A')}
-City: {property_data.get('City', 'N/A')}
-Zip Code: {property_data.get('Zip Code', 'N/A')}
-Neighborhood: {property_data.get('Neighborhood', 'N/A')}
-Property Type: {property_data.get('Property Type', 'N/A')}
-Size Range: {property_data.get('Size Range', 'N/A')}
-Building Description: {property_data.get('Building Description', 'N/A')}
-Key Features: {property_data.get('Key Features', 'N/A')}
-Nearby Businesses: {property_data.get('Nearby Businesses', 'N/A')}
-Transport Access: {property_data.get('Transport Access', 'N/A')}
-Technology Features: {property_data.get('Technology Features', 'N/A')}
-Meeting Rooms: {property_data.get('Meeting Rooms', 'N/A')}
-Common Areas: {property_data.get('Common Areas', 'N/A')}
-Business Services: {property_data.get('Business Services', 'N/A')}
-Security Features: {property_data.get('Security Features', 'N/A')}
-Wellness Amenities: {property_data.get('Wellness Amenities', 'N/A')}
-Office Configurations: {property_data.get('Office Configurations', 'N/A')}
-Lease Options: {property_data.get('Lease Options', 'N/A')}
-Contact Information: {property_data.get('Contact Information', 'N/A')}
-
-Target Keywords: {target_keywords}
-
-SEO Requirements:
-1. Start with a compelling H1 title that includes the property name, "Office Space" and location
-2. Include the full address naturally in the first paragraph
-3. Use location-based keywords (city, neighborhood) 2-3 times naturally throughout
-4. Include "office space" or "executive office" variations 2-3 times
-5. Mention specific amenities and features using semantic keywords
-6. Keep content between 150-300 words for optimal engagement
-7. Use short paragraphs (2-3 sentences max) for readability
-8. Include a clear call-to-action in the final paragraph
-9. Write in active voice and present tense
-10. Focus on benefits rather than just features
-11. Include local landmarks or nearby businesses if relevant
-
-Content Structure:
-- H1 Title using # (include property name + "Office Space" + location)
-- Opening paragraph with address and main value proposition
-- 2-3 short paragraphs highlighting key features and benefits
-- Closing paragraph with clear CTA (Schedule tour, Contact us, etc.)
-
-Write naturally for humans first, search engines second. Avoid:
-- Keyword stuffing or unnatural repetition
-- Generic phrases like "state-of-the-art" or "premier location"
-- Long, complex sentences
-- Passive voice
-- Overly promotional language
-- More than 4 bullet points if using a list
-
-{excluded_terms_text}
-{example_copies_text}
-
-Write the SEO-optimized content now:"""
+            # Download summary, written only when clicked and without rerunning anything
+            st.download_button(
+                "📥 Download SEO Summary",
+                lambda: summary_df.to_csv(index=False).encode('utf-8'),
+                "seo_summary.csv",
+                "text/csv",
+                key='download-seo-summary',
+                on_click="ignore"
+            )
+    else:
+        st.info("Generate content first to see SEO overview")
+
+METRICS_WINDOWS = {"Last 15 minutes": 15 * 60, "Last hour": 3600, "Last 24 hours": 86400, "Everything retained": None}
+
+@st.fragment
+def metrics_dashboard_panel():
+    """Latency percentiles, error rates and throughput of recent API calls and page fetches"""
+    store = get_metrics_store()
+    control_col1, control_col2, control_col3 = st.columns([2, 2, 1])
+    with control_col1:
+        kind_label = st.radio("Requests", ["API calls", "Page fetches"], horizontal=True, key="metrics_kind")
+    with control_col2:
+        window = st.selectbox("Window", list(METRICS_WINDOWS), index=1, key="metrics_window")
+    with control_col3:
+        # Clicking reruns just this panel with the latest events
+        st.button("🔄 Refresh", key="metrics_refresh", use_container_width=True)
+    
+    kind, by = ("api", "model") if kind_label == "API calls" else ("scrape", "host")
+    since = time.time() - METRICS_WINDOWS[window] if METRICS_WINDOWS[window] else None
+    frame = store.frame(kind, since)
+    if frame.empty:
+        st.info(f"No {kind_label.lower()} recorded in this window yet")
+    else:
+        overall = latency_summary(frame).iloc[0]
+        summary_cols = st.columns(5)
+        summary_cols[0].metric("Requests", int(overall["requests"]))
+        summary_cols[1].metric("Error Rate", f"{overall['error_rate'] * 100:.1f}%")
+        for col, quantile in zip(summary_cols[2:], ("p50", "p95", "p99")):
+            col.metric(f"{quantile} Latency", f"{overall[quantile]:.2f}s")
         
-        # For debugging, add the prompt to debug info
-        add_debug(f"Generated SEO-enhanced prompt with {len(prompt)} characters")
+        # Per model for API calls, per site for page fetches
+        table = latency_summary(frame, by=by)
+        grouped = frame.groupby(by)
+        if kind == "api":
+            tokens = grouped[["input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"]].sum().sum(axis=1)
+            table["input tokens"] = table[by].map(tokens)
+            table["output tokens"] = table[by].map(grouped["output_tokens"].sum())
+            table["retries"] = table[by].map(grouped["retries"].sum())
+            table["stop reasons"] = table[by].map(grouped["stop_reason"].agg(
+                lambda reasons: ", ".join(f"{reason}: {count}" for reason, count in reasons.value_counts().items())
+            ))
+        else:
+            table["KB"] = table[by].map(grouped["bytes"].sum() / 1024).round(1)
+            table["not modified"] = table[by].map(grouped["status"].agg(lambda status: int((status == "304").sum())))
+        table["error_rate"] = (table["error_rate"] * 100).round(1).astype(str) + "%"
+        st.dataframe(table.round(3).rename(columns={"error_rate": "error rate"}), use_container_width=True, hide_index=True)
         
-        # Use mock content for testing or when API key is not available
-        if use_mock or not api_key:
-            add_debug("Using mock content generator (Test Mode)")
-            return generate_mock_content(property_data)
-            
-        # Use direct API call with selected model
-        return call_anthropic_api(prompt, api_key, model)
-    
-    except Exception as e:
-        add_debug(f"Error in generate_property_description: {str(e)}")
-        return f"Error generating content: {str(e)}"
+        # Coarser intervals for longer spans keep the charts readable
+        span = frame["time"].max() - frame["time"].min()
+        freq = "1min" if span <= pd.Timedelta(hours=2) else "15min" if span <= pd.Timedelta(days=1) else "1h"
+        series = throughput(frame, freq)
+        st.markdown(f"**Requests per {freq}**")
+        st.line_chart(series[["requests", "errors"]])
+        st.markdown("**Latency (seconds)**")
+        st.line_chart(series[["p50", "p95"]])
+    
+    # Built only when clicked, from everything the store retains
+    export_col1, export_col2 = st.columns(2)
+    with export_col1:
+        st.download_button("📥 Download Events (JSONL)", lambda: store.to_jsonl(), "request_metrics.jsonl",
+                           "application/x-ndjson", key="metrics_jsonl", on_click="ignore", use_container_width=True)
+    with export_col2:
+        st.download_button("📥 Download Prometheus Metrics", lambda: store.to_prometheus().encode("utf-8"), "request_metrics.prom",
+                           "text/plain", key="metrics_prometheus", on_click="ignore", use_container_width=True)
+
+# Export of generated content, written a chunk of rows at a time
+EXPORT_CHUNK_ROWS = 2000
+SEO_EXPORT_COLUMNS = ['Meta Description', 'Word Count', 'SEO Score', 'Has CTA', 'Location Mentions']
+
+def export_chunks(df, include_seo=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the export of df as consecutive slices of at most chunk_rows, with SEO columns filled in"""
+    include_seo = include_seo and 'Generated Content' in df.columns
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if include_seo:
+            seo = pd.DataFrame('', index=chunk.index, columns=SEO_EXPORT_COLUMNS, dtype=object)
+            scores = score_seo_frame(chunk)
+            seo.loc[scores.index, 'Word Count'] = scores['word_count'].astype(object)
+            seo.loc[scores.index, 'SEO Score'] = scores['seo_score'].astype(str) + '%'
+            seo.loc[scores.index, 'Has CTA'] = np.where(scores['has_cta'], 'Yes', 'No')
+            seo.loc[scores.index, 'Location Mentions'] = scores['location_mentions'].astype(object)
+            seo.loc[scores.index, 'Meta Description'] = [
+                generate_meta_description(property_data, property_data['Generated Content'])
+                for property_data in chunk.loc[scores.index].to_dict('records')
+            ]
+            chunk = pd.concat([chunk, seo], axis=1)
+        yield chunk
+
+def write_csv_export(chunks, output):
+    """Write export chunks to a binary file as UTF-8 CSV"""
+    for i, chunk in enumerate(chunks):
+        output.write(chunk.to_csv(index=False, header=i == 0).encode('utf-8'))
+
+def write_excel_export(chunks, output):
+    """Write export chunks to a binary file as a single-sheet workbook"""
+    # constant_memory flushes each row to disk once the next one starts
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Property Descriptions')
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    row = 0
+    for chunk in chunks:
+        if row == 0:
+            worksheet.write_row(0, 0, [str(column) for column in chunk.columns], header_format)
+            row = 1
+        for values in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            worksheet.write_row(row, 0, values)
+            row += 1
+    workbook.close()
 
-# Function to export data with generated content
 def export_data(df, format_type, include_seo=False):
-    """Export dataframe with generated content and optional SEO data"""
-    export_df = df.copy()
-    
-    if include_seo and 'Generated Content' in df.columns:
-        # Add SEO columns
-        export_df['Meta Description'] = ''
-        export_df['Word Count'] = ''
-        export_df['SEO Score'] = ''
-        export_df['Has CTA'] = ''
-        export_df['Location Mentions'] = ''
-        
-        for idx, row in df.iterrows():
-            content = row.get('Generated Content', '')
-            if content and isinstance(content, str):
-                # Generate meta description
-                meta_desc = generate_meta_description(row.to_dict(), content)
-                export_df.at[idx, 'Meta Description'] = meta_desc
-                
-                # SEO analysis
-                seo_analysis = analyze_seo_quality(content, row.to_dict())
-                export_df.at[idx, 'Word Count'] = seo_analysis.get('word_count', 0)
-                export_df.at[idx, 'SEO Score'] = f"{seo_analysis.get('seo_score', 0)}%"
-                export_df.at[idx, 'Has CTA'] = 'Yes' if seo_analysis.get('has_cta', False) else 'No'
-                export_df.at[idx, 'Location Mentions'] = seo_analysis.get('location_mentions', 0)
-    
-    if format_type == 'csv':
-        return export_df.to_csv(index=False).encode('utf-8')
-    elif format_type == 'excel':
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            export_df.to_excel(writer, sheet_name='Property Descriptions', index=False)
-        return output.getvalue()
-    else:
+    """Export dataframe with generated content and optional SEO data.
+    
+    Rows are scored and written a chunk at a time to a temporary file, so only the finished
+    file is ever held in memory, whatever the number of rows. Returns None for an unknown
+    format. Takes everything it needs as arguments so a deferred download can call it
+    outside the script run.
+    """
+    writers = {'csv': write_csv_export, 'excel': write_excel_export}
+    if format_type not in writers:
         return None
+    with tempfile.TemporaryFile() as output:
+        writers[format_type](export_chunks(df, include_seo), output)
+        output.seek(0)
+        return output.read()
+
+def cached_export(cache, key, df, format_type, include_seo=False):
+    """export_data, reusing the file built last time if key is unchanged.
+    
+    key must change with anything the export depends on. cache is a dict kept in session
+    state holding only the latest file; it is passed in because deferred downloads run
+    without access to session state.
+    """
+    if key not in cache:
+        data = export_data(df, format_type, include_seo)
+        cache.clear()
+        cache[key] = data
+    return cache[key]
+
+# Persistent projects
+PROJECTS_PATH = os.environ.get("PROJECTS_PATH", "projects")
+PROJECT_SEO_COLUMNS = ['word_count', 'seo_score', 'has_cta', 'location_mentions', 'readability_score']
+PROJECT_METADATA_FIELDS = ['model', 'input_tokens', 'output_tokens', 'latency_seconds']
+
+@st.cache_resource(show_spinner=False)
+def get_project_store():
+    """Project store shared by every session in this server process"""
+    return ProjectStore(PROJECTS_PATH)
+
+def replace_loaded_data(df):
+    """Swap in a new set of properties, dropping everything generated for the previous one.
+    
+    The open project is closed too, since its rows no longer match the loaded data.
+    """
+    st.session_state.df = df
+    st.session_state.generated_content = {}
+    st.session_state.meta_descriptions = {}
+    st.session_state.generation_metadata = {}
+    st.session_state.failed_rows = {}
+    st.session_state.current_job_id = None
+    st.session_state.rejected_rows = []
+    st.session_state.load_error = None
+    st.session_state.load_generation = None
+    st.session_state.project_name = None
+    st.session_state.unsaved_rows = set()
+    st.session_state.content_version += 1
+    st.session_state.export_cache.clear()
+    st.session_state.selected_property = None
+
+def project_content_rows(indices):
+    """Project store rows for the given rows that have content, with SEO metrics and generation metadata"""
+    df = st.session_state.df
+    indices = sorted(idx for idx in indices if idx in st.session_state.generated_content and idx < len(df))
+    rows = df.iloc[indices]
+    scores = score_seo_frame(rows).reindex(rows.index)
+    metadata = [st.session_state.generation_metadata.get(idx, {}) for idx in indices]
+    content_rows = pd.DataFrame({
+        'idx': indices,
+        'property_name': rows['Property Name'].astype(object).to_numpy() if 'Property Name' in rows else None,
+        'generated_content': [st.session_state.generated_content[idx] for idx in indices],
+        'meta_description': [st.session_state.meta_descriptions.get(idx) for idx in indices]
+    })
+    for column in PROJECT_SEO_COLUMNS:
+        content_rows[column] = scores[column].to_numpy()
+    for field in PROJECT_METADATA_FIELDS:
+        content_rows[field] = [row_metadata.get(field) for row_metadata in metadata]
+    return content_rows
+
+def save_project(name):
+    """Save the loaded data and everything generated for it as a project, and autosave to it from now on"""
+    store = get_project_store()
+    store.save_properties(name, st.session_state.df.drop(columns=['Generated Content'], errors='ignore'))
+    store.append_content(name, project_content_rows(st.session_state.generated_content))
+    st.session_state.project_name = name
+    st.session_state.unsaved_rows = set()
+    add_debug(f"Saved project {name}: {len(st.session_state.df)} properties, {len(st.session_state.generated_content)} with content")
+
+def save_project_changes():
+    """Append rows changed since the last save to the open project"""
+    if st.session_state.project_name is None or not st.session_state.unsaved_rows or st.session_state.df is None:
+        return
+    rows = project_content_rows(st.session_state.unsaved_rows)
+    get_project_store().append_content(st.session_state.project_name, rows)
+    st.session_state.unsaved_rows = set()
+    add_debug(f"Saved {len(rows)} changed rows to project {st.session_state.project_name}")
+
+def open_project(name):
+    """Load a saved project's properties and generated content in place of the loaded data"""
+    store = get_project_store()
+    df = store.load_properties(name)
+    content = store.load_content(name)
+    content = content[(content['idx'] < len(df)) & content['generated_content'].notna()]
+    indices = content['idx'].tolist()
+    
+    df['Generated Content'] = pd.Series(np.nan, index=df.index, dtype=object)
+    df.loc[indices, 'Generated Content'] = content['generated_content'].astype(object).to_numpy()
+    replace_loaded_data(df)
+    st.session_state.generated_content = dict(zip(indices, content['generated_content'].tolist()))
+    st.session_state.meta_descriptions = {
+        idx: meta for idx, meta in zip(indices, content['meta_description'].tolist()) if isinstance(meta, str)
+    }
+    # Integer columns with gaps come back from Parquet as floats; restore the token counts as ints
+    metadata = content[PROJECT_METADATA_FIELDS].astype({'input_tokens': 'Int64', 'output_tokens': 'Int64'}).astype(object)
+    metadata = metadata.where(metadata.notna(), None)
+    st.session_state.generation_metadata = {
+        idx: dict(zip(PROJECT_METADATA_FIELDS, values))
+        for idx, values in zip(indices, metadata.itertuples(index=False, name=None))
+        if isinstance(values[0], str)
+    }
+    st.session_state.project_name = name
+    add_debug(f"Opened project {name}: {len(df)} properties, {len(indices)} with content")
+
+# Scores and filters for the loaded data
+EDITOR_PAGE_SIZE = 25
+SEO_SCORE_FILTERS = {
+    "All": None,
+    "No content yet": None,
+    "80% and above": (80, 101),
+    "60-79%": (60, 80),
+    "Below 60%": (0, 60)
+}
+
+def loaded_seo_scores():
+    """SEO scores of every property with generated content, indexed by row.
+    
+    Kept in session state and recomputed only when content changes.
+    """
+    key = st.session_state.content_version
+    cached = st.session_state.seo_scores_cache
+    if cached is None or cached[0] != key:
+        scores = score_seo_frame(
+            st.session_state.df, content=pd.Series(st.session_state.generated_content, dtype=object)
+        ).sort_index()
+        cached = (key, scores)
+        st.session_state.seo_scores_cache = cached
+    return cached[1]
+
+def property_names(df):
+    """Display name of every row, falling back to its position"""
+    if 'Property Name' not in df:
+        return pd.Series([f'Property #{idx}' for idx in df.index], index=df.index)
+    names = df['Property Name'].astype(object)
+    missing = names.isna()
+    if missing.any():
+        names = names.where(~missing, pd.Series([f'Property #{idx}' for idx in df.index], index=df.index))
+    return names.astype(str)
+
+def filter_properties(df, search_term="", city=None, seo_filter="All"):
+    """Positions of the rows matching the editor filters, computed column-wise"""
+    mask = np.ones(len(df), dtype=bool)
+    if search_term:
+        mask &= property_names(df).str.contains(search_term, case=False, regex=False).to_numpy()
+    if city is not None and 'City' in df:
+        mask &= (df['City'].astype(str) == city).to_numpy(dtype=bool)
+    if seo_filter != "All":
+        scores = loaded_seo_scores()['seo_score'].reindex(df.index)
+        if seo_filter == "No content yet":
+            mask &= scores.isna().to_numpy()
+        else:
+            low, high = SEO_SCORE_FILTERS[seo_filter]
+            mask &= scores.between(low, high, inclusive='left').to_numpy()
+    return np.flatnonzero(mask)
 
 # Sidebar - Configuration
 with st.sidebar:
@@ -729,71 +2971,8 @@ with st.sidebar:
     # Add horizontal line
     st.markdown("---")
     
-    # Excluded Terms Setup
-    st.subheader("🚫 Terms to Avoid")
-    
-    # Add term input
-    new_term = st.text_input("Add term or phrase to exclude:")
-    if st.button("Add Term") and new_term.strip():
-        term = new_term.strip()
-        if term not in st.session_state.excluded_terms:
-            st.session_state.excluded_terms.append(term)
-            add_debug(f"Added excluded term: '{term}'")
-            st.success(f"Added: '{term}'")
-            st.rerun()
-    
-    # Display current terms
-    if st.session_state.excluded_terms:
-        st.write("Current excluded terms:")
-        for i, term in enumerate(st.session_state.excluded_terms):
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                st.text(term)
-            with col2:
-                if st.button("🗑️", key=f"del_term_{i}"):
-                    st.session_state.excluded_terms.pop(i)
-                    add_debug(f"Removed excluded term: '{term}'")
-                    st.rerun()
-    
-    # Add horizontal line
-    st.markdown("---")
-    
-    # Example Content section
-    st.subheader("📄 Example Content")
-    
-    # Upload example copy file
-    uploaded_example = st.file_uploader("Upload Example Copy", type=['txt'])
-    if uploaded_example is not None:
-        try:
-            content = uploaded_example.getvalue().decode("utf-8")
-            if content and content.strip():
-                st.session_state.example_copies.append(content.strip())
-                add_debug(f"Added example from file: {uploaded_example.name} ({len(content)} chars)")
-                st.success(f"Added example from: {uploaded_example.name}")
-                st.rerun()
-        except Exception as e:
-            st.error(f"Error loading example file: {str(e)}")
-            add_debug(f"Error loading example file: {str(e)}")
-    
-    # Example copy text area
-    example_text = st.text_area("Or paste example copy here:", height=150)
-    if st.button("Add Example") and example_text.strip():
-        st.session_state.example_copies.append(example_text.strip())
-        add_debug(f"Added example copy ({len(example_text)} chars)")
-        st.success("Example added!")
-        st.rerun()
-    
-    # Display existing examples
-    if st.session_state.example_copies:
-        st.write(f"{len(st.session_state.example_copies)} examples loaded")
-        with st.expander("View/Edit Examples"):
-            for i, example in enumerate(st.session_state.example_copies):
-                st.text(f"Example #{i+1} ({len(example)} chars)")
-                if st.button("Remove", key=f"del_example_{i}"):
-                    st.session_state.example_copies.pop(i)
-                    add_debug(f"Removed example #{i+1}")
-                    st.rerun()
-                st.text_area(f"Example content", value=example, height=100, key=f"example_{i}", disabled=True)
+    # Excluded terms and example content
+    prompt_settings_panel()
     
     # Add horizontal line
     st.markdown("---")
@@ -806,28 +2985,41 @@ with st.sidebar:
     
     with data_tab1:
         uploaded_file = st.file_uploader("Upload Property Data", type=['csv', 'xlsx'])
+        generate_while_loading = st.checkbox("Start generating while the file loads", value=st.session_state.generate_while_loading,
+                                             help="Generate descriptions for the first rows of a large file while the rest is still loading")
+        st.session_state.generate_while_loading = generate_while_loading
         
-        if uploaded_file is not None:
+        # Each upload is loaded once; reruns keep the data already loaded from it
+        if uploaded_file is not None and uploaded_file.file_id != st.session_state.loaded_file_id:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                    add_debug(f"Loaded CSV file: {uploaded_file.name}")
-                else:
-                    df = pd.read_excel(uploaded_file)
-                    add_debug(f"Loaded Excel file: {uploaded_file.name}")
-                    
-                st.session_state.df = df
-                st.success(f"Loaded {len(df)} properties")
-                
-                # Display data fields for verification
-                if st.checkbox("Show data fields"):
-                    st.write("Detected columns:")
-                    columns = df.columns.tolist()
-                    st.write(", ".join(columns))
-                    add_debug(f"Detected {len(columns)} columns: {', '.join(columns[:5])}...")
+                generate = generate_while_loading and (bool(st.session_state.api_key) or use_mock_api)
+                if generate_while_loading and not generate:
+                    st.warning("Enter an Anthropic API key or enable Test Mode to generate while loading")
+                start_ingest_job(uploaded_file, generate=generate, use_mock=use_mock_api)
+                st.session_state.loaded_file_id = uploaded_file.file_id
             except Exception as e:
                 st.error(f"Error loading file: {str(e)}")
                 add_debug(f"Error loading file: {str(e)}")
+        
+        if "ingest" in st.session_state.background_jobs:
+            st.info(f"Loading {uploaded_file.name if uploaded_file is not None else 'file'}...")
+        elif uploaded_file is not None and st.session_state.df is not None:
+            st.success(f"Loaded {len(st.session_state.df)} properties")
+        
+        if st.session_state.load_error:
+            st.error(f"Error loading file: {st.session_state.load_error}")
+        
+        if st.session_state.rejected_rows:
+            rejected_rows = st.session_state.rejected_rows
+            st.warning(f"Skipped {len(rejected_rows)} rows with neither a Property Name nor an Address "
+                       f"(rows {', '.join(map(str, rejected_rows[:10]))}{'...' if len(rejected_rows) > 10 else ''})")
+        
+        # Display data fields for verification
+        if uploaded_file is not None and st.session_state.df is not None and st.checkbox("Show data fields"):
+            st.write("Detected columns:")
+            columns = st.session_state.df.columns.tolist()
+            st.write(", ".join(columns))
+            add_debug(f"Detected {len(columns)} columns: {', '.join(columns[:5])}...")
     
     with data_tab2:
         st.markdown("### 🔗 Scrape Property Data")
@@ -865,27 +3057,13 @@ with st.sidebar:
                 placeholder="https://example.com/property1\nhttps://example.com/property2\nhttps://example.com/property3"
             )
             
-            if st.button("🔍 Scrape All URLs"):
+            if st.button("🔍 Scrape All URLs", disabled=st.session_state.scraping_in_progress):
                 if urls_text:
                     urls = [url.strip() for url in urls_text.split('\n') if url.strip()]
                     if urls:
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-                        
-                        for i, url in enumerate(urls):
-                            status_text.text(f"Scraping {i+1}/{len(urls)}: {url[:50]}...")
-                            progress_bar.progress((i + 1) / len(urls))
-                            
-                            property_data = scrape_property_data(url)
-                            if property_data:
-                                st.session_state.scraped_properties.append(property_data)
-                                add_debug(f"Scraped: {property_data.get('Property Name', 'Unknown')}")
-                            
-                            # Small delay to avoid overwhelming servers
-                            time.sleep(1)
-                        
-                        status_text.text(f"✅ Scraped {len(st.session_state.scraped_properties)} properties")
-                        st.success(f"Completed scraping {len(urls)} URLs")
+                        # Pages are scraped on the background worker; progress is shown on the main page
+                        start_scrape_job(urls)
+                        st.rerun()
                 else:
                     st.warning("Please enter at least one URL")
         
@@ -915,7 +3093,7 @@ with st.sidebar:
             if st.button("📊 Use Scraped Data", type="primary", use_container_width=True):
                 df = create_dataframe_from_scraped_data(st.session_state.scraped_properties)
                 if df is not None:
-                    st.session_state.df = df
+                    replace_loaded_data(df)
                     st.success(f"Created dataset with {len(df)} properties")
                     add_debug(f"Converted {len(df)} scraped properties to DataFrame")
                     st.rerun()
@@ -954,8 +3132,33 @@ with st.sidebar:
                 if new_df is not None:
                     st.session_state.df = pd.concat([st.session_state.df, new_df], ignore_index=True)
                     st.session_state.scraped_properties = []
+                    if st.session_state.project_name:
+                        save_project(st.session_state.project_name)
                     st.success(f"Added {len(new_df)} properties to existing data")
                     st.rerun()
+    
+    # Saved projects
+    st.markdown("---")
+    st.subheader("💾 Projects")
+    
+    if st.session_state.project_name:
+        st.caption(f"Changes are saved to project '{st.session_state.project_name}' as they happen")
+    project_name = st.text_input("Project Name", value=st.session_state.project_name or "")
+    if st.button("Save Project", use_container_width=True,
+                 disabled=st.session_state.df is None or not project_name.strip() or "ingest" in st.session_state.background_jobs):
+        save_project(project_name.strip())
+        st.success(f"Saved project '{project_name.strip()}'")
+    
+    saved_projects = get_project_store().list_projects()
+    if saved_projects:
+        selected_project = st.selectbox("Saved Projects", saved_projects)
+        if st.button("Open Project", use_container_width=True, disabled=st.session_state.is_generating):
+            try:
+                open_project(selected_project)
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error opening project: {str(e)}")
+                add_debug(f"Error opening project {selected_project}: {str(e)}")
 
 # Main content area
 st.title("🏢 Centre Page Content Generator - SEO Enhanced")
@@ -980,396 +3183,190 @@ with status_col4:
     if st.session_state.target_keywords:
         st.info(f"🎯 {len(st.session_state.target_keywords)} keywords")
 
+# Pick up results from background jobs before rendering anything that depends on them
+collect_background_results()
+
 # Generation controls
 if st.session_state.df is not None:
     col1, col2, col3 = st.columns([2, 2, 3])
     
     with col1:
-        if st.button("🚀 Generate All Descriptions", type="primary", use_container_width=True):
+        if st.button("🚀 Generate All Descriptions", type="primary", use_container_width=True, disabled=st.session_state.is_generating):
             if not st.session_state.api_key and not use_mock_api:
                 st.error("Please enter Anthropic API key first or enable Test Mode")
                 add_debug("Generation failed - no API key and test mode disabled")
             else:
-                st.session_state.is_generating = True
                 st.session_state.progress = 0
                 add_debug("Starting batch generation")
                 
                 # Add content column if it doesn't exist
                 if 'Generated Content' not in st.session_state.df:
-                    st.session_state.df['Generated Content'] = np.nan
+                    st.session_state.df['Generated Content'] = pd.Series(np.nan, index=st.session_state.df.index, dtype=object)
                     
                 # Clear existing generated content
                 st.session_state.generated_content = {}
+                st.session_state.content_version += 1
+                st.session_state.failed_rows = {}
+                st.session_state.current_job_id = get_generation_journal().create_job(
+                    st.session_state.selected_model, len(st.session_state.df)
+                )
+                add_debug(f"Created generation job {st.session_state.current_job_id}")
+                start_generation_job(use_mock_api)
                 st.rerun()
+        
+        # Failed rows keep no content, so a new run only picks those up
+        if st.session_state.failed_rows and not st.session_state.is_generating:
+            if st.button(f"🔁 Retry {len(st.session_state.failed_rows)} Failed", use_container_width=True):
+                if not st.session_state.api_key and not use_mock_api:
+                    st.error("Please enter Anthropic API key first or enable Test Mode")
+                else:
+                    add_debug(f"Retrying {len(st.session_state.failed_rows)} failed properties")
+                    start_generation_job(use_mock_api)
+                    st.rerun()
+        
+        # Jobs interrupted by a cancel, evicted session or restart can pick up where they stopped
+        running_job_ids = {job.journal_job_id for job in get_background_worker().active_jobs()}
+        interrupted_jobs = [
+            job for job in get_generation_journal().list_jobs(unfinished_only=True)
+            if job["job_id"] != st.session_state.current_job_id and job["job_id"] not in running_job_ids
+        ]
+        if interrupted_jobs and not st.session_state.is_generating:
+            with st.expander(f"♻️ {len(interrupted_jobs)} Interrupted Job(s)"):
+                for job in interrupted_jobs:
+                    st.text(f"Job {job['job_id']} ({job['created']}): {job['completed']}/{job['total_rows']} done")
+                    resume_col, discard_col = st.columns(2)
+                    with resume_col:
+                        if st.button("Resume", key=f"resume_job_{job['job_id']}", use_container_width=True):
+                            restored, skipped = resume_generation_job(job["job_id"])
+                            if skipped:
+                                st.warning(f"{skipped} checkpointed rows did not match the loaded data and will be regenerated")
+                            start_generation_job(use_mock_api)
+                            st.rerun()
+                    with discard_col:
+                        if st.button("Discard", key=f"discard_job_{job['job_id']}", use_container_width=True):
+                            get_generation_journal().delete_job(job["job_id"])
+                            st.rerun()
     
     with col2:
         if st.session_state.generated_content:
             # Check for excluded terms
             if st.button("🔍 Check Excluded Terms", use_container_width=True):
                 found_terms = {}
+                matcher = get_term_matcher(tuple(st.session_state.excluded_terms))
                 for idx, row in st.session_state.df.iterrows():
                     content = st.session_state.generated_content.get(idx, '')
                     if content and isinstance(content, str):
                         property_name = row.get('Property Name', f'Property #{idx}')
-                        found_in_this_property = []
-                        
-                        for term in st.session_state.excluded_terms:
-                            if term.lower() in content.lower():
-                                found_in_this_property.append(term)
+                        found_in_this_property = matcher.found(content)
                         
                         if found_in_this_property:
-                            found_terms[property_name] = found_in_this_property
+                            found_terms[property_name] = (found_in_this_property, term_contexts(matcher, content))
                 
                 if found_terms:
                     st.error("Found excluded terms:")
-                    for property_name, terms in found_terms.items():
+                    for property_name, (terms, contexts) in found_terms.items():
                         st.markdown(f"**{property_name}**: {', '.join(terms)}")
+                        for term, snippet in contexts:
+                            st.text(f'  "{term}": {snippet}')
                 else:
                     st.success("✅ No excluded terms found!")
     
     with col3:
-        if st.session_state.generated_content:
-            # Export options
-            export_col1, export_col2 = st.columns(2)
-            with export_col1:
-                export_format = st.radio("Format:", ("CSV", "Excel"), horizontal=True)
-            with export_col2:
-                include_seo = st.checkbox("Include SEO data", value=True)
-            
-            if st.download_button(
-                label=f"📥 Download {export_format}",
-                data=export_data(st.session_state.df, export_format.lower(), include_seo),
-                file_name=f"office_descriptions_seo_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format.lower()}",
-                mime="application/octet-stream",
-                use_container_width=True
-            ):
-                st.success(f"Downloaded {export_format} file!")
-                add_debug(f"Exported data as {export_format} with SEO: {include_seo}")
-
-# Content generation in progress
-if st.session_state.is_generating and st.session_state.df is not None:
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    total_properties = len(st.session_state.df)
-    add_debug(f"Beginning generation for {total_properties} properties")
-    
-    batch_size = st.session_state.batch_size
-    delay = st.session_state.api_delay
-    
-    # Process in batches to avoid overwhelming the API
-    for batch_start in range(0, total_properties, batch_size):
-        batch_end = min(batch_start + batch_size, total_properties)
+        export_panel()
+
+# Background jobs in progress
+if st.session_state.background_jobs:
+    background_jobs_panel()
+
+# Offline batch submission through the Message Batches API
+with st.expander("📦 Offline Batch Submission (Message Batches API)"):
+    st.caption("Submit every pending property as an asynchronous batch at lower cost. Results arrive within 24 hours "
+               "and can be collected after an app restart by loading the same property data again.")
+    
+    batch_jobs = load_batch_jobs()
+    open_batch_rows = {
+        row["idx"] for job in batch_jobs if not job["merged"]
+        for custom_id, row in job["rows"].items() if custom_id not in job.get("applied", ())
+    }
+    
+    if st.session_state.df is not None:
+        pending_rows = [
+            i for i in range(len(st.session_state.df))
+            if i not in st.session_state.generated_content and i not in open_batch_rows
+        ]
+        if use_mock_api or not st.session_state.api_key:
+            st.info("Batch submission needs an Anthropic API key with Test Mode off")
+        elif st.button(f"📤 Submit {len(pending_rows)} Pending Properties", disabled=not pending_rows):
+            try:
+                with st.spinner("Submitting message batch..."):
+                    submitted = submit_message_batches(
+                        [(i, st.session_state.df.iloc[i].to_dict()) for i in pending_rows],
+                        st.session_state.api_key,
+                        st.session_state.selected_model
+                    )
+                st.success(f"Submitted {len(submitted)} batch(es)")
+                st.rerun()
+            except AnthropicAPIError as e:
+                st.error(f"Batch submission failed: {str(e)}")
+    
+    if batch_jobs:
+        st.dataframe(pd.DataFrame([{
+            "Batch ID": job["batch_id"],
+            "Submitted": job["submitted"],
+            "Model": job["model"],
+            "Status": job["status"],
+            "Requests": len(job["rows"]),
+            "Succeeded": job["request_counts"].get("succeeded", 0),
+            "Errored": job["request_counts"].get("errored", 0),
+            "Merged": "✅" if job["merged"] else f"{len(job.get('applied', []))}/{len(job['rows'])}" if job.get("applied") else "—"
+        } for job in batch_jobs]), use_container_width=True, hide_index=True)
         
-        for i in range(batch_start, batch_end):
-            # Calculate overall progress
-            progress = int((i / total_properties) * 100)
-            progress_bar.progress(progress)
-            
-            idx = i
-            row = st.session_state.df.iloc[idx]
-            property_name = row.get('Property Name', f'Property #{idx}')
-            status_text.text(f"Generating description for {property_name}... ({i+1}/{total_properties})")
-            
-            # Generate content if not already generated
-            if idx not in st.session_state.generated_content:
-                property_data = row.to_dict()
-                
-                with st.spinner(f"Generating content for {property_name}..."):
-                    try:
-                        add_debug(f"Generating content for {property_name}")
-                        # Pass use_mock flag based on checkbox
-                        content = generate_property_description(
-                            property_data, 
-                            st.session_state.api_key,
-                            st.session_state.selected_model,
-                            use_mock=use_mock_api
-                        )
-                        st.session_state.generated_content[idx] = content
-                        st.session_state.df.at[idx, 'Generated Content'] = content
-                        
-                        # Generate and store meta description
-                        meta_desc = generate_meta_description(property_data, content)
-                        st.session_state.meta_descriptions[idx] = meta_desc
-                        
-                        add_debug(f"Generated {len(content) if content else 0} characters for {property_name}")
-                    except Exception as e:
-                        error_msg = f"Error generating content for {property_name}: {str(e)}"
-                        st.error(error_msg)
-                        add_debug(error_msg)
+        batch_col1, batch_col2, batch_col3 = st.columns(3)
+        with batch_col1:
+            if st.button("🔄 Refresh & Merge Results", use_container_width=True, disabled=not st.session_state.api_key):
+                try:
+                    process_message_batches(st.session_state.api_key)
+                    st.rerun()
+                except AnthropicAPIError as e:
+                    st.error(f"Could not refresh batches: {str(e)}")
+        with batch_col2:
+            waiting = "batch" in st.session_state.background_jobs
+            if st.button("⏳ Wait in Background", use_container_width=True,
+                         disabled=waiting or not st.session_state.api_key or all(job["merged"] for job in batch_jobs),
+                         help=f"Check the batches every {BATCH_POLL_SECONDS} seconds without blocking the page and merge results as batches end"):
+                st.session_state.batch_wait_error = None
+                start_batch_wait_job()
+                st.rerun()
+        with batch_col3:
+            if st.button("🧹 Clear Merged Batches", use_container_width=True):
+                save_batch_jobs([job for job in batch_jobs if not job["merged"]])
+                st.rerun()
         
-        # Add delay between batches if there are more to process
-        if batch_end < total_properties and delay > 0 and not use_mock_api:
-            add_debug(f"Pausing for {delay}s between batches")
-            time.sleep(delay)
-    
-    progress_bar.progress(100)
-    status_text.text(f"✅ Generated descriptions for {total_properties} properties!")
-    st.session_state.is_generating = False
-    add_debug(f"Completed batch generation of {total_properties} properties")
-    st.rerun()
+        if st.session_state.batch_wait_error:
+            st.error(f"Could not poll batches: {st.session_state.batch_wait_error}")
+        if open_batch_rows and (st.session_state.df is None or any(job["status"] == "ended" and not job["merged"] for job in batch_jobs)):
+            st.warning("Load the property data these batches were submitted from to merge their results.")
 
 # Display properties and generated content
 if st.session_state.df is not None:
     st.subheader("Property Descriptions")
     
     # Add tabs for different views
-    tab1, tab2, tab3 = st.tabs(["📝 Content Editor", "📊 SEO Overview", "🔧 Schema Generator"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📝 Content Editor", "📊 SEO Overview", "🔧 Schema Generator", "📈 Metrics"])
     
     with tab1:
         col1, col2 = st.columns([1, 2])
         
         with col1:
-            st.subheader("Properties")
-            # Search filter
-            search_term = st.text_input("🔍 Search properties:", "")
-            
-            # Filter and display properties
-            for idx, row in st.session_state.df.iterrows():
-                property_name = row.get('Property Name', f'Property #{idx}')
-                if search_term.lower() in property_name.lower() or not search_term:
-                    button_type = "primary" if idx == st.session_state.selected_property else "secondary"
-                    if st.button(property_name, key=f"prop_{idx}", type=button_type):
-                        st.session_state.selected_property = idx
-                        add_debug(f"Selected property: {property_name}")
-                        st.rerun()
+            property_list_panel()
         
         with col2:
             st.subheader("Generated Content")
             if st.session_state.selected_property is not None:
-                idx = st.session_state.selected_property
-                
-                # Display property details
-                property_data = st.session_state.df.iloc[idx].to_dict()
-                property_name = property_data.get('Property Name', 'N/A')
-                city = property_data.get('City', 'N/A')
-                neighborhood = property_data.get('Neighborhood', 'N/A')
-                zip_code = property_data.get('Zip Code', 'N/A')
-                
-                # Property info card
-                with st.container():
-                    st.info(f"**Property:** {property_name}\n\n**Location:** {neighborhood}, {city} {zip_code}")
-                
-                # Display or generate content for selected property
-                if idx in st.session_state.generated_content:
-                    content = st.session_state.generated_content[idx]
-                    
-                    # Safety check to ensure content is a string
-                    if content is not None and isinstance(content, str) and content.strip():
-                        # Clean up the content to ensure proper markdown rendering
-                        cleaned_content = content.replace('\\n', '\n').replace('\\#', '#').replace('\\*', '*').replace('\\-', '-')
-                        
-                        # Display content with SEO score
-                        seo_analysis = analyze_seo_quality(cleaned_content, property_data)
-                        
-                        score_col1, score_col2, score_col3 = st.columns([1, 1, 2])
-                        with score_col1:
-                            score_color = "🟢" if seo_analysis['seo_score'] >= 80 else "🟡" if seo_analysis['seo_score'] >= 60 else "🔴"
-                            st.metric("SEO Score", f"{score_color} {seo_analysis['seo_score']}%")
-                        with score_col2:
-                            wc_color = "🟢" if 150 <= seo_analysis['word_count'] <= 300 else "🟡"
-                            st.metric("Word Count", f"{wc_color} {seo_analysis['word_count']}")
-                        
-                        # Display content
-                        st.markdown("### Preview")
-                        st.markdown(cleaned_content)
-                        
-                        # SEO Analysis Expander
-                        with st.expander("📊 SEO Analysis", expanded=False):
-                            anal_col1, anal_col2 = st.columns(2)
-                            
-                            with anal_col1:
-                                st.markdown("**Content Checks:**")
-                                checks = {
-                                    "Has H1 Title": "✅" if seo_analysis['has_h1'] else "❌",
-                                    "Includes Address": "✅" if seo_analysis['has_address'] else "❌",
-                                    "Has Call-to-Action": "✅" if seo_analysis['has_cta'] else "❌",
-                                    "Readability": f"{'✅' if seo_analysis['readability_score'] == 'Good' else '⚠️'} {seo_analysis['readability_score']}",
-                                    "Location Mentions": f"{'✅' if seo_analysis['location_mentions'] >= 2 else '⚠️'} {seo_analysis['location_mentions']} times"
-                                }
-                                for check, result in checks.items():
-                                    st.text(f"{check}: {result}")
-                            
-                            with anal_col2:
-                                st.markdown("**Keyword Density:**")
-                                for keyword, data in seo_analysis['keyword_density'].items():
-                                    if data['count'] > 0 and keyword:
-                                        st.text(f"{keyword}: {data['count']}x ({data['density']})")
-                            
-                            # Meta description
-                            st.markdown("**Meta Description:**")
-                            meta_desc = st.session_state.meta_descriptions.get(idx, generate_meta_description(property_data, cleaned_content))
-                            meta_text = st.text_area("", value=meta_desc, height=80, key=f"meta_{idx}")
-                            st.caption(f"Length: {len(meta_text)}/160 characters {'✅' if len(meta_text) <= 160 else '⚠️'}")
-                            
-                            if meta_text != meta_desc:
-                                if st.button("Save Meta Description", key=f"save_meta_{idx}"):
-                                    st.session_state.meta_descriptions[idx] = meta_text
-                                    st.success("Meta description saved!")
-                        
-                        # Action buttons
-                        act_col1, act_col2 = st.columns(2)
-                        with act_col1:
-                            if st.button("🔄 Regenerate", key=f"regen_{idx}", use_container_width=True):
-                                if not st.session_state.api_key and not use_mock_api:
-                                    st.error("Please enter Anthropic API key first or enable Test Mode")
-                                else:
-                                    with st.spinner("Regenerating content..."):
-                                        try:
-                                            add_debug(f"Regenerating content for {property_name}")
-                                            new_content = generate_property_description(
-                                                property_data, 
-                                                st.session_state.api_key,
-                                                st.session_state.selected_model,
-                                                use_mock=use_mock_api
-                                            )
-                                            st.session_state.generated_content[idx] = new_content
-                                            st.session_state.df.at[idx, 'Generated Content'] = new_content
-                                            
-                                            # Regenerate meta description
-                                            meta_desc = generate_meta_description(property_data, new_content)
-                                            st.session_state.meta_descriptions[idx] = meta_desc
-                                            
-                                            st.success("Content regenerated successfully!")
-                                            add_debug(f"Regenerated content for {property_name} successfully")
-                                            st.rerun()
-                                        except Exception as e:
-                                            st.error(f"Error regenerating content: {str(e)}")
-                                            add_debug(f"Error during regeneration: {str(e)}")
-                        
-                        with act_col2:
-                            # Copy to clipboard functionality
-                            if st.button("📋 Copy Content", key=f"copy_{idx}", use_container_width=True):
-                                st.info("Content copied to editor below")
-                        
-                        # Edit content
-                        st.markdown("### Edit Content")
-                        edited_content = st.text_area("", value=cleaned_content, height=400, key=f"edit_{idx}")
-                        
-                        if edited_content != cleaned_content:
-                            if st.button("💾 Save Edits", key=f"save_{idx}", type="primary", use_container_width=True):
-                                st.session_state.generated_content[idx] = edited_content
-                                st.session_state.df.at[idx, 'Generated Content'] = edited_content
-                                # Update meta description
-                                meta_desc = generate_meta_description(property_data, edited_content)
-                                st.session_state.meta_descriptions[idx] = meta_desc
-                                st.success("Changes saved!")
-                                add_debug(f"Saved edited content for {property_name}")
-                                st.rerun()
-                    else:
-                        st.error("Content appears to be empty or invalid. Please try regenerating.")
-                        add_debug(f"Empty or invalid content for {property_name}")
-                        
-                else:
-                    st.info("No content generated yet. Click the button below to generate content.")
-                    
-                    if st.button("✨ Generate Description", key=f"gen_{idx}", type="primary", use_container_width=True):
-                        if not st.session_state.api_key and not use_mock_api:
-                            st.error("Please enter Anthropic API key first or enable Test Mode")
-                            add_debug("Generation failed - no API key and test mode disabled")
-                        else:
-                            with st.spinner("Generating content..."):
-                                try:
-                                    add_debug(f"Generating content for {property_name}")
-                                    content = generate_property_description(
-                                        property_data, 
-                                        st.session_state.api_key,
-                                        st.session_state.selected_model,
-                                        use_mock=use_mock_api
-                                    )
-                                    st.session_state.generated_content[idx] = content
-                                    st.session_state.df.at[idx, 'Generated Content'] = content
-                                    
-                                    # Generate meta description
-                                    meta_desc = generate_meta_description(property_data, content)
-                                    st.session_state.meta_descriptions[idx] = meta_desc
-                                    
-                                    st.success("Content generated successfully!")
-                                    add_debug(f"Generated content for {property_name} successfully")
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"Error generating content: {str(e)}")
-                                    add_debug(f"Error during generation: {str(e)}")
+                property_editor_panel(st.session_state.selected_property, use_mock_api)
     
     with tab2:
-        st.subheader("SEO Overview")
-        
-        if st.session_state.generated_content:
-            # Calculate overall statistics
-            total_generated = len(st.session_state.generated_content)
-            seo_scores = []
-            word_counts = []
-            has_cta_count = 0
-            has_address_count = 0
-            
-            for idx, content in st.session_state.generated_content.items():
-                if content and isinstance(content, str):
-                    property_data = st.session_state.df.iloc[idx].to_dict()
-                    analysis = analyze_seo_quality(content, property_data)
-                    seo_scores.append(analysis['seo_score'])
-                    word_counts.append(analysis['word_count'])
-                    if analysis['has_cta']:
-                        has_cta_count += 1
-                    if analysis['has_address']:
-                        has_address_count += 1
-            
-            # Display overview metrics
-            metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
-            
-            with metric_col1:
-                avg_seo_score = sum(seo_scores) / len(seo_scores) if seo_scores else 0
-                st.metric("Average SEO Score", f"{avg_seo_score:.0f}%")
-            
-            with metric_col2:
-                avg_word_count = sum(word_counts) / len(word_counts) if word_counts else 0
-                st.metric("Average Word Count", f"{avg_word_count:.0f}")
-            
-            with metric_col3:
-                cta_percentage = (has_cta_count / total_generated * 100) if total_generated > 0 else 0
-                st.metric("Has Call-to-Action", f"{cta_percentage:.0f}%")
-            
-            with metric_col4:
-                address_percentage = (has_address_count / total_generated * 100) if total_generated > 0 else 0
-                st.metric("Includes Address", f"{address_percentage:.0f}%")
-            
-            # Detailed table
-            st.markdown("### Property SEO Scores")
-            
-            # Create summary dataframe
-            summary_data = []
-            for idx, row in st.session_state.df.iterrows():
-                if idx in st.session_state.generated_content:
-                    content = st.session_state.generated_content[idx]
-                    if content and isinstance(content, str):
-                        property_data = row.to_dict()
-                        analysis = analyze_seo_quality(content, property_data)
-                        
-                        summary_data.append({
-                            'Property': property_data.get('Property Name', f'Property #{idx}'),
-                            'City': property_data.get('City', 'N/A'),
-                            'SEO Score': f"{analysis['seo_score']}%",
-                            'Words': analysis['word_count'],
-                            'Location Mentions': analysis['location_mentions'],
-                            'Has CTA': '✅' if analysis['has_cta'] else '❌',
-                            'Has Address': '✅' if analysis['has_address'] else '❌',
-                            'Readability': analysis['readability_score']
-                        })
-            
-            if summary_data:
-                summary_df = pd.DataFrame(summary_data)
-                st.dataframe(summary_df, use_container_width=True, hide_index=True)
-                
-                # Download summary
-                csv = summary_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    "📥 Download SEO Summary",
-                    csv,
-                    "seo_summary.csv",
-                    "text/csv",
-                    key='download-seo-summary'
-                )
-        else:
-            st.info("Generate content first to see SEO overview")
+        seo_overview_panel()
     
     with tab3:
         st.subheader("Schema.org Structured Data Generator")
@@ -1413,6 +3410,10 @@ if st.session_state.df is not None:
                 """)
         else:
             st.info("Select a property to generate schema markup")
+    
+    with tab4:
+        st.subheader("Request Metrics")
+        metrics_dashboard_panel()
 
 else:
     # No data loaded - show instructions
@@ -1481,18 +3482,103 @@ with st.expander("⚙️ Advanced Settings"):
     col1, col2 = st.columns(2)
     
     with col1:
-        batch_size = st.slider("Batch Size", min_value=1, max_value=20, value=st.session_state.batch_size, 
+        batch_size = st.slider("Concurrent Requests", min_value=1, max_value=20, value=st.session_state.batch_size, 
                               help="Number of properties to process at once")
     
     with col2:
-        delay = st.slider("API Delay (seconds)", min_value=0, max_value=10, value=st.session_state.api_delay, 
-                         help="Delay between API calls to avoid rate limits")
+        http_pool_size = st.slider("Connection Pool Size", min_value=1, max_value=64, value=st.session_state.http_pool_size,
+                                   help="Keep-alive connections reused across requests and reruns")
+        st.caption("API calls are paced automatically from the rate-limit headers Anthropic returns, so no fixed delay is needed.")
+    
+    st.subheader("Scraping Settings")
+    
+    scrape_col1, scrape_col2, scrape_col3 = st.columns(3)
+    
+    with scrape_col1:
+        scrape_concurrency = st.slider("Concurrent Scrapes", min_value=1, max_value=32, value=st.session_state.scrape_concurrency,
+                                       help="Total number of pages fetched at once across all sites")
+    
+    with scrape_col2:
+        scrape_host_concurrency = st.slider("Requests per Site", min_value=1, max_value=8, value=st.session_state.scrape_host_concurrency,
+                                            help="Maximum pages fetched at once from the same website")
+    
+    with scrape_col3:
+        scrape_host_delay = st.slider("Delay per Site (seconds)", min_value=0.0, max_value=5.0, value=float(st.session_state.scrape_host_delay), step=0.5,
+                                      help="Minimum time between requests to the same website")
+    
+    parse_col1, parse_col2 = st.columns(2)
+    
+    with parse_col1:
+        parse_processes = st.slider("Parse Processes", min_value=0, max_value=min(os.cpu_count() or 1, MAX_PARSE_PROCESSES),
+                                    value=min(st.session_state.parse_processes, os.cpu_count() or 1, MAX_PARSE_PROCESSES),
+                                    help="Worker processes that extract data from fetched pages during bulk scrapes; 0 parses in the fetch threads")
+    
+    with parse_col2:
+        fast_html_parsing = st.checkbox("Fast HTML parsing (lxml)", value=st.session_state.fast_html_parsing,
+                                        help="Read only the parts of each page the extractors need instead of fully parsing it with html.parser")
+        use_page_cache = st.checkbox("Skip unchanged pages", value=st.session_state.use_page_cache,
+                                     help="Keep scraped pages and re-request them with If-None-Match/If-Modified-Since; pages the site reports as unchanged reuse their earlier extraction")
     
     if st.button("Save Settings"):
         st.session_state.batch_size = batch_size
-        st.session_state.api_delay = delay
+        st.session_state.http_pool_size = http_pool_size
+        st.session_state.scrape_concurrency = scrape_concurrency
+        st.session_state.scrape_host_concurrency = scrape_host_concurrency
+        st.session_state.scrape_host_delay = scrape_host_delay
+        st.session_state.fast_html_parsing = fast_html_parsing
+        st.session_state.parse_processes = parse_processes
+        st.session_state.use_page_cache = use_page_cache
         st.success("Settings saved!")
-        add_debug(f"Updated settings: batch_size={batch_size}, delay={delay}s")
+        add_debug(f"Updated settings: batch_size={batch_size}, pool_size={http_pool_size}, scrape_concurrency={scrape_concurrency}, "
+                  f"per_site={scrape_host_concurrency}, site_delay={scrape_host_delay}s, fast_parsing={fast_html_parsing}, parse_processes={parse_processes}, page_cache={use_page_cache}")
+    
+    # Prompt template versions
+    st.subheader("Prompt Template")
+    template_store = get_prompt_template_store()
+    saved_templates = {saved["version"]: saved for saved in template_store.list_versions()}
+    version_options = [DEFAULT_TEMPLATE_VERSION] + list(reversed(saved_templates))
+    active_version = st.session_state.prompt_template_version or DEFAULT_TEMPLATE_VERSION
+    selected_version = st.selectbox(
+        "Template Version",
+        options=version_options,
+        index=version_options.index(active_version) if active_version in version_options else 0,
+        format_func=lambda v: f"{v} - built-in" if v == DEFAULT_TEMPLATE_VERSION else f"{v} - {saved_templates[v]['name'] or 'unnamed'} ({saved_templates[v]['created']})",
+        help="Each saved version keeps its exact text, so switching back reuses content generated with it"
+    )
+    shown = saved_templates.get(selected_version, {
+        "instructions": DEFAULT_INSTRUCTIONS_TEMPLATE,
+        "property_details": DEFAULT_PROPERTY_TEMPLATE
+    })
+    
+    template_col1, template_col2 = st.columns(2)
+    with template_col1:
+        instructions_text = st.text_area(
+            "Instructions", value=shown["instructions"], height=300, key=f"template_instructions_{selected_version}",
+            help=f"Shared by every property. Placeholders: {', '.join('{' + field + '}' for field in INSTRUCTION_FIELDS)}"
+        )
+    with template_col2:
+        property_text = st.text_area(
+            "Property Details", value=shown["property_details"], height=300, key=f"template_property_{selected_version}",
+            help="Any column as {Column Name}; missing values read N/A. Write literal braces as {{ and }}."
+        )
+    template_name = st.text_input("Version Name", key="template_name")
+    
+    template_btn_col1, template_btn_col2 = st.columns(2)
+    with template_btn_col1:
+        if st.button("✅ Use Selected Version", disabled=selected_version == active_version, use_container_width=True):
+            st.session_state.prompt_template_version = template_version_setting(selected_version)
+            add_debug(f"Using prompt template version {selected_version}")
+            st.rerun()
+    with template_btn_col2:
+        if st.button("💾 Save as New Version", use_container_width=True):
+            try:
+                version = template_store.save(instructions_text, property_text, template_name.strip())
+                st.session_state.prompt_template_version = template_version_setting(version)
+                add_debug(f"Saved prompt template version {version}")
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
+    st.caption(f"Generation uses version {active_version}")
     
     # Scraped Data Editor
     if st.session_state.scraped_properties:
@@ -1500,8 +3586,8 @@ with st.expander("⚙️ Advanced Settings"):
         st.subheader("✏️ Edit Scraped Data")
         
         # Select property to edit
-        property_names = [p.get('Property Name', f'Property {i+1}') for i, p in enumerate(st.session_state.scraped_properties)]
-        selected_prop_idx = st.selectbox("Select property to edit:", range(len(property_names)), format_func=lambda x: property_names[x])
+        scraped_names = [p.get('Property Name', f'Property {i+1}') for i, p in enumerate(st.session_state.scraped_properties)]
+        selected_prop_idx = st.selectbox("Select property to edit:", range(len(scraped_names)), format_func=lambda x: scraped_names[x])
         
         if selected_prop_idx is not None:
             prop = st.session_state.scraped_properties[selected_prop_idx]
@@ -1565,8 +3651,19 @@ with st.expander("⚙️ Advanced Settings"):
                 "target_keywords": st.session_state.target_keywords,
                 "example_copies": st.session_state.example_copies,
                 "batch_size": st.session_state.batch_size,
-                "api_delay": st.session_state.api_delay
+                "http_pool_size": st.session_state.http_pool_size,
+                "scrape_concurrency": st.session_state.scrape_concurrency,
+                "scrape_host_concurrency": st.session_state.scrape_host_concurrency,
+                "scrape_host_delay": st.session_state.scrape_host_delay,
+                "fast_html_parsing": st.session_state.fast_html_parsing,
+                "parse_processes": st.session_state.parse_processes,
+                "use_page_cache": st.session_state.use_page_cache
             }
+            saved_template = get_prompt_template_store().get(st.session_state.prompt_template_version)
+            if saved_template is not None:
+                settings_data["prompt_template"] = {
+                    field: saved_template[field] for field in ("name", "instructions", "property_details")
+                }
             settings_json = json.dumps(settings_data, indent=2)
             st.download_button(
                 label="Download Settings JSON",
@@ -1591,8 +3688,13 @@ with st.expander("⚙️ Advanced Settings"):
                     st.session_state.example_copies = settings_data["example_copies"]
                 if "batch_size" in settings_data:
                     st.session_state.batch_size = settings_data["batch_size"]
-                if "api_delay" in settings_data:
-                    st.session_state.api_delay = settings_data["api_delay"]
+                for setting in ("http_pool_size", "scrape_concurrency", "scrape_host_concurrency", "scrape_host_delay", "fast_html_parsing", "parse_processes", "use_page_cache"):
+                    if setting in settings_data:
+                        st.session_state[setting] = settings_data[setting]
+                if "prompt_template" in settings_data:
+                    template = settings_data["prompt_template"]
+                    version = get_prompt_template_store().save(template["instructions"], template["property_details"], template.get("name", ""))
+                    st.session_state.prompt_template_version = template_version_setting(version)
                 
                 st.success("Settings imported successfully!")
                 add_debug("Imported settings from file")
@@ -1622,6 +3724,7 @@ with st.expander("🐛 Debug Information"):
         "Model": st.session_state.selected_model,
         "Properties Loaded": len(st.session_state.df) if st.session_state.df is not None else 0,
         "Content Generated": len(st.session_state.generated_content),
+        "Failed Rows": len(st.session_state.failed_rows),
         "Excluded Terms": len(st.session_state.excluded_terms),
         "Target Keywords": len(st.session_state.target_keywords),
         "Example Copies": len(st.session_state.example_copies),
@@ -1630,6 +3733,59 @@ with st.expander("🐛 Debug Information"):
     
     for key, value in state_info.items():
         st.text(f"{key}: {value}")
+    
+    # Content cache statistics
+    st.subheader("Content Cache")
+    cache_stats = get_content_cache().stats()
+    cache_col1, cache_col2 = st.columns([3, 1])
+    with cache_col1:
+        st.text(f"Cache Hits: {cache_stats['hits']}")
+        st.text(f"Cache Misses: {cache_stats['misses']}")
+        st.text(f"Cached Entries: {cache_stats['entries']}")
+    with cache_col2:
+        if st.button("Clear Cache"):
+            get_content_cache().clear()
+            add_debug("Cleared content cache")
+            st.rerun()
+    
+    # Page cache statistics
+    st.subheader("Page Cache")
+    page_stats = get_page_cache().stats()
+    page_col1, page_col2 = st.columns([3, 1])
+    with page_col1:
+        st.text(f"Unchanged Pages Reused: {page_stats['not_modified']}")
+        st.text(f"Pages Downloaded: {page_stats['downloaded']}")
+        st.text(f"Cached Pages: {page_stats['entries']} ({page_stats['bytes'] / 1048576:.1f} MB)")
+    with page_col2:
+        if st.button("Clear Page Cache"):
+            get_page_cache().clear()
+            add_debug("Cleared page cache")
+            st.rerun()
+    
+    # Retry statistics
+    if st.session_state.api_call_stats:
+        st.subheader("API Calls")
+        call_stats = st.session_state.api_call_stats
+        st.text(f"Calls: {len(call_stats)}")
+        st.text(f"Failed Calls: {sum(1 for c in call_stats if not c['ok'])}")
+        st.text(f"Total Retries: {sum(c['retries'] for c in call_stats)}")
+        st.text(f"Total Backoff: {sum(c['backoff_seconds'] for c in call_stats):.1f}s")
+        
+        # Prompt caching: cache reads are billed at a fraction of normal input tokens
+        uncached_tokens = sum(c['input_tokens'] for c in call_stats)
+        cache_write_tokens = sum(c['cache_creation_input_tokens'] for c in call_stats)
+        cache_read_tokens = sum(c['cache_read_input_tokens'] for c in call_stats)
+        total_input_tokens = uncached_tokens + cache_write_tokens + cache_read_tokens
+        st.text(f"Input Tokens: {total_input_tokens} ({cache_read_tokens} cache read, {cache_write_tokens} cache write)")
+        st.text(f"Prompt Cache Read Ratio: {cache_read_tokens / total_input_tokens * 100 if total_input_tokens else 0:.0f}%")
+        st.text(f"Output Tokens: {sum(c['output_tokens'] for c in call_stats)}")
+        st.dataframe(pd.DataFrame(call_stats[-20:]), use_container_width=True, hide_index=True)
+    
+    # Rate limiter budgets
+    if st.session_state.api_key:
+        st.subheader("Rate Limits")
+        for key, value in get_rate_limiter(st.session_state.api_key).snapshot().items():
+            st.text(f"{key}: {value}")
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,138 @@
+"""Persistent projects stored as Parquet files.
+
+Each project is a directory holding properties.parquet, the property attributes, and a
+content/ directory of append-only Parquet segments. Every save adds one segment with the
+changed rows' generated content, meta description, SEO metrics and generation metadata;
+the newest entry for a row wins. Segments are compacted into one once there are many.
+Kept free of Streamlit, like property_extraction.
+"""
+import os
+import re
+import shutil
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from atomic_write import atomic_write
+
+CONTENT_SCHEMA = pa.schema([
+    ('idx', pa.int64()),
+    ('property_name', pa.string()),
+    ('generated_content', pa.string()),
+    ('meta_description', pa.string()),
+    ('word_count', pa.int64()),
+    ('seo_score', pa.int64()),
+    ('has_cta', pa.bool_()),
+    ('location_mentions', pa.int64()),
+    ('readability_score', pa.string()),
+    ('model', pa.string()),
+    ('input_tokens', pa.int64()),
+    ('output_tokens', pa.int64()),
+    ('latency_seconds', pa.float64()),
+    ('updated', pa.timestamp('s'))
+])
+COMPACT_AFTER_SEGMENTS = 64
+
+def properties_table(properties):
+    """Arrow table of a property DataFrame, storing object columns that mix types as text"""
+    properties = properties.reset_index(drop=True)
+    try:
+        return pa.Table.from_pandas(properties, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        mixed = {
+            column: properties[column].map(lambda value: value if value is None or isinstance(value, str) or pd.isna(value) else str(value))
+            for column in properties.select_dtypes(include='object').columns
+        }
+        return pa.Table.from_pandas(properties.assign(**mixed), preserve_index=False)
+
+class ProjectStore:
+    """Projects saved under root, one directory per project"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def project_dir(self, name):
+        safe_name = re.sub(r'[^\w.-]+', '_', name).strip('._') or 'project'
+        return os.path.join(self.root, safe_name)
+
+    def _content_dir(self, name):
+        return os.path.join(self.project_dir(name), 'content')
+
+    def _segments(self, name):
+        directory = self._content_dir(name)
+        if not os.path.isdir(directory):
+            return []
+        # Segment names start with a fixed-width timestamp, so name order is write order
+        return [os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith('.parquet')]
+
+    def list_projects(self):
+        """Saved project names, most recently saved first"""
+        if not os.path.isdir(self.root):
+            return []
+        projects = [
+            name for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, 'properties.parquet'))
+        ]
+        return sorted(projects, key=lambda name: os.path.getmtime(os.path.join(self.root, name)), reverse=True)
+
+    def save_properties(self, name, properties):
+        """Write a project's property attributes, discarding content saved for earlier ones"""
+        directory = self.project_dir(name)
+        os.makedirs(directory, exist_ok=True)
+        with atomic_write(os.path.join(directory, 'properties.parquet'), 'wb') as f:
+            pq.write_table(properties_table(properties), f)
+        shutil.rmtree(self._content_dir(name), ignore_errors=True)
+        os.utime(directory)
+
+    def append_content(self, name, rows):
+        """Add a segment with the given content rows, stamped with the current time.
+
+        Columns of CONTENT_SCHEMA missing from rows are left empty.
+        """
+        if len(rows) == 0:
+            return
+        directory = self._content_dir(name)
+        os.makedirs(directory, exist_ok=True)
+        rows = rows.reindex(columns=CONTENT_SCHEMA.names).assign(updated=pd.Timestamp.now().floor('s'))
+        table = pa.Table.from_pandas(rows, schema=CONTENT_SCHEMA, preserve_index=False)
+        self._write_segment(directory, table)
+        os.utime(self.project_dir(name))
+        if len(self._segments(name)) > COMPACT_AFTER_SEGMENTS:
+            self.compact(name)
+
+    def _write_segment(self, directory, table):
+        path = os.path.join(directory, f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet")
+        with atomic_write(path, 'wb') as f:
+            pq.write_table(table, f)
+
+    def compact(self, name):
+        """Replace a project's segments by one holding only the newest entry for each row"""
+        segments = self._segments(name)
+        if len(segments) < 2:
+            return
+        table = pa.Table.from_pandas(self.load_content(name), schema=CONTENT_SCHEMA, preserve_index=False)
+        # The compacted segment is written before the old ones go, and sorts after them
+        self._write_segment(self._content_dir(name), table)
+        for path in segments:
+            os.remove(path)
+
+    def load_properties(self, name, columns=None):
+        """Property attributes, optionally only the given columns"""
+        return pq.read_table(os.path.join(self.project_dir(name), 'properties.parquet'), columns=columns).to_pandas()
+
+    def load_content(self, name, columns=None):
+        """Newest saved content entry per row, optionally only the given columns"""
+        if columns is not None:
+            columns = ['idx'] + [column for column in columns if column != 'idx']
+        segments = self._segments(name)
+        if not segments:
+            return CONTENT_SCHEMA.empty_table().select(columns or CONTENT_SCHEMA.names).to_pandas()
+        table = pa.concat_tables([pq.read_table(path, columns=columns, schema=CONTENT_SCHEMA) for path in segments])
+        content = table.to_pandas()
+        return content.drop_duplicates('idx', keep='last').sort_values('idx').reset_index(drop=True)
+
+    def delete(self, name):
+        shutil.rmtree(self.project_dir(name), ignore_errors=True)
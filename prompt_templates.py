@@ -0,0 +1,213 @@
+"""Prompt templates for description generation, compiled once and rendered per row.
+
+A prompt has two parts: the instructions shared by every property, sent ahead as a
+cacheable block, and the property details that follow them. Both are str.format-style
+templates. The details template takes any column as a {Column Name} placeholder, with
+missing columns rendered as N/A. A template is parsed once into a positional format
+string, so rendering a row is a single format call.
+
+Versions are identified by a hash of the template text. The same text always has the
+same version and renders the same prompts, so content cache keys stay stable across
+edits that are later undone. Kept free of Streamlit, like property_extraction.
+"""
+import hashlib
+import json
+import os
+import string
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from atomic_write import atomic_write
+
+# Placeholders the instructions template can use
+INSTRUCTION_FIELDS = ('target_keywords', 'excluded_terms', 'example_copies')
+DEFAULT_TARGET_KEYWORDS = 'office space, executive office'
+MISSING_VALUE = 'N/A'
+
+DEFAULT_INSTRUCTIONS_TEMPLATE = """You are an SEO content specialist writing for a luxury office space provider.
+Create a Google-optimized office space description that will rank well in search results.
+The details of the property to describe follow these instructions.
+
+Target Keywords: {target_keywords}
+
+SEO Requirements:
+1. Start with a compelling H1 title that includes the property name, "Office Space" and location
+2. Include the full address naturally in the first paragraph
+3. Use location-based keywords (city, neighborhood) 2-3 times naturally throughout
+4. Include "office space" or "executive office" variations 2-3 times
+5. Mention specific amenities and features using semantic keywords
+6. Keep content between 150-300 words for optimal engagement
+7. Use short paragraphs (2-3 sentences max) for readability
+8. Include a clear call-to-action in the final paragraph
+9. Write in active voice and present tense
+10. Focus on benefits rather than just features
+11. Include local landmarks or nearby businesses if relevant
+
+Content Structure:
+- H1 Title using # (include property name + "Office Space" + location)
+- Opening paragraph with address and main value proposition
+- 2-3 short paragraphs highlighting key features and benefits
+- Closing paragraph with clear CTA (Schedule tour, Contact us, etc.)
+
+Write naturally for humans first, search engines second. Avoid:
+- Keyword stuffing or unnatural repetition
+- Generic phrases like "state-of-the-art" or "premier location"
+- Long, complex sentences
+- Passive voice
+- Overly promotional language
+- More than 4 bullet points if using a list
+
+{excluded_terms}
+{example_copies}"""
+
+DEFAULT_PROPERTY_TEMPLATE = """Property Details:
+Property Name: {Property Name}
+Address: {Address}
+City: {City}
+Zip Code: {Zip Code}
+Neighborhood: {Neighborhood}
+Property Type: {Property Type}
+Size Range: {Size Range}
+Building Description: {Building Description}
+Key Features: {Key Features}
+Nearby Businesses: {Nearby Businesses}
+Transport Access: {Transport Access}
+Technology Features: {Technology Features}
+Meeting Rooms: {Meeting Rooms}
+Common Areas: {Common Areas}
+Business Services: {Business Services}
+Security Features: {Security Features}
+Wellness Amenities: {Wellness Amenities}
+Office Configurations: {Office Configurations}
+Lease Options: {Lease Options}
+Contact Information: {Contact Information}
+
+Write the SEO-optimized content now:"""
+
+class PromptTemplate:
+    """A template parsed once into a positional format string and the fields that fill it.
+
+    Raises ValueError for malformed templates, placeholders without a name or with format
+    options, and, if allowed_fields is given, placeholders not in it.
+    """
+
+    def __init__(self, text, allowed_fields=None):
+        try:
+            parsed = list(string.Formatter().parse(text))
+        except ValueError as e:
+            raise ValueError(f"Invalid template: {e}. Write literal braces as {{{{ and }}}}.") from None
+        pattern = []
+        fields = []
+        for literal, field, format_spec, conversion in parsed:
+            pattern.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field is None:
+                continue
+            if not field.strip() or field.isdigit():
+                raise ValueError("Placeholders need a field name, e.g. {Property Name}")
+            if format_spec or conversion:
+                raise ValueError(f"Placeholder {{{field}}} cannot have format options")
+            if allowed_fields is not None and field not in allowed_fields:
+                raise ValueError(f"Unknown placeholder {{{field}}}; available: {', '.join(allowed_fields)}")
+            pattern.append('{}')
+            fields.append(field)
+        self.text = text
+        self.fields = tuple(fields)
+        self._pattern = ''.join(pattern)
+
+    def render(self, values):
+        """Fill the template from a mapping such as a row's dict"""
+        return self._pattern.format(*[values.get(field, MISSING_VALUE) for field in self.fields])
+
+    def render_columns(self, df):
+        """Fill the template once per row of df, reading each field's column only once"""
+        columns = [df[field].tolist() if field in df else [MISSING_VALUE] * len(df) for field in self.fields]
+        if not columns:
+            return [self._pattern.format()] * len(df)
+        return [self._pattern.format(*row) for row in zip(*columns)]
+
+def excluded_terms_section(excluded_terms):
+    if not excluded_terms:
+        return ""
+    return ("\n\nIMPORTANT: Do NOT use the following terms or phrases in your content:\n"
+            + ''.join(f"{i}. \"{term}\"\n" for i, term in enumerate(excluded_terms, 1)))
+
+def example_copies_section(example_copies):
+    if not example_copies:
+        return ""
+    return ("\n\nHere are examples of good copy that you should emulate in style and tone:\n\n"
+            + ''.join(f"EXAMPLE {i}:\n{example}\n\n" for i, example in enumerate(example_copies, 1)))
+
+def template_version(instructions, property_details):
+    """Short hash identifying a pair of template texts"""
+    payload = json.dumps([instructions, property_details], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+class PromptTemplates:
+    """The instructions and property details templates of one version, compiled"""
+
+    def __init__(self, instructions=DEFAULT_INSTRUCTIONS_TEMPLATE, property_details=DEFAULT_PROPERTY_TEMPLATE):
+        self.instructions = PromptTemplate(instructions, INSTRUCTION_FIELDS)
+        self.property_details = PromptTemplate(property_details)
+        self.version = template_version(instructions, property_details)
+
+    def shared_prompt(self, target_keywords=(), excluded_terms=(), example_copies=()):
+        """The instructions, identical for every property in a batch"""
+        return self.instructions.render({
+            'target_keywords': ', '.join(target_keywords) if target_keywords else DEFAULT_TARGET_KEYWORDS,
+            'excluded_terms': excluded_terms_section(excluded_terms),
+            'example_copies': example_copies_section(example_copies)
+        })
+
+    def property_prompt(self, property_data):
+        return self.property_details.render(property_data)
+
+    def property_prompts(self, df):
+        """Property prompts for every row of df, in order"""
+        return self.property_details.render_columns(df)
+
+@lru_cache(maxsize=32)
+def compile_templates(instructions=DEFAULT_INSTRUCTIONS_TEMPLATE, property_details=DEFAULT_PROPERTY_TEMPLATE):
+    """PromptTemplates for the given texts, parsed only the first time they are seen"""
+    return PromptTemplates(instructions, property_details)
+
+DEFAULT_TEMPLATE_VERSION = template_version(DEFAULT_INSTRUCTIONS_TEMPLATE, DEFAULT_PROPERTY_TEMPLATE)
+
+class PromptTemplateStore:
+    """Saved template versions, kept in a JSON file, newest last"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def list_versions(self):
+        """Saved versions as dicts with version, name, created, instructions and property_details"""
+        with self._lock:
+            return self._load()
+
+    def get(self, version):
+        return next((saved for saved in self.list_versions() if saved['version'] == version), None)
+
+    def save(self, instructions, property_details, name=''):
+        """Validate and save a version, returning its id; saving unchanged text returns the existing id"""
+        version = compile_templates(instructions, property_details).version
+        with self._lock:
+            versions = self._load()
+            if any(saved['version'] == version for saved in versions) or version == DEFAULT_TEMPLATE_VERSION:
+                return version
+            versions.append({
+                'version': version,
+                'name': name,
+                'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'instructions': instructions,
+                'property_details': property_details
+            })
+            with atomic_write(self.path, encoding='utf-8') as f:
+                json.dump(versions, f, indent=2)
+        return version
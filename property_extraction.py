@@ -0,0 +1,439 @@
+"""Extract property details from scraped office space pages.
+
+Kept free of Streamlit so the extraction can run outside the app, e.g. in benchmarks and
+in ParsePool's worker processes, which run this module as a script.
+"""
+import json
+import os
+import pickle
+import queue
+import re
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import lxml.html
+from lxml.etree import ParserError, XPath
+from bs4 import BeautifulSoup, UnicodeDammit
+
+# Patterns are compiled once at import instead of on every page
+ADDRESS_PATTERN = re.compile(r'(\d+[\w\s,.-]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln|Way|Place|Pl|Court|Ct))')
+ZIP_PATTERN = re.compile(r'\b(\d{5}(?:-\d{4})?)\b')
+META_ADDRESS_NAME = re.compile('address|location', re.I)
+NEIGHBORHOOD_PATTERNS = [
+    re.compile(r'located in (?:the )?([A-Z][a-z\s]+)(?:neighborhood|district|area)'),
+    re.compile(r'([A-Z][a-z\s]+) neighborhood'),
+    re.compile(r'([A-Z][a-z\s]+) district')
+]
+SIZE_PATTERN = re.compile(r'(\d{1,3},?\d{3}[\s-]+(?:to|-)[\s-]+\d{1,3},?\d{3}\s*(?:sq\.?\s*ft\.?|square feet))', re.I)
+TRANSIT_PATTERN = re.compile('subway|metro|train|bus|transit|transportation', re.I)
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'(?:\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})')
+
+# Feature keywords by category
+TECH_KEYWORDS = ['wifi', 'internet', 'fiber', 'technology', 'av', 'video conferencing', 'digital']
+SECURITY_KEYWORDS = ['security', 'secure', 'surveillance', 'access control', 'monitored', '24/7']
+WELLNESS_KEYWORDS = ['fitness', 'gym', 'wellness', 'health', 'shower', 'bike', 'outdoor']
+BUSINESS_KEYWORDS = ['reception', 'concierge', 'mail', 'print', 'copy', 'admin', 'support']
+MEETING_KEYWORDS = ['meeting', 'conference', 'boardroom', 'training room']
+
+# Text inside these elements is not part of the visible page text
+NON_TEXT_TAGS = ('script', 'style', 'template')
+# Whitespace-only text nodes outside the elements where html.parser keeps whitespace as written
+WHITESPACE_ONLY_TEXT = XPath("//text()[normalize-space() = ''][not(ancestor::pre or ancestor::textarea)]")
+
+def extract_text_from_element(element):
+    """Extract and clean text from BeautifulSoup element"""
+    if element:
+        text = element.get_text(strip=True)
+        # Clean up extra whitespace
+        text = ' '.join(text.split())
+        return text
+    return ""
+
+def extract_text_from_node(node):
+    """Extract and clean text from an lxml element, matching extract_text_from_element"""
+    if node is None:
+        return ""
+    return ' '.join(''.join(text.strip() for text in node.itertext()).split())
+
+def soup_page_parts(html):
+    """Parts of the page the extractors use, from a full BeautifulSoup parse"""
+    soup = BeautifulSoup(html, 'html.parser')
+    meta_address = soup.find('meta', {'name': META_ADDRESS_NAME})
+    meta_desc = soup.find('meta', {'name': 'description'})
+    h1 = soup.find('h1')
+    first_p = soup.find('p')
+    return {
+        'text': soup.get_text(),
+        'title': extract_text_from_element(soup.find('title')),
+        'h1': extract_text_from_element(h1) if h1 else None,
+        'first_paragraph': extract_text_from_element(first_p) if first_p else None,
+        'meta_address': meta_address.get('content') if meta_address else None,
+        'meta_description': meta_desc.get('content') if meta_desc else None,
+        'structured_data': [script.string for script in soup.find_all('script', type='application/ld+json')],
+        'list_items': [extract_text_from_element(item) for lst in soup.find_all(['ul', 'ol']) for item in lst.find_all('li')]
+    }
+
+def decode_html(html):
+    """Decode page bytes, trying UTF-8 before BeautifulSoup's slower encoding detection"""
+    if isinstance(html, str):
+        return html
+    try:
+        return html.decode('utf-8')
+    except UnicodeDecodeError:
+        return UnicodeDammit(html, is_html=True).unicode_markup
+
+def lxml_page_parts(html):
+    """Parts of the page the extractors use, read straight from an lxml tree.
+    
+    lxml builds its tree in C and only the handful of nodes the extractors need are
+    turned into Python strings, which is several times faster than a BeautifulSoup parse.
+    """
+    try:
+        doc = lxml.html.document_fromstring(decode_html(html))
+    except ValueError:
+        # An XML declaration with an encoding cannot be parsed from str; let lxml decode it
+        doc = lxml.html.document_fromstring(html)
+    
+    def first(tag):
+        return next(doc.iter(tag), None)
+    
+    structured_data = [script.text for script in doc.iter('script') if script.get('type') == 'application/ld+json']
+    
+    # html.parser stores each whitespace-only string as a single newline or space
+    for text in WHITESPACE_ONLY_TEXT(doc):
+        collapsed = '\n' if '\n' in text else ' '
+        if text.is_tail:
+            text.getparent().tail = collapsed
+        else:
+            text.getparent().text = collapsed
+    
+    # get_text skips the strings of non-visible elements, so empty them before reading any
+    # text; the text after each one stays a separate string, as in BeautifulSoup
+    for node in doc.iter(*NON_TEXT_TAGS):
+        node.clear(keep_tail=True)
+    
+    meta_address = next((meta for meta in doc.iter('meta') if META_ADDRESS_NAME.search(meta.get('name') or '')), None)
+    meta_desc = next((meta for meta in doc.iter('meta') if meta.get('name') == 'description'), None)
+    h1 = first('h1')
+    first_p = first('p')
+    return {
+        'text': doc.text_content(),
+        'title': extract_text_from_node(first('title')),
+        'h1': extract_text_from_node(h1) if h1 is not None else None,
+        'first_paragraph': extract_text_from_node(first_p) if first_p is not None else None,
+        'meta_address': meta_address.get('content') if meta_address is not None else None,
+        'meta_description': meta_desc.get('content') if meta_desc is not None else None,
+        'structured_data': structured_data,
+        'list_items': [extract_text_from_node(item) for lst in doc.iter('ul', 'ol') for item in lst.iter('li')]
+    }
+
+def find_address_info(parts):
+    """Extract address information from page"""
+    address_data = {
+        'Address': '',
+        'City': '',
+        'State': '',
+        'Zip Code': ''
+    }
+    text_content = parts['text']
+    
+    # Look for address in common locations
+    # 1. Check meta tags
+    if parts['meta_address']:
+        address_data['Address'] = parts['meta_address']
+    
+    # 2. Check structured data
+    for script in parts['structured_data']:
+        try:
+            data = json.loads(script)
+            if isinstance(data, dict):
+                if 'address' in data:
+                    addr = data['address']
+                    if isinstance(addr, dict):
+                        address_data['Address'] = addr.get('streetAddress', '')
+                        address_data['City'] = addr.get('addressLocality', '')
+                        address_data['State'] = addr.get('addressRegion', '')
+                        address_data['Zip Code'] = addr.get('postalCode', '')
+        except:
+            pass
+    
+    # 3. Search in text content
+    if not address_data['Address']:
+        address_match = ADDRESS_PATTERN.search(text_content)
+        if address_match:
+            address_data['Address'] = address_match.group(1)
+    
+    # Find zip code
+    if not address_data['Zip Code']:
+        zip_match = ZIP_PATTERN.search(text_content)
+        if zip_match:
+            address_data['Zip Code'] = zip_match.group(1)
+    
+    return address_data
+
+def extract_property_features(parts):
+    """Extract property features and amenities"""
+    features = {
+        'Key Features': [],
+        'Technology Features': [],
+        'Security Features': [],
+        'Wellness Amenities': [],
+        'Business Services': [],
+        'Meeting Rooms': '',
+        'Common Areas': ''
+    }
+    
+    # Look for features in lists
+    for item in parts['list_items']:
+        item_text = item.lower()
+        
+        # Categorize features
+        if any(keyword in item_text for keyword in TECH_KEYWORDS):
+            features['Technology Features'].append(item)
+        elif any(keyword in item_text for keyword in SECURITY_KEYWORDS):
+            features['Security Features'].append(item)
+        elif any(keyword in item_text for keyword in WELLNESS_KEYWORDS):
+            features['Wellness Amenities'].append(item)
+        elif any(keyword in item_text for keyword in BUSINESS_KEYWORDS):
+            features['Business Services'].append(item)
+        elif any(keyword in item_text for keyword in MEETING_KEYWORDS):
+            if not features['Meeting Rooms']:
+                features['Meeting Rooms'] = item
+        else:
+            features['Key Features'].append(item)
+    
+    # Convert lists to comma-separated strings
+    for key in ['Key Features', 'Technology Features', 'Security Features', 'Wellness Amenities', 'Business Services']:
+        if features[key]:
+            features[key] = ', '.join(features[key][:5])  # Limit to 5 items
+        else:
+            features[key] = ''
+    
+    return features
+
+def find_transit_sentences(text_content, limit=2):
+    """The first sentences (split on '.') that mention public transport"""
+    sentences = []
+    position = 0
+    while len(sentences) < limit:
+        match = TRANSIT_PATTERN.search(text_content, position)
+        if not match:
+            break
+        start = text_content.rfind('.', 0, match.start()) + 1
+        end = text_content.find('.', match.end())
+        if end == -1:
+            end = len(text_content)
+        sentences.append(text_content[start:end].strip())
+        position = end
+    return sentences
+
+def extract_property_data(html, url, fast=True):
+    """Extract property details from a page's HTML.
+    
+    fast parses with lxml and reads only the nodes the extractors need; otherwise the page
+    is fully parsed with BeautifulSoup's html.parser. Both give the same fields.
+    """
+    try:
+        parts = lxml_page_parts(html) if fast else soup_page_parts(html)
+    except ParserError:
+        # lxml rejects documents with no content at all
+        parts = soup_page_parts(html)
+    text_content = parts['text']
+    
+    # Initialize property data
+    property_data = {
+        'Property Name': '',
+        'Address': '',
+        'City': '',
+        'State': '',
+        'Zip Code': '',
+        'Neighborhood': '',
+        'Property Type': 'Office Space',
+        'Size Range': '',
+        'Building Description': '',
+        'Key Features': '',
+        'Nearby Businesses': '',
+        'Transport Access': '',
+        'Technology Features': '',
+        'Meeting Rooms': '',
+        'Common Areas': '',
+        'Business Services': '',
+        'Security Features': '',
+        'Wellness Amenities': '',
+        'Office Configurations': '',
+        'Lease Options': '',
+        'Contact Information': '',
+        'Source URL': url
+    }
+    
+    # Extract property name
+    if parts['title']:
+        property_data['Property Name'] = parts['title'].split('|')[0].strip()
+    
+    # Try H1 if title not good
+    if not property_data['Property Name'] or len(property_data['Property Name']) < 5:
+        if parts['h1'] is not None:
+            property_data['Property Name'] = parts['h1']
+    
+    # Extract address information
+    property_data.update(find_address_info(parts))
+    
+    # Extract features
+    property_data.update(extract_property_features(parts))
+    
+    # Look for neighborhood info
+    for pattern in NEIGHBORHOOD_PATTERNS:
+        match = pattern.search(text_content)
+        if match:
+            property_data['Neighborhood'] = match.group(1).strip()
+            break
+    
+    # Look for size/square footage
+    size_match = SIZE_PATTERN.search(text_content)
+    if size_match:
+        property_data['Size Range'] = size_match.group(1)
+    
+    # Look for transport/transit information
+    transit_sentences = find_transit_sentences(text_content)
+    if transit_sentences:
+        property_data['Transport Access'] = '. '.join(transit_sentences)
+    
+    # Extract building description from meta description or first paragraph
+    if parts['meta_description']:
+        property_data['Building Description'] = parts['meta_description']
+    elif parts['first_paragraph'] is not None:
+        property_data['Building Description'] = parts['first_paragraph'][:200]
+    
+    # Look for contact information
+    email_match = EMAIL_PATTERN.search(text_content)
+    phone_match = PHONE_PATTERN.search(text_content)
+    
+    contact_info = []
+    if email_match:
+        contact_info.append(f"Email: {email_match.group(0)}")
+    if phone_match:
+        phone = phone_match.groups()
+        formatted_phone = f"({phone[0]}) {phone[1]}-{phone[2]}"
+        contact_info.append(f"Phone: {formatted_phone}")
+    
+    property_data['Contact Information'] = ', '.join(contact_info)
+    
+    return property_data
+
+class ParsePool:
+    """Worker processes that run extract_property_data, with a concurrent.futures-style submit.
+    
+    Each worker is a fresh interpreter running this module as a script, so it imports only
+    the parsers. multiprocessing's spawn and forkserver workers would also re-import the
+    parent's __main__, which under Streamlit is the app script. One thread per worker feeds
+    it requests from a shared queue. As with ProcessPoolExecutor, once a worker dies every
+    waiting and later request fails with BrokenProcessPool.
+    """
+    
+    def __init__(self, processes):
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._broken = False
+        self._shutdown = False
+        self._processes = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            for _ in range(processes)
+        ]
+        for process in self._processes:
+            threading.Thread(target=self._feed, args=(process,), name='parse-pool-feeder', daemon=True).start()
+    
+    def submit(self, html, url, fast=True):
+        """Future for extract_property_data(html, url, fast) in a worker process"""
+        future = Future()
+        with self._lock:
+            if self._broken:
+                raise BrokenProcessPool("A parse worker process died")
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._requests.put((future, (html, url, fast)))
+        return future
+    
+    def shutdown(self, cancel_futures=False):
+        """Stop the workers once they finish their current page, optionally cancelling queued pages"""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            queued = self._take_queued() if cancel_futures else []
+            for _ in self._processes:
+                self._requests.put(None)
+        for future in queued:
+            if future.cancel():
+                future.set_running_or_notify_cancel()
+    
+    def _take_queued(self):
+        """Remove and return the futures still waiting for a worker; call with the lock held"""
+        futures, stops = [], 0
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stops += 1
+            else:
+                futures.append(item[0])
+        for _ in range(stops):
+            self._requests.put(None)
+        return futures
+    
+    def _feed(self, process):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                try:
+                    process.stdin.close()  # the worker exits at end of input
+                except OSError:
+                    pass
+                process.wait()
+                return
+            future, request = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                pickle.dump(request, process.stdin)
+                process.stdin.flush()
+                ok, result = pickle.load(process.stdout)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                # Like ProcessPoolExecutor, one dead worker fails every page still waiting
+                with self._lock:
+                    self._broken = True
+                    queued = self._take_queued()
+                future.set_exception(BrokenProcessPool("A parse worker process died"))
+                for queued_future in queued:
+                    if queued_future.set_running_or_notify_cancel():
+                        queued_future.set_exception(BrokenProcessPool("A parse worker process died"))
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+
+def serve_parse_requests(requests, responses):
+    """ParsePool worker loop: answer each pickled (html, url, fast) request until end of input"""
+    while True:
+        try:
+            html, url, fast = pickle.load(requests)
+        except EOFError:
+            return
+        try:
+            response = (True, extract_property_data(html, url, fast))
+        except Exception as e:
+            response = (False, f"{type(e).__name__}: {e}")
+        pickle.dump(response, responses)
+        responses.flush()
+
+if __name__ == '__main__':
+    # Responses go to the original stdout; anything printed goes to stderr instead
+    responses = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    serve_parse_requests(sys.stdin.buffer, responses)
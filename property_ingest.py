@@ -0,0 +1,134 @@
+"""Stream property spreadsheets into compact DataFrames.
+
+Files are read a chunk at a time instead of in one go: only the columns generation uses are
+kept, values are read as strings, and the low-cardinality columns become categoricals. Each
+chunk is validated as it is read, so rows can be used before the rest of the file has loaded.
+Kept free of Streamlit, like property_extraction.
+"""
+import pandas as pd
+from openpyxl import load_workbook
+
+# Columns read by the default prompt, the page templates and the schema markup
+PROPERTY_COLUMNS = (
+    'Property Name', 'Address', 'City', 'State', 'Zip Code', 'Neighborhood', 'Property Type',
+    'Size Range', 'Building Description', 'Key Features', 'Nearby Businesses', 'Transport Access',
+    'Technology Features', 'Meeting Rooms', 'Common Areas', 'Business Services', 'Security Features',
+    'Wellness Amenities', 'Office Configurations', 'Lease Options', 'Contact Information',
+    'Latitude', 'Longitude', 'Source URL'
+)
+# Columns with few distinct values, stored as categoricals
+CATEGORY_COLUMNS = ('City', 'State', 'Property Type')
+# A row needs at least one of these to be worth generating for
+IDENTITY_COLUMNS = ('Property Name', 'Address')
+INGEST_CHUNK_ROWS = 5000
+
+def cell_text(value):
+    """Spreadsheet cell as the string read_csv would have produced"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def excel_frame(rows, columns):
+    """Rows of cell_text values as a frame of string columns, with empty cells as ''"""
+    frame = pd.DataFrame(rows, columns=columns, dtype=object)
+    # astype('str') alone turns None into 'None' before pandas 3
+    return frame.where(pd.notna(frame), '').astype('str')
+
+class PropertyFileReader:
+    """Reads an uploaded CSV or XLSX property file in validated, compact chunks.
+
+    Iterating yields (chunk, rejected_rows) pairs, where rejected_rows are the spreadsheet
+    row numbers skipped in that chunk. file must be an in-memory file such as a Streamlit
+    upload; estimated_rows gives a total for progress reporting. Only the given columns are
+    kept.
+    """
+
+    def __init__(self, file, name, chunk_rows=INGEST_CHUNK_ROWS, columns=PROPERTY_COLUMNS):
+        self.file = file
+        self.chunk_rows = chunk_rows
+        self.columns = tuple(columns)
+        self.is_excel = not name.lower().endswith('.csv')
+        self.rows_read = 0
+        if self.is_excel:
+            self._workbook = load_workbook(file, read_only=True, data_only=True)
+            self._sheet = self._workbook.worksheets[0]
+            self.estimated_rows = max((self._sheet.max_row or 1) - 1, 0)
+        else:
+            data = file.getvalue()
+            self.estimated_rows = max(data.count(b'\n') - (1 if data.endswith(b'\n') else 0), 0)
+
+    def __iter__(self):
+        chunks = self._excel_chunks() if self.is_excel else self._csv_chunks()
+        for chunk in chunks:
+            if not any(column in chunk for column in self.columns):
+                raise ValueError(f"No property columns found; expected some of: {', '.join(self.columns)}")
+            # Spreadsheet row numbers, counting the header as row 1
+            chunk.index = pd.RangeIndex(self.rows_read + 2, self.rows_read + 2 + len(chunk))
+            self.rows_read += len(chunk)
+            yield validate_chunk(chunk)
+
+    def _csv_chunks(self):
+        self.file.seek(0)
+        with pd.read_csv(self.file, chunksize=self.chunk_rows, dtype=str,
+                         usecols=lambda column: column.strip() in self.columns) as reader:
+            for chunk in reader:
+                yield chunk.rename(columns=str.strip)
+
+    def _excel_chunks(self):
+        try:
+            rows = self._sheet.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+            wanted = [(i, column) for i, column in enumerate(header) if column in self.columns]
+            columns = [column for _, column in wanted]
+            batch = []
+            for row in rows:
+                batch.append([cell_text(row[i]) if i < len(row) else None for i, _ in wanted])
+                if len(batch) == self.chunk_rows:
+                    yield excel_frame(batch, columns)
+                    batch = []
+            if batch:
+                yield excel_frame(batch, columns)
+        finally:
+            self._workbook.close()
+
+def validate_chunk(chunk):
+    """Clean one chunk of raw string columns and drop rows that cannot be used.
+
+    Values are stripped and empty cells become missing. Blank rows are dropped silently;
+    rows with neither a Property Name nor an Address are dropped and reported.
+    """
+    for column in chunk.columns:
+        values = chunk[column].str.strip()
+        empty = values == ''
+        chunk[column] = values.mask(empty) if empty.any() else values
+
+    chunk = chunk.dropna(how='all')
+    identity = [column for column in IDENTITY_COLUMNS if column in chunk]
+    unusable = chunk[identity].isna().all(axis=1) if identity else pd.Series(True, index=chunk.index)
+    rejected_rows = chunk.index[unusable].tolist()
+    if rejected_rows:
+        chunk = chunk[~unusable]
+
+    for column in CATEGORY_COLUMNS:
+        if column in chunk:
+            chunk[column] = chunk[column].astype('category')
+    return chunk.reset_index(drop=True), rejected_rows
+
+def append_chunks(df, chunks):
+    """df (or nothing, if None) with chunks appended below it, keeping the category columns categorical"""
+    frames = ([df] if df is not None else []) + list(chunks)
+    if not frames:
+        return df
+    for column in CATEGORY_COLUMNS:
+        if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames if column in frame):
+            categories = pd.Index([])
+            for frame in frames:
+                if column in frame:
+                    categories = categories.union(frame[column].cat.categories)
+            frames = [
+                frame.assign(**{column: frame[column].cat.set_categories(categories)}) if column in frame else frame
+                for frame in frames
+            ]
+    return pd.concat(frames, ignore_index=True)
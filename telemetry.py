@@ -0,0 +1,162 @@
+"""Per-request metrics for API calls and page fetches.
+
+Every request records one event: a flat dict with its kind, a timestamp, a few
+low-cardinality labels such as model and status, and what the caller measured. The most
+recent events are kept in memory for percentiles and throughput charts. Running totals
+are kept apart from them, so the Prometheus counters never go backwards when old events
+are dropped. Events can also be appended to a JSON Lines file as they are recorded.
+Kept free of Streamlit, like property_extraction.
+"""
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+METRICS_MAX_EVENTS = 20000
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+# Numeric event fields that are also summed into running totals
+COUNTER_FIELDS = (
+    'input_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens', 'output_tokens',
+    'retries', 'request_bytes', 'response_bytes', 'bytes', 'wall_seconds'
+)
+PROMETHEUS_PREFIX = 'centre'
+
+class MetricsStore:
+    """Thread-safe store of the latest max_events metric events, plus running totals"""
+
+    def __init__(self, max_events=METRICS_MAX_EVENTS, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self._events = deque(maxlen=max_events)
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+        self._unwritten = []  # JSONL lines recorded but not yet appended to jsonl_path
+        self._write_lock = threading.Lock()
+
+    def record(self, kind, labels=None, **fields):
+        """Add an event; labels are stored with it and also split the running totals"""
+        labels = {name: str(value) for name, value in (labels or {}).items()}
+        event = {'kind': kind, 'timestamp': round(time.time(), 3), **labels, **fields}
+        line = json.dumps(event, default=str) + '\n' if self.jsonl_path else None
+        with self._lock:
+            self._events.append(event)
+            totals = self._totals[(kind, tuple(sorted(labels.items())))]
+            totals['count'] += 1
+            for field in COUNTER_FIELDS:
+                if isinstance(fields.get(field), (int, float)):
+                    totals[field] += fields[field]
+            if line is not None:
+                self._unwritten.append(line)
+        if line is not None:
+            self._write_unwritten()
+        return event
+
+    def _write_unwritten(self):
+        """Append buffered lines to jsonl_path outside the store lock, in the order they were recorded.
+
+        One thread writes at a time; a thread that finds the file busy leaves its line to
+        the writer, which checks for new lines after every write.
+        """
+        while self._unwritten and self._write_lock.acquire(blocking=False):
+            try:
+                with self._lock:
+                    lines, self._unwritten = self._unwritten, []
+                if lines:
+                    with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                        f.write(''.join(lines))
+            finally:
+                self._write_lock.release()
+
+    def events(self, kind=None, since=None):
+        """Retained events, oldest first, optionally of one kind and newer than a timestamp"""
+        with self._lock:
+            events = list(self._events)
+        return [
+            event for event in events
+            if (kind is None or event['kind'] == kind) and (since is None or event['timestamp'] >= since)
+        ]
+
+    def frame(self, kind, since=None):
+        """Retained events of one kind as a DataFrame with a datetime 'time' column"""
+        frame = pd.DataFrame(self.events(kind, since))
+        if not frame.empty:
+            frame['time'] = pd.to_datetime(frame['timestamp'], unit='s')
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._totals.clear()
+
+    def to_jsonl(self):
+        return ''.join(json.dumps(event, default=str) + '\n' for event in self.events()).encode('utf-8')
+
+    def to_prometheus(self):
+        """Running totals and latency quantiles in the Prometheus text exposition format.
+
+        Quantiles are computed over the retained events; _sum and _count cover every event.
+        """
+        with self._lock:
+            totals = {key: dict(values) for key, values in self._totals.items()}
+        metrics = defaultdict(list)
+        types = {}
+        for (kind, labels), values in sorted(totals.items()):
+            base = f"{PROMETHEUS_PREFIX}_{kind}"
+            label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+            types[f"{base}_requests_total"] = 'counter'
+            metrics[f"{base}_requests_total"].append(f"{base}_requests_total{{{label_text}}} {values['count']:g}")
+            for field in COUNTER_FIELDS:
+                if field in values and field != 'wall_seconds':
+                    types[f"{base}_{field}_total"] = 'counter'
+                    metrics[f"{base}_{field}_total"].append(f"{base}_{field}_total{{{label_text}}} {values[field]:g}")
+
+            name = f"{base}_latency_seconds"
+            types[name] = 'summary'
+            latencies = [
+                event['wall_seconds'] for event in self.events(kind)
+                if isinstance(event.get('wall_seconds'), (int, float)) and all(event.get(k) == v for k, v in labels)
+            ]
+            if latencies:
+                for quantile, value in zip(LATENCY_QUANTILES, np.quantile(latencies, LATENCY_QUANTILES)):
+                    quantile_labels = ','.join(filter(None, [label_text, f'quantile="{quantile:g}"']))
+                    metrics[name].append(f"{name}{{{quantile_labels}}} {value:.6g}")
+            metrics[name].append(f"{name}_sum{{{label_text}}} {values.get('wall_seconds', 0):.6g}")
+            metrics[name].append(f"{name}_count{{{label_text}}} {values['count']:g}")
+
+        lines = []
+        for name in sorted(metrics):
+            lines.append(f"# TYPE {name} {types[name]}")
+            lines.extend(metrics[name])
+        return '\n'.join(lines) + '\n'
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def latency_summary(frame, by=None, latency_column='wall_seconds'):
+    """Request count, error rate and latency percentiles, overall or per value of by"""
+    if frame.empty:
+        return pd.DataFrame()
+    groups = frame.groupby(by, dropna=False) if by else [('All', frame)]
+    rows = []
+    for key, group in groups:
+        latencies = group[latency_column].dropna()
+        percentiles = np.quantile(latencies, LATENCY_QUANTILES) if len(latencies) else [np.nan] * len(LATENCY_QUANTILES)
+        errors = int((~group['ok'].astype(bool)).sum())
+        row = {by or 'group': key, 'requests': len(group), 'errors': errors, 'error_rate': errors / len(group)}
+        row.update({f"p{quantile * 100:g}": value for quantile, value in zip(LATENCY_QUANTILES, percentiles)})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def throughput(frame, freq='1min', latency_column='wall_seconds'):
+    """Requests, errors and p50/p95 latency per interval of freq, indexed by interval start"""
+    if frame.empty:
+        return pd.DataFrame()
+    grouped = frame.set_index('time').resample(freq)
+    return pd.DataFrame({
+        'requests': grouped.size(),
+        'errors': grouped['ok'].apply(lambda ok: int((~ok.astype(bool)).sum())),
+        'p50': grouped[latency_column].quantile(0.5),
+        'p95': grouped[latency_column].quantile(0.95)
+    })